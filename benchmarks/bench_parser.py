@@ -0,0 +1,200 @@
+"""
+DriveGuard Benchmarks - Line Protocol Parser
+Compares the table-driven parser against the original four-branch parser.
+
+Usage:
+    python benchmarks/bench_parser.py                 - 2M lines
+    python benchmarks/bench_parser.py --lines 5000000
+    python benchmarks/bench_parser.py --file data/history/session_x.out
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent.resolve()
+sys.path.insert(0, str(BENCH_DIR.parent / "dashboard"))
+
+from synthetic import write_telegraf_file
+from telegraf_parser import parse_telegraf_file
+
+
+def legacy_parse_telegraf_file(filepath):
+    """Parser as it shipped before the table-driven rewrite (kept for comparison)."""
+    batch_data = []
+    alerts_speed = []
+    alerts_harsh = []
+    status_msgs = []
+    
+    filepath = Path(filepath)
+    if not filepath.exists():
+        return batch_data, alerts_speed, alerts_harsh, status_msgs
+    
+    try:
+        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                
+                # Parse batch_data lines
+                if 'batch_data' in line:
+                    try:
+                        parts = line.split(' ')
+                        if len(parts) >= 2:
+                            fields_part = parts[1]
+                            fields = {}
+                            for field in fields_part.split(','):
+                                if '=' in field:
+                                    key, val = field.split('=', 1)
+                                    try:
+                                        fields[key] = float(val)
+                                    except:
+                                        fields[key] = val
+                            
+                            if fields:
+                                batch_data.append({
+                                    'timestamp': fields.get('ts', 0),
+                                    'speed': fields.get('spd', 0),
+                                    'lat': fields.get('lat', 0),
+                                    'lon': fields.get('lon', 0),
+                                    'acc': fields.get('acc', 0),
+                                    'score': fields.get('scr', 100),
+                                    'gps_valid': fields.get('gps', 0)
+                                })
+                    except:
+                        continue
+                
+                # Parse speed alerts
+                elif 'alert_speed' in line:
+                    try:
+                        parts = line.split(' ')
+                        if len(parts) >= 2:
+                            fields_part = parts[1]
+                            fields = {}
+                            for field in fields_part.split(','):
+                                if '=' in field:
+                                    key, val = field.split('=', 1)
+                                    try:
+                                        fields[key] = float(val)
+                                    except:
+                                        fields[key] = val
+                            
+                            if fields:
+                                alerts_speed.append({
+                                    'timestamp': fields.get('ts', 0),
+                                    'speed': fields.get('spd', 0),
+                                    'limit': fields.get('lim', 120),
+                                    'score': fields.get('scr', 0),
+                                    'lat': fields.get('lat', 0),
+                                    'lon': fields.get('lon', 0)
+                                })
+                    except:
+                        continue
+                
+                # Parse harsh driving alerts
+                elif 'alert_harsh' in line:
+                    try:
+                        parts = line.split(' ')
+                        if len(parts) >= 2:
+                            fields_part = parts[1]
+                            fields = {}
+                            for field in fields_part.split(','):
+                                if '=' in field:
+                                    key, val = field.split('=', 1)
+                                    try:
+                                        fields[key] = float(val)
+                                    except:
+                                        fields[key] = val
+                            
+                            if fields:
+                                alerts_harsh.append({
+                                    'timestamp': fields.get('ts', 0),
+                                    'acceleration': fields.get('acc', 0),
+                                    'threshold': fields.get('thr', 0.5),
+                                    'score': fields.get('scr', 0)
+                                })
+                    except:
+                        continue
+                
+                # Parse status messages
+                elif 'status' in line:
+                    try:
+                        parts = line.split(' ')
+                        if len(parts) >= 2:
+                            fields_part = parts[1]
+                            fields = {}
+                            for field in fields_part.split(','):
+                                if '=' in field:
+                                    key, val = field.split('=', 1)
+                                    fields[key] = val
+                            if fields:
+                                status_msgs.append(fields)
+                    except:
+                        continue
+    
+    except Exception as e:
+        print(f"Error reading file: {e}")
+    
+    return batch_data, alerts_speed, alerts_harsh, status_msgs
+
+
+def time_parser(parse, filepath, repeat):
+    """Best wall-clock time of parse(filepath) over repeat runs."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parse(filepath)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Telegraf parser")
+    parser.add_argument("--lines", type=int, default=2_000_000,
+                        help="lines of synthetic output to generate")
+    parser.add_argument("--file", help="benchmark an existing file instead")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="runs per parser (best time is reported)")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.file:
+        filepath = Path(args.file)
+    else:
+        tmp = tempfile.NamedTemporaryFile(suffix=".out", delete=False)
+        tmp.close()
+        filepath = Path(tmp.name)
+        print(f"Generating {args.lines:,} lines...")
+        write_telegraf_file(filepath, args.lines)
+
+    try:
+        with open(filepath, 'rb') as f:
+            n_lines = sum(1 for _ in f)
+        size_mb = filepath.stat().st_size / 1e6
+        print(f"File: {filepath} ({n_lines:,} lines, {size_mb:.1f} MB)")
+        print()
+
+        results = {}
+        for name, parse in (("legacy", legacy_parse_telegraf_file),
+                            ("table-driven", parse_telegraf_file)):
+            elapsed, parsed = time_parser(parse, filepath, args.repeat)
+            results[name] = elapsed
+            counts = "/".join(str(len(x)) for x in parsed)
+            print(f"  {name:<14} {elapsed:8.2f} s  {n_lines / elapsed:>12,.0f} lines/s"
+                  f"  (batch/speed/harsh/status = {counts})")
+
+        print()
+        print(f"  Speed-up: {results['legacy'] / results['table-driven']:.2f}x")
+    finally:
+        if tmp:
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
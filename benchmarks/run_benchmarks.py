@@ -0,0 +1,338 @@
+"""
+DriveGuard Benchmarks - Benchmark Suite
+Parsing, aggregation, API and history loading on synthetic sessions.
+
+For every size, a synthetic Telegraf output file is generated once and
+each stage runs in a fresh interpreter, so its peak RSS is its own:
+
+    parse    - parse_telegraf_file() and a full TelegrafTailer poll
+               (parsing plus SessionData/RunningStats aggregation)
+    api      - /api/data latency with concurrent clients (Flask test client)
+    history  - /api/history/<file> cold (builds the sidecar), warm, and
+               from a columnar .dgc archive
+
+Usage:
+    python benchmarks/run_benchmarks.py                       - 10k,100k,1M lines
+    python benchmarks/run_benchmarks.py --sizes 10k,100k,1M,10M --output results.json
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:      # Windows
+    resource = None
+
+BENCH_DIR = Path(__file__).parent.resolve()
+ROOT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT_DIR / "dashboard"))
+
+from synthetic import write_telegraf_file
+
+STAGES = ("parse", "api", "history")
+DEFAULT_SIZES = "10k,100k,1M"
+# Metrics where a larger value is worse, for --compare
+LOWER_IS_BETTER = ("seconds", "_ms", "rss_mb")
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1M' -> 1000000."""
+    text = text.strip()
+    factor = {'k': 10**3, 'K': 10**3, 'm': 10**6, 'M': 10**6}.get(text[-1:], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, or None where unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def best_of(repeat, func):
+    """Best wall-clock time of func() over repeat runs, with its last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+# ==================== STAGES (run in a child process) ====================
+
+def stage_parse(filepath, args):
+    from tailer import TelegrafTailer
+    from telegraf_parser import parse_telegraf_file
+
+    with open(filepath, 'rb') as f:
+        n_lines = sum(1 for _ in f)
+    size_mb = filepath.stat().st_size / 1e6
+
+    elapsed, parsed = best_of(args.repeat, lambda: parse_telegraf_file(filepath))
+    counts = [len(x) for x in parsed]
+    del parsed
+    tail_elapsed, data = best_of(args.repeat, lambda: TelegrafTailer(filepath).poll())
+    return {
+        'lines': n_lines,
+        'file_mb': round(size_mb, 2),
+        'parse_seconds': round(elapsed, 4),
+        'parse_lines_per_s': round(n_lines / elapsed),
+        'parse_mb_per_s': round(size_mb / elapsed, 2),
+        'records': dict(zip(('batch_data', 'alert_speed', 'alert_harsh', 'status'), counts)),
+        'aggregate_seconds': round(tail_elapsed, 4),
+        'aggregate_lines_per_s': round(n_lines / tail_elapsed),
+        'readings_stored': len(data.readings),
+    }
+
+
+def _hammer(client_factory, url, clients, requests_per_client):
+    """Latencies (ms) of clients x requests GETs made from parallel threads."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        client = client_factory()
+        mine = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            mine.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(max(latencies), 3),
+        'requests_per_s': round(len(latencies) / wall, 1),
+    }
+
+
+def stage_api(filepath, args):
+    os.environ["DRIVEGUARD_DATA_FILE"] = str(filepath)
+    import app as dashboard
+
+    client = dashboard.app.test_client()
+    start = time.perf_counter()
+    client.get('/api/data').get_data()
+    first = time.perf_counter() - start
+
+    results = {'first_request_seconds': round(first, 4), 'clients': args.clients}
+    for name, url in (('data', '/api/data'),
+                      ('data_downsampled', '/api/data?window=0&max_points=1000')):
+        results[name] = _hammer(dashboard.app.test_client, url, args.clients, args.requests)
+    return results
+
+
+def stage_history(filepath, args):
+    history = Path(tempfile.mkdtemp(prefix="dg_history_"))
+    os.environ["DRIVEGUARD_HISTORY_DIR"] = str(history)
+    try:
+        import app as dashboard
+        from archive import convert_telegraf_file
+
+        session = history / "session_bench.out"
+        shutil.copyfile(filepath, session)
+        client = dashboard.app.test_client()
+
+        def load(name):
+            start = time.perf_counter()
+            response = client.get(f'/api/history/{name}')
+            response.get_data()
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - start
+
+        cold = load(session.name)
+        warm, _ = best_of(args.repeat, lambda: load(session.name))
+        start = time.perf_counter()
+        archive = convert_telegraf_file(session)
+        convert = time.perf_counter() - start
+        columnar, _ = best_of(args.repeat, lambda: load(archive.name))
+        downsampled, _ = best_of(args.repeat, lambda: load(f"{archive.name}?max_points=1000"))
+        return {
+            'cold_seconds': round(cold, 4),
+            'warm_seconds': round(warm, 4),
+            'convert_seconds': round(convert, 4),
+            'columnar_seconds': round(columnar, 4),
+            'columnar_downsampled_seconds': round(downsampled, 4),
+            'sidecar_mb': round((history / "session_bench.idx.npz").stat().st_size / 1e6, 2),
+            'archive_mb': round(archive.stat().st_size / 1e6, 2),
+        }
+    finally:
+        shutil.rmtree(history, ignore_errors=True)
+
+
+STAGE_FUNCTIONS = {'parse': stage_parse, 'api': stage_api, 'history': stage_history}
+
+
+def run_stage(stage, filepath, args):
+    """Run one stage in a fresh interpreter and return its result dict."""
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--stage", stage,
+           "--file", str(filepath), "--repeat", str(args.repeat),
+           "--clients", str(args.clients), "--requests", str(args.requests)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=str(ROOT_DIR / "dashboard"))
+    if proc.returncode != 0:
+        return {'error': proc.stderr.strip().splitlines()[-1:] or ['failed']}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# ==================== REPORTING ====================
+
+def environment():
+    """Where the numbers came from."""
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    try:
+        import numpy
+        import flask
+        info['numpy'] = numpy.__version__
+        info['flask'] = getattr(flask, '__version__', None)
+    except ImportError:
+        pass
+    try:
+        info['commit'] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=str(ROOT_DIR)).stdout.strip() or None
+    except OSError:
+        info['commit'] = None
+    return info
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, sub in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, sub, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(old_path, new_path, threshold):
+    """Print metric changes between two result files; returns regressions."""
+    with open(old_path) as f:
+        old = _flatten("", json.load(f)['results'], {})
+    with open(new_path) as f:
+        new = _flatten("", json.load(f)['results'], {})
+
+    regressions = 0
+    print(f"{'metric':<58} {'old':>12} {'new':>12} {'change':>8}")
+    for key in sorted(set(old) & set(new)):
+        if not old[key]:
+            continue
+        change = (new[key] - old[key]) / abs(old[key])
+        worse = change > 0 if any(m in key for m in LOWER_IS_BETTER) else change < 0
+        flag = ""
+        if key.endswith(("_per_s", "seconds", "_ms", "rss_mb")) and worse and abs(change) > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key:<58} {old[key]:>12,.4g} {new[key]:>12,.4g} {change:>+7.1%}{flag}")
+    print()
+    print(f"{regressions} regression(s) over {threshold:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DriveGuard benchmark suite")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="comma-separated line counts, e.g. 10k,100k,1M,10M")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"stages to run ({', '.join(STAGES)})")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing (best is kept)")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent API clients")
+    parser.add_argument("--requests", type=int, default=50, help="requests per API client")
+    parser.add_argument("--workdir", help="keep generated files here (default: temp dir)")
+    parser.add_argument("--output", help="write results JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change reported as a regression (default 0.10)")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    if args.stage:
+        # Child process: run one stage and print its result as JSON
+        result = STAGE_FUNCTIONS[args.stage](Path(args.file), args)
+        result['peak_rss_mb'] = peak_rss_mb()
+        print(json.dumps(result))
+        return
+
+    stages = [s for s in args.stages.split(',') if s]
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="dg_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    report = {'environment': environment(), 'settings': {
+        'repeat': args.repeat, 'clients': args.clients, 'requests': args.requests
+    }, 'results': {}}
+
+    try:
+        for size_text in args.sizes.split(','):
+            n_lines = parse_size(size_text)
+            filepath = workdir / f"synthetic_{n_lines}.out"
+            if not filepath.exists():
+                print(f"Generating {n_lines:,} lines...")
+                write_telegraf_file(filepath, n_lines)
+            results = report['results'][str(n_lines)] = {}
+            for stage in stages:
+                print(f"  {n_lines:>10,} lines  {stage:<8}", end="", flush=True)
+                results[stage] = run_stage(stage, filepath, args)
+                print(f"  {json.dumps(results[stage])}")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
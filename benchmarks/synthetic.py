@@ -0,0 +1,73 @@
+"""
+DriveGuard Benchmarks - Synthetic Telegraf Output
+Writes line protocol shaped like what Telegraf records from the firmware.
+"""
+
+import math
+import random
+
+TELEGRAF_TAGS = "host=DRIVEGUARD-PC,project=driveguard,student={g},team=team4"
+TOPIC = "ece508/team4/{g}/driveguard/{kind}"
+
+
+def generate_lines(n_lines, g_number="Gxxxx6647", seed=508):
+    """Yield n_lines of synthetic Telegraf output for one session.
+
+    Readings arrive every 10 s (SAMPLE_INTERVAL in the firmware); speeding
+    and harsh driving alerts are mixed in at roughly the rate a spirited
+    drive produces them, plus a status line at start-up.
+    """
+    rng = random.Random(seed)
+    tags = TELEGRAF_TAGS.format(g=g_number)
+    series = {
+        kind: f"mqtt_consumer,{tags},topic={TOPIC.format(g=g_number, kind=kind)}"
+        for kind in ('batch_data', 'alert_speed', 'alert_harsh', 'status')
+    }
+    epoch_ns = 1_700_000_000 * 10**9
+    lat, lon = 38.830000, -77.307000
+    speed, acc, score = 0.0, 1.0, 100
+    cruise = 50.0
+    ts_ms = 0
+
+    written = 1
+    yield (f'{series["status"]} buf=60,client="DG_0508_{g_number}",'
+           f'msg="System started" {epoch_ns}')
+
+    while written < n_lines:
+        ts_ms += 10000
+        ns = epoch_ns + ts_ms * 10**6
+        prev_acc = acc
+        # Drift between city and highway cruising speeds
+        if rng.random() < 0.01:
+            cruise = rng.choice((0.0, 50.0, 80.0, 110.0))
+        speed = max(0.0, speed + 0.2 * (cruise - speed) + rng.gauss(0, 6))
+        acc = max(0.0, rng.gauss(1.0, 0.1))
+        heading = rng.uniform(0, 2 * math.pi)
+        step = speed / 3600 * 10 / 111.0
+        lat += step * math.cos(heading)
+        lon += step * math.sin(heading)
+        gps = 0 if rng.random() < 0.02 else 1
+
+        if gps and speed > 120.0 and written < n_lines:
+            score = max(0, score - 5)
+            yield (f'{series["alert_speed"]} lat={lat:.6f},lim=120,lon={lon:.6f},'
+                   f'scr={score},spd={speed:.1f},ts={ts_ms // 1000} {ns}')
+            written += 1
+        if abs(acc - prev_acc) > 0.4 and written < n_lines:
+            score = max(0, score - 3)
+            yield (f'{series["alert_harsh"]} acc={abs(acc - prev_acc):.2f},scr={score},'
+                   f'thr=0.40,ts={ts_ms // 1000} {ns}')
+            written += 1
+        if written < n_lines:
+            yield (f'{series["batch_data"]} acc={acc:.2f},gps={gps},lat={lat:.6f},'
+                   f'lon={lon:.6f},scr={score},spd={speed:.1f},ts={ts_ms} {ns}')
+            written += 1
+
+
+def write_telegraf_file(path, n_lines, **kwargs):
+    """Write a synthetic Telegraf output file and return its size in bytes."""
+    size = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in generate_lines(n_lines, **kwargs):
+            size += f.write(line + '\n')
+    return size
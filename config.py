@@ -51,3 +51,26 @@ MQTT_PASSWORD = "public"
 # =============================================================================
 DASHBOARD_PORT = 5000                # Web dashboard runs on this port
 AUTO_OPEN_BROWSER = True             # Open browser automatically when starting
+SERVE_MODE = "dev"                   # "prod": worker processes share one ingest
+                                     # process (same as --serve prod)
+DASHBOARD_WORKERS = 0                # Worker processes in prod mode (0 = one per CPU)
+LIVE_MEMORY_READINGS = 200000        # Live readings kept in memory; older ones are
+                                     # spilled to data/spill (0 = keep all in memory)
+LIVE_MEMORY_ALERTS = 1000            # Alerts / status messages of each kind kept in memory
+SNAPSHOT_INTERVAL = 60               # Seconds between checkpoints of the parsed live
+                                     # session (0 = off)
+RESUME_SESSION = False               # True: keep the live session across restarts
+                                     # instead of archiving it (same as --resume)
+
+# =============================================================================
+# HISTORY SETTINGS
+# =============================================================================
+ARCHIVE_FORMAT = "text"              # "text" keeps session_*.out as recorded,
+                                     # "columnar" converts it to a compact .dgc file
+
+# =============================================================================
+# FLEET SETTINGS
+# =============================================================================
+FLEET_MODE = False                   # True: subscribe to every board's topic
+                                     # (ece508/team4/+/driveguard/#) and track
+                                     # each vehicle separately
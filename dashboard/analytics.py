@@ -0,0 +1,261 @@
+"""
+DriveGuard Dashboard - History Analytics
+Aggregates across every archived session, computed in parallel.
+
+Each session is reduced to a summary of counts and sums (readings,
+distance, alerts, scores, a moving-speed histogram) that can be added up:
+the rolled-up report, per-period score trends and speed percentiles are
+all merges of these summaries. Summaries are computed in a process pool,
+one session per task (building a missing sidecar on the way), and kept
+per file size, mtime and risk speed limit, so a repeated report only
+summarizes sessions added since the last one.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from anomaly import SPEED_LIMIT, detect_risks
+from history_index import list_sessions, load_indexed_session, session_trips
+from store import quantile_rank
+from trips import STOP_SPEED
+
+SPEED_BIN = 10               # km/h per histogram bin
+SPEED_BINS = 20              # Last bin also holds everything faster (200+)
+PERIODS = ('day', 'week', 'month')
+POOL_WORKERS = os.cpu_count() or 1
+
+# filepath -> (size, mtime_ns, speed limit, summary)
+_summaries = {}
+_summaries_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def session_date(filepath):
+    """Date a session was recorded, from its name (or its mtime)."""
+    filepath = Path(filepath)
+    try:
+        return datetime.strptime(filepath.stem.replace('session_', '')[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return datetime.fromtimestamp(filepath.stat().st_mtime).date()
+
+
+def period_key(date, period):
+    """Label of the day, ISO week or month a date falls in."""
+    if period == 'day':
+        return date.isoformat()
+    if period == 'week':
+        year, week, _ = date.isocalendar()
+        return f"{year}-W{week:02d}"
+    return date.strftime('%Y-%m')
+
+
+def summarize_session(filepath, speed_limit=SPEED_LIMIT):
+    """Additive summary of one session (runs in a pool process)."""
+    filepath = Path(filepath)
+    meta, readings = load_indexed_session(filepath)
+    trips = session_trips(filepath)
+    speed = readings.column('speed').astype(np.float64)
+    score = readings.column('score')
+    moving = speed[speed > STOP_SPEED]
+    bins = np.minimum((moving // SPEED_BIN).astype(np.int64), SPEED_BINS - 1)
+    speed_alerts = len(meta['alerts_speed'])
+    harsh_alerts = len(meta['alerts_harsh'])
+    risk = detect_risks({name: readings.column(name) for name in ('timestamp', 'acc', 'speed', 'lat', 'lon')},
+                        speed_limit=speed_limit)
+    return {
+        'filename': filepath.name,
+        'date': session_date(filepath).isoformat(),
+        'readings': len(readings),
+        'first_ts': meta['time_bounds']['first_ts'],
+        'last_ts': meta['time_bounds']['last_ts'],
+        'trips': len(trips),
+        'distance_km': round(sum(t['distance_km'] for t in trips), 3),
+        'driving_s': sum(t['duration_s'] for t in trips),
+        'speed_alerts': speed_alerts,
+        'harsh_alerts': harsh_alerts,
+        'risk_alerts': len(risk),
+        'start_score': int(score[0]) if len(score) else None,
+        'final_score': int(score[-1]) if len(score) else None,
+        'min_score': int(score.min()) if len(score) else None,
+        'score_sum': int(score.sum(dtype=np.int64)),
+        'max_speed': round(float(speed.max()), 1) if len(speed) else 0,
+        'moving_readings': len(moving),
+        'moving_speed_sum': float(moving.sum()),
+        'speed_hist': np.bincount(bins, minlength=SPEED_BINS).tolist()
+    }
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web server can copy held locks
+            _pool = ProcessPoolExecutor(POOL_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _reset_executor():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def session_summaries(files, speed_limit=SPEED_LIMIT):
+    """Summaries of session files, from the cache or computed in parallel.
+
+    Returns (summaries in the order given, number computed, errors).
+    """
+    found = {}
+    missing = []
+    for f in files:
+        stat = f.stat()
+        with _summaries_lock:
+            cached = _summaries.get(f)
+        if cached and cached[:3] == (stat.st_size, stat.st_mtime_ns, speed_limit):
+            found[f] = cached[3]
+        else:
+            missing.append((f, stat.st_size, stat.st_mtime_ns))
+
+    results = []
+    errors = []
+    pending = missing
+    if len(missing) > 1 and POOL_WORKERS > 1:
+        try:
+            futures = [(f, size, mtime, _executor().submit(summarize_session, f, speed_limit)) for f, size, mtime in missing]
+            for f, size, mtime, future in futures:
+                try:
+                    results.append((f, size, mtime, future.result()))
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    errors.append({'filename': f.name, 'error': str(e)})
+            pending = []
+        except BrokenProcessPool as e:
+            print(f"Analytics pool failed ({e}); summarizing in this process")
+            _reset_executor()
+            results, errors = [], []
+    for f, size, mtime in pending:
+        try:
+            results.append((f, size, mtime, summarize_session(f, speed_limit)))
+        except Exception as e:
+            errors.append({'filename': f.name, 'error': str(e)})
+
+    with _summaries_lock:
+        for f, size, mtime, summary in results:
+            _summaries[f] = (size, mtime, speed_limit, summary)
+            found[f] = summary
+    return [found[f] for f in files if f in found], len(results), errors
+
+
+def _per_100km(count, distance):
+    return round(count / distance * 100, 2) if distance > 0 else None
+
+
+def _percentile(hist, q):
+    """Lower edge of the histogram bin holding the q-th percentile (nearest rank)."""
+    total = sum(hist)
+    if not total:
+        return None
+    rank = quantile_rank(total, q / 100)
+    return int(np.searchsorted(np.cumsum(hist), rank)) * SPEED_BIN
+
+
+def rollup(summaries):
+    """Merge session summaries into one aggregate block."""
+    def total(key):
+        return sum(s[key] for s in summaries)
+
+    distance = total('distance_km')
+    speed_alerts, harsh_alerts = total('speed_alerts'), total('harsh_alerts')
+    readings = total('readings')
+    moving = total('moving_readings')
+    hist = [sum(counts) for counts in zip(*(s['speed_hist'] for s in summaries))] or [0] * SPEED_BINS
+    finals = [s['final_score'] for s in summaries if s['final_score'] is not None]
+    return {
+        'sessions': len(summaries),
+        'readings': readings,
+        'trips': total('trips'),
+        'distance_km': round(distance, 3),
+        'driving_s': total('driving_s'),
+        'speed_alerts': speed_alerts,
+        'harsh_alerts': harsh_alerts,
+        'total_alerts': speed_alerts + harsh_alerts,
+        'speed_alerts_per_100km': _per_100km(speed_alerts, distance),
+        'harsh_alerts_per_100km': _per_100km(harsh_alerts, distance),
+        'alerts_per_100km': _per_100km(speed_alerts + harsh_alerts, distance),
+        'risk_alerts': total('risk_alerts'),
+        'risk_alerts_per_100km': _per_100km(total('risk_alerts'), distance),
+        'avg_score': round(total('score_sum') / readings, 2) if readings else None,
+        'avg_final_score': round(sum(finals) / len(finals), 2) if finals else None,
+        'min_score': min((s['min_score'] for s in summaries if s['min_score'] is not None), default=None),
+        'max_speed': max((s['max_speed'] for s in summaries), default=0),
+        'avg_moving_speed': round(total('moving_speed_sum') / moving, 1) if moving else None,
+        'speed_distribution': {
+            'bin_kmh': SPEED_BIN,
+            'counts': hist,
+            'p50': _percentile(hist, 50),
+            'p95': _percentile(hist, 95)
+        }
+    }
+
+
+def score_trend(summaries):
+    """Least-squares change of the final score per session (oldest first)."""
+    scores = [s['final_score'] for s in summaries if s['final_score'] is not None]
+    if len(scores) < 2:
+        return None
+    return round(float(np.polyfit(np.arange(len(scores)), scores, 1)[0]), 3)
+
+
+def history_report(history_dir, since=None, until=None, period='month', sessions=True,
+                   speed_limit=SPEED_LIMIT):
+    """Roll-up, per-period trends and (optionally) per-session rows.
+
+    since/until are ISO dates (inclusive) matched against the session date;
+    risk events use speed_limit (the dashboard's speed_danger).
+    """
+    start = time.perf_counter()
+    files = []
+    for f in sorted(list_sessions(history_dir), key=lambda f: f.name):
+        date = session_date(f).isoformat()
+        if (since is None or date >= since) and (until is None or date <= until):
+            files.append(f)
+    summaries, computed, errors = session_summaries(files, speed_limit)
+    summaries.sort(key=lambda s: (s['date'], s['filename']))
+
+    groups = {}
+    for s in summaries:
+        groups.setdefault(period_key(datetime.strptime(s['date'], '%Y-%m-%d').date(), period), []).append(s)
+    trend = [dict(rollup(group), period=key, score_trend=score_trend(group))
+             for key, group in groups.items()]
+    for row in trend:
+        del row['speed_distribution']
+
+    report = {
+        'period': period,
+        'since': since,
+        'until': until,
+        'totals': rollup(summaries),
+        'score_trend': score_trend(summaries),
+        'trend': trend,
+        'computed': computed,
+        'cached': len(summaries) - computed,
+        'errors': errors
+    }
+    if sessions:
+        report['sessions'] = [dict(s, alerts_per_100km=_per_100km(s['speed_alerts'] + s['harsh_alerts'],
+                                                                   s['distance_km']))
+                              for s in summaries]
+    report['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return report
@@ -0,0 +1,226 @@
+"""
+DriveGuard Dashboard - Risk Detection
+Streaming anomaly checks over a vehicle's readings.
+
+The firmware checks each reading against a fixed threshold. A RiskDetector
+looks at the series instead, with O(1) time and state per reading:
+
+    acc_anomaly         - acc more than Z_LIMIT standard deviations from its
+                          exponentially weighted mean (after WARMUP readings)
+    jerk                - acc changing faster than JERK_LIMIT g/s between
+                          consecutive readings
+    sustained_speeding  - speed above the speed limit for SUSTAINED_MS in a
+                          row (one event per episode)
+
+The speed limit is the dashboard's speed_danger threshold (SPEED_LIMIT, the
+firmware's, until /api/config changes it); live sources pass changes on
+with set_speed_limit().
+
+acc and speed are first rounded to the decimals the reading store keeps,
+so a live reading and the same reading loaded back from a float32 column
+give the same result (the firmware's 2-decimal acc values often change by
+exactly the jerk limit).
+
+Readings more than MAX_STEP_MS apart (or going back in time) are not
+consecutive: no jerk is computed across them and a speeding run ends.
+
+Events are alert-like dicts: timestamp in seconds as in the firmware
+alerts, the reading's ts in ms, type, value and the limit it crossed
+(z-score, g/s or seconds), speed and position. A live session keeps them
+as alerts_risk. detect_risks() runs the same checks over whole columns
+with NumPy (history sessions) and continues from, and leaves, the same
+state as add().
+"""
+
+import math
+
+import numpy as np
+
+from store import COLUMNS
+
+EWMA_ALPHA = 0.05            # Weight of the newest acc value (~20 reading memory)
+WARMUP = 30                  # Readings before z-scores are trusted
+Z_LIMIT = 4.0
+JERK_LIMIT = 0.04            # g/s (0.4 g across one 10 s sample)
+SPEED_LIMIT = 120.0          # km/h, the firmware's SPEED_DANGER (default limit)
+SUSTAINED_MS = 60000
+MAX_STEP_MS = 30000          # Longer steps break jerk and speeding runs
+EWM_BLOCK = 128              # Rows per closed-form EWMA block (keeps beta ** -k small)
+
+RISK_TYPES = ('acc_anomaly', 'jerk', 'sustained_speeding')
+ACC_SCALE = 10.0 ** COLUMNS['acc'][1]
+SPEED_SCALE = 10.0 ** COLUMNS['speed'][1]
+
+
+def risk_event(kind, ts, value, limit, speed, lat, lon):
+    """Risk event as kept in alerts_risk."""
+    return {
+        'type': kind,
+        'timestamp': int(ts // 1000),
+        'ts': int(ts),
+        'value': round(float(value), 3),
+        'limit': limit,
+        'speed': round(float(speed), 1),
+        'lat': round(float(lat), 6),
+        'lon': round(float(lon), 6)
+    }
+
+
+class RiskDetector:
+    """Rolling acc statistics, last reading and speeding run of one vehicle."""
+
+    def __init__(self, speed_limit=SPEED_LIMIT):
+        self.speed_limit = speed_limit
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.last_ts = None
+        self.last_acc = None
+        self.over_since = None       # ts the current speeding run began
+        self.over_reported = False
+
+    def add(self, reading):
+        """Check one reading; returns the risk events it raises."""
+        ts = reading['timestamp']
+        # Same arithmetic as np.round() in detect_risks()
+        acc = round(reading['acc'] * ACC_SCALE) / ACC_SCALE
+        speed = round(reading['speed'] * SPEED_SCALE) / SPEED_SCALE
+        events = []
+
+        if self.count == 0:
+            self.mean = acc
+        diff = acc - self.mean
+        if self.count >= WARMUP and self.var > 0:
+            z = diff / math.sqrt(self.var)
+            if abs(z) > Z_LIMIT:
+                events.append(risk_event('acc_anomaly', ts, z, Z_LIMIT, speed, reading['lat'], reading['lon']))
+        self.mean += EWMA_ALPHA * diff
+        self.var = (1 - EWMA_ALPHA) * (self.var + EWMA_ALPHA * diff * diff)
+        self.count += 1
+
+        step = ts - self.last_ts if self.last_ts is not None else None
+        consecutive = step is not None and 0 < step <= MAX_STEP_MS
+        if consecutive:
+            jerk = (acc - self.last_acc) / (step / 1000)
+            if abs(jerk) > JERK_LIMIT:
+                events.append(risk_event('jerk', ts, jerk, JERK_LIMIT, speed, reading['lat'], reading['lon']))
+
+        if speed > self.speed_limit:
+            if self.over_since is None or not consecutive:
+                self.over_since = ts
+                self.over_reported = False
+            if not self.over_reported and ts - self.over_since >= SUSTAINED_MS:
+                self.over_reported = True
+                events.append(risk_event('sustained_speeding', ts, (ts - self.over_since) / 1000,
+                                         SUSTAINED_MS / 1000, speed, reading['lat'], reading['lon']))
+        else:
+            self.over_since = None
+
+        self.last_ts = ts
+        self.last_acc = acc
+        return events
+
+    def snapshot(self):
+        """State as plain data, to restore() after a restart (the limit is config)."""
+        state = dict(vars(self))
+        del state['speed_limit']
+        return state
+
+    def restore(self, state):
+        """Continue from a snapshot()."""
+        vars(self).update(state)
+
+
+def _ewm(u, beta, y_prev):
+    """y[t] = beta * y[t-1] + u[t] from y[-1] = y_prev, solved a block at a time."""
+    out = np.empty(len(u))
+    for lo in range(0, len(u), EWM_BLOCK):
+        block = u[lo:lo + EWM_BLOCK]
+        powers = beta ** np.arange(len(block))
+        y = powers * (beta * y_prev + np.cumsum(block / powers))
+        out[lo:lo + len(block)] = y
+        y_prev = y[-1]
+    return out
+
+
+def detect_risks(columns, detector=None, speed_limit=SPEED_LIMIT):
+    """Risk events of readings given as columns (timestamp, acc, speed, lat, lon).
+
+    Vectorized equivalent of calling detector.add() on every row, starting
+    from and updating detector's state (by default a fresh one with
+    speed_limit).
+    """
+    detector = detector or RiskDetector(speed_limit)
+    ts = np.asarray(columns['timestamp'], dtype=np.int64)
+    n = len(ts)
+    if n == 0:
+        return []
+    acc = np.rint(np.asarray(columns['acc'], dtype=np.float64) * ACC_SCALE) / ACC_SCALE
+    speed = np.rint(np.asarray(columns['speed'], dtype=np.float64) * SPEED_SCALE) / SPEED_SCALE
+    rows = np.arange(n)
+    beta = 1 - EWMA_ALPHA
+
+    # acc z-scores against the mean and variance before each row
+    mean0 = acc[0] if detector.count == 0 else detector.mean
+    means = _ewm(EWMA_ALPHA * acc, beta, mean0)
+    prev_mean = np.concatenate(([mean0], means[:-1]))
+    diff = acc - prev_mean
+    variances = _ewm(beta * EWMA_ALPHA * diff * diff, beta, detector.var)
+    prev_var = np.concatenate(([detector.var], variances[:-1]))
+    trusted = (detector.count + rows >= WARMUP) & (prev_var > 0)
+    z = np.zeros(n)
+    np.divide(diff, np.sqrt(prev_var), out=z, where=trusted)
+    anomalies = np.flatnonzero(trusted & (np.abs(z) > Z_LIMIT))
+
+    # Jerk between consecutive readings
+    prev_ts = np.concatenate(([detector.last_ts if detector.last_ts is not None else ts[0]], ts[:-1]))
+    prev_acc = np.concatenate(([detector.last_acc if detector.last_acc is not None else 0.0], acc[:-1]))
+    step = ts - prev_ts
+    consecutive = (step > 0) & (step <= MAX_STEP_MS)
+    if detector.last_ts is None:
+        consecutive[0] = False
+    jerk = np.zeros(n)
+    np.divide(acc - prev_acc, step / 1000, out=jerk, where=consecutive)
+    jerks = np.flatnonzero(consecutive & (np.abs(jerk) > JERK_LIMIT))
+
+    # Speeding runs: each row's run starts at the last row that began one
+    over = speed > detector.speed_limit
+    prev_over = np.concatenate(([detector.over_since is not None], over[:-1]))
+    begins = over & ~(prev_over & consecutive)
+    begin_row = np.maximum.accumulate(np.where(begins, rows, -1))
+    carried = begin_row < 0
+    start = np.where(carried, detector.over_since if detector.over_since is not None else 0,
+                     ts[np.maximum(begin_row, 0)])
+    reached = np.flatnonzero(over & (ts - start >= SUSTAINED_MS))
+    runs = begin_row[reached]
+    first = np.concatenate(([True], runs[1:] != runs[:-1])) if len(reached) else np.zeros(0, dtype=bool)
+    if detector.over_reported:
+        first &= runs >= 0
+    speeding = reached[first]
+
+    def values(name, index):
+        return np.asarray(columns[name])[index].tolist()
+
+    found = []
+    for order, (kind, index, value, limit) in enumerate((
+            ('acc_anomaly', anomalies, z[anomalies], Z_LIMIT),
+            ('jerk', jerks, jerk[jerks], JERK_LIMIT),
+            ('sustained_speeding', speeding, (ts[speeding] - start[speeding]) / 1000, SUSTAINED_MS / 1000))):
+        for row, t, v, s, lat, lon in zip(index.tolist(), ts[index].tolist(), value.tolist(),
+                                          speed[index].tolist(), values('lat', index), values('lon', index)):
+            found.append((row, order, risk_event(kind, t, v, limit, s, lat, lon)))
+    found.sort(key=lambda item: item[:2])
+
+    # Leave the detector where add() would have
+    detector.count += n
+    detector.mean = float(means[-1])
+    detector.var = float(variances[-1])
+    detector.last_ts = int(ts[-1])
+    detector.last_acc = float(acc[-1])
+    if over[-1]:
+        detector.over_since = int(start[-1])
+        run = begin_row[-1]
+        detector.over_reported = bool(np.any(runs == run)) or (run < 0 and detector.over_reported)
+    else:
+        detector.over_since = None
+    return [event for _, _, event in found]
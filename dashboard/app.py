@@ -16,10 +16,36 @@ DriveGuard Dashboard - Flask Backend
 Reads Telegraf output and serves data to the web interface.
 """
 
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, render_template, jsonify, request, send_from_directory, Response, stream_with_context, g
+import cProfile
+import io
 import os
+import json
+import pstats
+import threading
+import time
 from pathlib import Path
-from datetime import datetime
+from datetime import date, datetime
+
+from analytics import PERIODS, history_report
+from anomaly import detect_risks
+from archive import ARCHIVE_SUFFIX
+from downsample import DEFAULT_METHOD, METHODS, downsample
+from export import (FORMATS, RECORD_KINDS, alert_chunks, alert_fields, export_columnar, export_csv,
+                    export_ndjson, reading_chunks)
+from fleet import RANKINGS, FleetTailer
+from http_cache import IMMUTABLE_CACHE_CONTROL, LIVE_CACHE_CONTROL, cached_response, compress, compress_stream
+from history_index import (ensure_index, is_session_file, list_sessions, load_indexed_session, open_session,
+                           page_session, session_summary, session_trips)
+import metrics
+from metrics import REQUEST_SECONDS, STAGE_SECONDS
+from query import DEFAULT_LIMIT, QueryError, make_cursor, parse_cursor, parse_fields, query_readings
+from scoring import Thresholds, alerts, rescore_cached, summary, threshold_grid
+from spill import reading_pieces
+from spatial import HOTSPOTS, TileIndex, cached_index, parse_bbox
+from store import COLUMNS, columns_to_records
+from tailer import TelegrafTailer
+from trips import trip_alerts
 
 app = Flask(__name__)
 
@@ -30,128 +56,99 @@ HISTORY_DIR = Path(os.environ.get("DRIVEGUARD_HISTORY_DIR", "../data/history"))
 # Configurable thresholds
 config = {
     "speed_danger": 120.0,
-    "accel_harsh": 0.5
+    "accel_harsh": 0.5,
+    "score_speeding": -5,
+    "score_harsh": -3
 }
 
+# Follows the live file so each poll only parses newly appended lines.
+# run.py swaps in an MqttIngest when started with --ingest native.
+live_source = TelegrafTailer(DATA_FILE)
+
+# Per-vehicle view of the same data (fleet mode, DRIVEGUARD_FLEET=1)
+fleet_source = FleetTailer(DATA_FILE) if os.environ.get("DRIVEGUARD_FLEET") == "1" else None
+
+# Per-request profiling (?profile=1) is only honoured when this is set
+PROFILING = os.environ.get("DRIVEGUARD_PROFILING") == "1"
+
+# Server-Sent Events settings
+STREAM_INTERVAL = 1.0       # Seconds between checks for new data
+STREAM_HEARTBEAT = 15.0     # Seconds between keep-alive comments
+STREAM_WINDOW = 100         # Readings in the initial snapshot (chart length)
+STREAM_ALERTS = 50          # Alerts of each type in the initial snapshot
+DATA_ALERTS = 500           # Default alerts of each type in /api/data
+
+
+def set_live_source(source):
+    """Serve live data from another source (anything with poll()/generation/updated_at)."""
+    global live_source
+    live_source = source
+
+
+def set_fleet_source(source):
+    """Serve the fleet endpoints from a source whose poll() returns a Fleet."""
+    global fleet_source
+    fleet_source = source
+
+
+metrics.Gauge("driveguard_live_readings", "Readings held for the live session",
+              func=lambda: len(live_source.data.readings))
+metrics.Gauge("driveguard_fleet_vehicles", "Vehicles seen in fleet mode",
+              func=lambda: len(fleet_source.data) if fleet_source is not None else 0)
+
+
+@app.before_request
+def _start_request():
+    g.request_start = time.perf_counter()
+    if PROFILING and request.args.get('profile') == '1':
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+@app.after_request
+def _finish_request(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(40)
+        response = Response(out.getvalue(), mimetype='text/plain',
+                            headers={'X-Profiled-Status': str(response.status_code)})
+    response = compress(response)
+    if not response.is_streamed:
+        REQUEST_SECONDS.labels(request.endpoint or 'unknown').observe(
+            time.perf_counter() - g.request_start)
+    return response
 
-def parse_telegraf_file(filepath):
-    """Parse the Telegraf output file and extract DriveGuard data."""
-    batch_data = []
-    alerts_speed = []
-    alerts_harsh = []
-    status_msgs = []
-    
-    filepath = Path(filepath)
-    if not filepath.exists():
-        return batch_data, alerts_speed, alerts_harsh, status_msgs
-    
-    try:
-        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Parse batch_data lines
-                if 'batch_data' in line:
-                    try:
-                        parts = line.split(' ')
-                        if len(parts) >= 2:
-                            fields_part = parts[1]
-                            fields = {}
-                            for field in fields_part.split(','):
-                                if '=' in field:
-                                    key, val = field.split('=', 1)
-                                    try:
-                                        fields[key] = float(val)
-                                    except:
-                                        fields[key] = val
-                            
-                            if fields:
-                                batch_data.append({
-                                    'timestamp': fields.get('ts', 0),
-                                    'speed': fields.get('spd', 0),
-                                    'lat': fields.get('lat', 0),
-                                    'lon': fields.get('lon', 0),
-                                    'acc': fields.get('acc', 0),
-                                    'score': fields.get('scr', 100),
-                                    'gps_valid': fields.get('gps', 0)
-                                })
-                    except:
-                        continue
-                
-                # Parse speed alerts
-                elif 'alert_speed' in line:
-                    try:
-                        parts = line.split(' ')
-                        if len(parts) >= 2:
-                            fields_part = parts[1]
-                            fields = {}
-                            for field in fields_part.split(','):
-                                if '=' in field:
-                                    key, val = field.split('=', 1)
-                                    try:
-                                        fields[key] = float(val)
-                                    except:
-                                        fields[key] = val
-                            
-                            if fields:
-                                alerts_speed.append({
-                                    'timestamp': fields.get('ts', 0),
-                                    'speed': fields.get('spd', 0),
-                                    'limit': fields.get('lim', 120),
-                                    'score': fields.get('scr', 0),
-                                    'lat': fields.get('lat', 0),
-                                    'lon': fields.get('lon', 0)
-                                })
-                    except:
-                        continue
-                
-                # Parse harsh driving alerts
-                elif 'alert_harsh' in line:
-                    try:
-                        parts = line.split(' ')
-                        if len(parts) >= 2:
-                            fields_part = parts[1]
-                            fields = {}
-                            for field in fields_part.split(','):
-                                if '=' in field:
-                                    key, val = field.split('=', 1)
-                                    try:
-                                        fields[key] = float(val)
-                                    except:
-                                        fields[key] = val
-                            
-                            if fields:
-                                alerts_harsh.append({
-                                    'timestamp': fields.get('ts', 0),
-                                    'acceleration': fields.get('acc', 0),
-                                    'threshold': fields.get('thr', 0.5),
-                                    'score': fields.get('scr', 0)
-                                })
-                    except:
-                        continue
-                
-                # Parse status messages
-                elif 'status' in line:
-                    try:
-                        parts = line.split(' ')
-                        if len(parts) >= 2:
-                            fields_part = parts[1]
-                            fields = {}
-                            for field in fields_part.split(','):
-                                if '=' in field:
-                                    key, val = field.split('=', 1)
-                                    fields[key] = val
-                            if fields:
-                                status_msgs.append(fields)
-                    except:
-                        continue
-    
-    except Exception as e:
-        print(f"Error reading file: {e}")
-    
-    return batch_data, alerts_speed, alerts_harsh, status_msgs
+
+def _json(payload):
+    """jsonify() with its encoding time recorded."""
+    with STAGE_SECONDS.labels('encode').time():
+        return jsonify(payload)
+
+
+def _live_version(live):
+    """Version of the live payloads: ingest position plus thresholds."""
+    return (f"{live_source.generation}-{len(live.readings)}-{len(live.alerts_speed)}-"
+            f"{len(live.alerts_harsh)}-{len(live.status_msgs)}-{len(live.quality_events)}-"
+            f"{len(live.alerts_risk)}-{sorted(config.items())}")
+
+
+def _timestamp(seconds):
+    """ISO time of a wall-clock timestamp (None stays None)."""
+    return datetime.fromtimestamp(seconds).isoformat() if seconds is not None else None
+
+
+def _history_version(filepath):
+    """Version of a recorded session: its file size and modification time."""
+    stat = filepath.stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+@app.route('/metrics')
+def get_metrics():
+    """Counters and timing histograms in Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/')
@@ -160,44 +157,364 @@ def index():
     return render_template('dashboard.html')
 
 
+def _downsample_args():
+    """Read max_points/method query parameters; raises ValueError if invalid."""
+    max_points = request.args.get('max_points', type=int)
+    method = request.args.get('method', DEFAULT_METHOD)
+    if max_points is not None and max_points < 2:
+        raise ValueError("max_points must be at least 2")
+    if method not in METHODS:
+        raise ValueError(f"method must be one of: {', '.join(METHODS)}")
+    return max_points, method
+
+
+def _chart_records(columns, max_points, method):
+    """Serialize reading columns, downsampled when max_points is given."""
+    if max_points is None:
+        return columns_to_records(columns), None
+    reduced = downsample(columns, max_points, method)
+    info = {
+        'method': method,
+        'source_points': len(columns['timestamp']),
+        'points': len(reduced['timestamp'])
+    }
+    return columns_to_records(reduced), info
+
+
 @app.route('/api/data')
 def get_data():
-    """Get all parsed data for the dashboard."""
-    batch_data, alerts_speed, alerts_harsh, status_msgs = parse_telegraf_file(DATA_FILE)
-    
-    # Calculate statistics
-    total_readings = len(batch_data)
-    total_alerts = len(alerts_speed) + len(alerts_harsh)
-    
-    if batch_data:
-        current_score = batch_data[-1].get('score', 100)
-        max_speed = max(d.get('speed', 0) for d in batch_data)
-        avg_speed = sum(d.get('speed', 0) for d in batch_data) / total_readings
-        max_accel = max(d.get('acc', 0) for d in batch_data)
+    """Get all parsed data for the dashboard.
+    
+    Optional query parameters:
+        window      - latest readings to include (default 500, 0 = all)
+        alerts      - latest alerts of each type (including risk events),
+                      status messages and data-quality events to include
+                      (default 500, 0 = all)
+        max_points  - downsample the window to about this many points
+        method      - lttb (default), minmax or avg
+    """
+    try:
+        max_points, method = _downsample_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    window = request.args.get('window', 500, type=int)
+    n_alerts = request.args.get('alerts', DATA_ALERTS, type=int)
+    
+    live = live_source.poll()
+    
+    def build():
+        start = -window if window > 0 else None
+        alerts_from = -n_alerts if n_alerts > 0 else None
+        columns = {name: live.readings.column(name, start) for name in COLUMNS}
+        with STAGE_SECONDS.labels('serialize').time():
+            batch_data, downsampled = _chart_records(columns, max_points, method)
+        with STAGE_SECONDS.labels('stats').time():
+            stats = live.summary()
+        
+        return _json({
+            'batch_data': batch_data,
+            'downsampled': downsampled,
+            'alerts_speed': live.alerts_speed[alerts_from:],
+            'alerts_harsh': live.alerts_harsh[alerts_from:],
+            'alerts_risk': live.alerts_risk[alerts_from:],
+            'status': live.status_msgs[alerts_from:],
+            'quality': live.quality_events[alerts_from:],
+            'stats': stats,
+            'config': config,
+            'last_update': _timestamp(live_source.updated_at)
+        }).get_data()
+    
+    return cached_response(_live_version(live), build, params=(window, n_alerts, max_points, method))
+
+
+@app.route('/api/readings')
+def get_readings():
+    """Page through readings by time range and cursor.
+    
+    Query parameters:
+        session       - history filename (default: the live session)
+        from, to      - firmware timestamps (ms), both inclusive
+        after_cursor  - next_cursor of the previous page
+        limit         - readings per page (default 1000, max 10000)
+        fields        - comma-separated columns (default: all)
+    
+    Poll the live session with the last next_cursor to get only new readings.
+    """
+    session = request.args.get('session')
+    if session:
+        filepath = HISTORY_DIR / session
+        if not is_session_file(session) or not filepath.exists():
+            return jsonify({'error': 'File not found'}), 404
+        source = page_session(filepath)
+        epoch = f"h{filepath.stat().st_size}"
+        version, cache_control = _history_version(filepath), IMMUTABLE_CACHE_CONTROL
+    else:
+        live = live_source.poll()
+        source = live.readings
+        epoch = live_source.generation
+        version, cache_control = _live_version(live), LIVE_CACHE_CONTROL
+    
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        cursor = request.args.get('after_cursor')
+        after = parse_cursor(cursor, epoch) if cursor else 0
+        t_from = request.args.get('from', type=int)
+        t_to = request.args.get('to', type=int)
+        limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def build():
+        with STAGE_SECONDS.labels('query').time():
+            columns, next_row, has_more = query_readings(source, t_from, t_to, after, limit, fields)
+            readings = columns_to_records(columns)
+        
+        return _json({
+            'session': session or 'live',
+            'readings': readings,
+            'count': len(readings),
+            'next_cursor': make_cursor(epoch, next_row),
+            'has_more': has_more
+        }).get_data()
+    
+    params = (session, tuple(fields), after, t_from, t_to, limit)
+    return cached_response(version, build, cache_control, params)
+
+
+@app.route('/api/export')
+def export_data():
+    """Stream the readings and alerts of a session or time range.
+    
+    Query parameters:
+        session  - history filename (default: the live session)
+        from, to - firmware timestamps (ms), both inclusive
+        format   - ndjson (default), csv or columnar
+        records  - comma-separated record types: readings, alert_speed,
+                   alert_harsh (default: all; csv takes one, default readings)
+        fields   - comma-separated reading columns (default: all)
+    
+    The body is encoded chunk by chunk as it is sent (gzipped on the fly
+    when accepted), so memory use does not grow with the range; .dgc
+    sessions are read straight from their memory map and text sessions
+    from their indexed byte offsets.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(FORMATS)}"}), 400
+    default_records = 'readings' if fmt == 'csv' else ','.join(RECORD_KINDS)
+    records = [r.strip() for r in request.args.get('records', default_records).split(',') if r.strip()]
+    if not records or any(r not in RECORD_KINDS for r in records):
+        return jsonify({'error': f"records must be from {', '.join(RECORD_KINDS)}"}), 400
+    if fmt == 'csv' and len(records) != 1:
+        return jsonify({'error': "csv exports one record type at a time"}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    t_from = request.args.get('from', type=int)
+    t_to = request.args.get('to', type=int)
+    
+    session = request.args.get('session')
+    if session:
+        filepath = HISTORY_DIR / session
+        if not is_session_file(session) or not filepath.exists():
+            return jsonify({'error': 'File not found'}), 404
+        source = page_session(filepath)
+        meta = source.meta if filepath.suffix == ARCHIVE_SUFFIX else ensure_index(filepath)
+        alert_lists = {'alert_speed': meta['alerts_speed'], 'alert_harsh': meta['alerts_harsh']}
+    else:
+        live = live_source.poll()
+        source = live.readings
+        alert_lists = {'alert_speed': live.alerts_speed, 'alert_harsh': live.alerts_harsh}
+    # Alerts that arrive during the export are left out, like new readings
+    alert_counts = {kind: len(alerts) for kind, alerts in alert_lists.items()}
+    
+    def pieces():
+        for record in records:
+            kind = RECORD_KINDS[record]
+            if kind == 'batch_data':
+                chunks = reading_chunks(source, t_from, t_to, fields)
+            else:
+                chunks = alert_chunks(kind, alert_lists[kind], alert_counts[kind], t_from, t_to)
+            for columns in chunks:
+                yield kind, columns
+    
+    if fmt == 'csv':
+        kind = RECORD_KINDS[records[0]]
+        body = export_csv(pieces(), fields if kind == 'batch_data' else alert_fields(kind))
+    elif fmt == 'ndjson':
+        body = export_ndjson(pieces())
     else:
-        current_score = 100
-        max_speed = 0
-        avg_speed = 0
-        max_accel = 0
-    
-    return jsonify({
-        'batch_data': batch_data[-500:],
-        'alerts_speed': alerts_speed,
-        'alerts_harsh': alerts_harsh,
-        'status': status_msgs,
-        'stats': {
-            'total_readings': total_readings,
-            'total_alerts': total_alerts,
-            'current_score': current_score,
-            'max_speed': max_speed,
-            'avg_speed': avg_speed,
-            'max_accel': max_accel,
-            'speed_alerts': len(alerts_speed),
-            'harsh_alerts': len(alerts_harsh)
-        },
-        'config': config,
-        'last_update': datetime.now().isoformat()
+        body = export_columnar(pieces())
+    body, encoding = compress_stream(body)
+    
+    mimetype, extension = FORMATS[fmt]
+    name = f"{Path(session).stem if session else 'live'}.{extension}"
+    response = Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{name}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'
     })
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def _sse(event, payload, event_id):
+    """Format one Server-Sent Event."""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def _parse_event_id(event_id):
+    """Split a 'generation-readings-speed-harsh' event ID into ints."""
+    try:
+        parts = [int(p) for p in event_id.split('-')]
+    except (AttributeError, ValueError):
+        return None
+    return parts if len(parts) == 4 else None
+
+
+@app.route('/api/stream')
+def stream_data():
+    """Push new readings, alerts and stat changes as Server-Sent Events.
+
+    The event ID is a cursor (generation-readings-speed_alerts-harsh_alerts)
+    into the live session. A reconnecting browser sends it back as
+    Last-Event-ID and only receives what it missed; a cursor from another
+    session (the live file was archived) gets a fresh snapshot instead.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    cursor = _parse_event_id(last_event_id)
+
+    def generate():
+        sent_stats = {}
+        position = cursor
+        last_sent = time.monotonic()
+        # Tell EventSource how long to wait before reconnecting
+        yield f"retry: {int(STREAM_INTERVAL * 3000)}\n\n"
+
+        while True:
+            live = live_source.poll()
+            generation = live_source.generation
+            n_readings = len(live.readings)
+            n_speed = len(live.alerts_speed)
+            n_harsh = len(live.alerts_harsh)
+            event_id = f"{generation}-{n_readings}-{n_speed}-{n_harsh}"
+            stats = live.summary()
+
+            if (position is None or position[0] != generation
+                    or position[1] > n_readings or position[2] > n_speed
+                    or position[3] > n_harsh):
+                yield _sse('snapshot', {
+                    'batch_data': live.readings.to_records(max(0, n_readings - STREAM_WINDOW), n_readings),
+                    'alerts_speed': live.alerts_speed[max(0, n_speed - STREAM_ALERTS):n_speed],
+                    'alerts_harsh': live.alerts_harsh[max(0, n_harsh - STREAM_ALERTS):n_harsh],
+                    'stats': stats,
+                    'config': config
+                }, event_id)
+                sent_stats = stats
+                last_sent = time.monotonic()
+            elif (n_readings, n_speed, n_harsh) != tuple(position[1:]):
+                _, r, s, h = position
+                yield _sse('update', {
+                    'batch_data': live.readings.to_records(r, n_readings),
+                    'alerts_speed': live.alerts_speed[s:n_speed],
+                    'alerts_harsh': live.alerts_harsh[h:n_harsh],
+                    'stats': {k: v for k, v in stats.items() if sent_stats.get(k) != v}
+                }, event_id)
+                sent_stats = stats
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= STREAM_HEARTBEAT:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+
+            position = [generation, n_readings, n_speed, n_harsh]
+            time.sleep(STREAM_INTERVAL)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def _fleet():
+    """Current Fleet, or None when fleet mode is off."""
+    return fleet_source.poll() if fleet_source is not None else None
+
+
+@app.route('/api/vehicles')
+def get_vehicles():
+    """List the vehicles seen in this session with their summary stats."""
+    fleet = _fleet()
+    if fleet is None:
+        return jsonify({'error': 'Fleet mode is not enabled'}), 404
+    vehicles = fleet.summaries()
+    return jsonify({'vehicles': vehicles, 'count': len(vehicles)})
+
+
+@app.route('/api/vehicles/<device_id>/data')
+def get_vehicle_data(device_id):
+    """Live data of one vehicle; takes the same parameters as /api/data."""
+    fleet = _fleet()
+    vehicle = fleet.vehicle(device_id) if fleet is not None else None
+    if vehicle is None:
+        return jsonify({'error': 'Vehicle not found'}), 404
+    try:
+        max_points, method = _downsample_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    window = request.args.get('window', 500, type=int)
+    
+    def build():
+        snapshot = vehicle.snapshot(window if window > 0 else None)
+        batch_data, downsampled = _chart_records(snapshot['columns'], max_points, method)
+        
+        return _json({
+            'vehicle': device_id,
+            'batch_data': batch_data,
+            'downsampled': downsampled,
+            'alerts_speed': snapshot['alerts_speed'],
+            'alerts_harsh': snapshot['alerts_harsh'],
+            'alerts_risk': snapshot['alerts_risk'],
+            'status': snapshot['status'],
+            'quality': snapshot['quality'],
+            'stats': snapshot['stats'],
+            'config': config,
+            'last_update': _timestamp(vehicle.last_seen)
+        }).get_data()
+    
+    # The version is read before building, so a racing record only makes the next request rebuild
+    return cached_response(f"{vehicle.version}-{sorted(config.items())}", build,
+                           params=(window, max_points, method))
+
+
+@app.route('/api/vehicles/<device_id>/trips')
+def get_vehicle_trips(device_id):
+    """Trips of one vehicle so far (the last one may still be open).
+    
+    first_row / last_row index the vehicle's reading window (None once
+    trimmed off it); start_ts / end_ts always identify the trip.
+    """
+    fleet = _fleet()
+    vehicle = fleet.vehicle(device_id) if fleet is not None else None
+    if vehicle is None:
+        return jsonify({'error': 'Vehicle not found'}), 404
+    trips = vehicle.trips()
+    return _json({'vehicle': device_id, 'trips': trips, 'count': len(trips)})
+
+
+@app.route('/api/fleet/leaderboard')
+def get_leaderboard():
+    """Vehicles ranked by score (or alerts, max_speed, readings)."""
+    fleet = _fleet()
+    if fleet is None:
+        return jsonify({'error': 'Fleet mode is not enabled'}), 404
+    sort = request.args.get('sort', 'score')
+    if sort not in RANKINGS:
+        return jsonify({'error': f"sort must be one of: {', '.join(RANKINGS)}"}), 400
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify({'sort': sort, 'leaderboard': fleet.leaderboard(sort, max(0, limit))})
 
 
 @app.route('/api/config', methods=['GET', 'POST'])
@@ -211,57 +528,330 @@ def handle_config():
             config['speed_danger'] = float(data['speed_danger'])
         if 'accel_harsh' in data:
             config['accel_harsh'] = float(data['accel_harsh'])
-        return jsonify({'status': 'success', 'config': config})
+        if 'score_speeding' in data:
+            config['score_speeding'] = int(data['score_speeding'])
+        if 'score_harsh' in data:
+            config['score_harsh'] = int(data['score_harsh'])
+        # Risk detection follows the speed threshold from now on
+        for source in (live_source, fleet_source):
+            if hasattr(source, 'set_speed_limit'):
+                source.set_speed_limit(config['speed_danger'])
+        # Production workers share thresholds through the ingest process
+        publish = getattr(live_source, 'publish_config', None)
+        if publish is not None:
+            publish(config)
+        # What the live session would have scored under the new settings
+        key, load = _live_pieces()
+        result = rescore_cached(key, load, _config_thresholds())
+        return jsonify({'status': 'success', 'config': config, 'rescore': summary(result)})
     
+    live_source.poll()      # Picks up thresholds changed through another worker
     return jsonify(config)
 
 
+# Columns the scoring engine reads (score is compared, lat/lon go into alerts)
+SCORE_COLUMNS = ('timestamp', 'speed', 'acc', 'gps_valid', 'score', 'lat', 'lon')
+
+
+def _config_thresholds():
+    return Thresholds(config['speed_danger'], config['accel_harsh'],
+                      config['score_speeding'], config['score_harsh'])
+
+
+def _piece_loader(readings, lock):
+    """Loader for rescore_cached(): the scoring columns in pieces (see reading_pieces())."""
+    def load():
+        with lock:
+            return reading_pieces(readings, SCORE_COLUMNS)
+    return load
+
+
+def _live_pieces():
+    """(cache key, piece loader) for the live session."""
+    live = live_source.poll()
+    key = ('live', id(live_source), live_source.generation, len(live.readings))
+    return key, _piece_loader(live.readings, live_source.lock)
+
+
+def _threshold_sets():
+    """Threshold sets from the request; comma-separated values are combined."""
+    values = {}
+    for field in Thresholds._fields:
+        text = request.args.get(field)
+        if text:
+            cast = int if field.startswith('score_') else float
+            values[field] = [cast(v) for v in text.split(',') if v.strip()]
+    return threshold_grid(_config_thresholds(), values)
+
+
+@app.route('/api/rescore')
+def get_rescore():
+    """Score stored readings again with other thresholds.
+    
+    Query parameters:
+        session         - history filename (default: the live session)
+        scope=fleet     - every vehicle of the fleet instead
+        speed_danger, accel_harsh, score_speeding, score_harsh
+                        - values to try (default: the current config); give
+                          comma-separated lists to compare every combination
+        alerts=1        - include the alerts each threshold set would raise
+    
+    Results are cached per session version and threshold set.
+    """
+    try:
+        threshold_sets = _threshold_sets()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with_alerts = request.args.get('alerts') == '1'
+    
+    if request.args.get('scope') == 'fleet':
+        fleet = _fleet()
+        if fleet is None:
+            return jsonify({'error': 'Fleet mode is not enabled'}), 404
+        vehicles = sorted(fleet.vehicles(), key=lambda v: v.device_id)
+        results = []
+        start = time.perf_counter()
+        with STAGE_SECONDS.labels('rescore').time():
+            for thresholds in threshold_sets:
+                rows = []
+                for vehicle in vehicles:
+                    load = _piece_loader(vehicle.data.readings, vehicle.lock)
+                    result = rescore_cached(('vehicle', vehicle.device_id, vehicle.version),
+                                            load, thresholds)
+                    row = summary(result)
+                    del row['thresholds']
+                    rows.append(dict(row, id=vehicle.device_id))
+                grades = {}
+                for row in rows:
+                    grades[row['grade']] = grades.get(row['grade'], 0) + 1
+                results.append({
+                    'thresholds': thresholds._asdict(),
+                    'avg_score': round(sum(r['final_score'] for r in rows) / len(rows), 1) if rows else None,
+                    'grades': grades,
+                    'total_alerts': sum(r['total_alerts'] for r in rows),
+                    'vehicles': rows
+                })
+        return _json({
+            'scope': 'fleet',
+            'results': results,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        })
+    
+    session = request.args.get('session')
+    if session:
+        filepath = HISTORY_DIR / session
+        if not is_session_file(session) or not filepath.exists():
+            return jsonify({'error': 'File not found'}), 404
+        stat = filepath.stat()
+        key = ('history', str(filepath), stat.st_size, stat.st_mtime_ns)
+        load = _piece_loader(open_session(filepath), threading.Lock())
+    else:
+        key, load = _live_pieces()
+    
+    results = []
+    start = time.perf_counter()
+    with STAGE_SECONDS.labels('rescore').time():
+        for thresholds in threshold_sets:
+            result = rescore_cached(key, load, thresholds)
+            entry = summary(result)
+            if with_alerts:
+                entry['alerts_speed'], entry['alerts_harsh'] = alerts(result)
+            results.append(entry)
+    
+    return _json({
+        'session': session or 'live',
+        'results': results,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
+
+
 @app.route('/api/history')
 def get_history():
-    """Get list of historical sessions."""
+    """Get list of historical sessions with their summary stats."""
     sessions = []
-    if HISTORY_DIR.exists():
-        for f in sorted(HISTORY_DIR.glob("session_*.out"), reverse=True):
-            stat = f.stat()
-            sessions.append({
-                'filename': f.name,
-                'date': f.stem.replace('session_', ''),
-                'size': stat.st_size,
-                'size_kb': round(stat.st_size / 1024, 1)
-            })
-    return jsonify({'sessions': sessions})
+    for f in list_sessions(HISTORY_DIR):
+        stat = f.stat()
+        session = {
+            'filename': f.name,
+            'date': f.stem.replace('session_', ''),
+            'format': 'columnar' if f.suffix == ARCHIVE_SUFFIX else 'text',
+            'size': stat.st_size,
+            'size_kb': round(stat.st_size / 1024, 1)
+        }
+        try:
+            session.update(session_summary(f))
+        except (OSError, ValueError) as e:
+            print(f"Error indexing {f.name}: {e}")
+        sessions.append(session)
+    return _json({'sessions': sessions})
+
+
+@app.route('/api/history/analytics')
+def get_history_analytics():
+    """Aggregates across all history sessions, computed in parallel.
+    
+    Query parameters:
+        since, until - ISO dates (inclusive) limiting the sessions
+        period       - day, week or month (default) for the trend rows
+        sessions=0   - leave out the per-session rows
+    """
+    since, until = request.args.get('since'), request.args.get('until')
+    period = request.args.get('period', 'month')
+    try:
+        for value in (since, until):
+            if value:
+                date.fromisoformat(value)
+    except ValueError:
+        return jsonify({'error': 'since and until must be dates (YYYY-MM-DD)'}), 400
+    if period not in PERIODS:
+        return jsonify({'error': f"period must be one of {', '.join(PERIODS)}"}), 400
+    
+    with STAGE_SECONDS.labels('analytics').time():
+        report = history_report(HISTORY_DIR, since, until, period,
+                                sessions=request.args.get('sessions') != '0',
+                                speed_limit=config['speed_danger'])
+    return _json(report)
 
 
 @app.route('/api/history/<filename>')
 def get_history_data(filename):
     """Get data from a historical session."""
     filepath = HISTORY_DIR / filename
-    if not filepath.exists() or not filename.startswith('session_'):
+    if not filepath.exists() or not is_session_file(filename):
         return jsonify({'error': 'File not found'}), 404
     
-    batch_data, alerts_speed, alerts_harsh, _ = parse_telegraf_file(filepath)
+    try:
+        max_points, method = _downsample_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    speed_limit = config['speed_danger']
+    
+    def build():
+        with STAGE_SECONDS.labels('history_load').time():
+            meta, readings = load_indexed_session(filepath)
+        columns = {name: readings.column(name) for name in COLUMNS}
+        batch_data, downsampled = _chart_records(columns, max_points, method)
+        with STAGE_SECONDS.labels('risk').time():
+            risk = detect_risks(columns, speed_limit=speed_limit)
+        
+        return _json({
+            'batch_data': batch_data,
+            'downsampled': downsampled,
+            'alerts_speed': meta['alerts_speed'],
+            'alerts_harsh': meta['alerts_harsh'],
+            'alerts_risk': risk,
+            'stats': meta['stats']
+        }).get_data()
+    
+    # The recording only changes with size/mtime, but its risk events follow
+    # the speed threshold, so clients revalidate
+    version = f"{_history_version(filepath)}-{speed_limit}"
+    return cached_response(version, build, LIVE_CACHE_CONTROL, (max_points, method))
+
+
+@app.route('/api/spatial')
+def get_spatial():
+    """Map viewport: per-cell reading counts, speeds and events, plus hotspots.
     
-    total_readings = len(batch_data)
-    if batch_data:
-        current_score = batch_data[-1].get('score', 100)
-        max_speed = max(d.get('speed', 0) for d in batch_data)
-        avg_speed = sum(d.get('speed', 0) for d in batch_data) / total_readings
+    Query parameters:
+        bbox        - west,south,east,north in degrees (default: the world)
+        zoom        - map zoom level; cells are 4x4 per map tile (default 2)
+        session     - history filename (default: the live session)
+        scope=fleet - all vehicles of the fleet instead
+        hotspots    - cells with the most speeding/harsh events to list (default 10)
+    """
+    session = request.args.get('session')
+    if request.args.get('scope') == 'fleet':
+        fleet = _fleet()
+        if fleet is None:
+            return jsonify({'error': 'Fleet mode is not enabled'}), 404
+        index = fleet.spatial
+    elif session:
+        filepath = HISTORY_DIR / session
+        if not is_session_file(session) or not filepath.exists():
+            return jsonify({'error': 'File not found'}), 404
+        stat = filepath.stat()
+        
+        def build():
+            meta = ensure_index(filepath)
+            readings = open_session(filepath)
+            columns = {name: readings.column(name) for name in COLUMNS}
+            return TileIndex.from_columns(columns, meta['alerts_speed'], meta['alerts_harsh'])
+        with STAGE_SECONDS.labels('spatial_index').time():
+            index = cached_index((str(filepath), stat.st_size, stat.st_mtime_ns), build)
     else:
-        current_score = 100
-        max_speed = 0
-        avg_speed = 0
+        index = live_source.poll().spatial
+    
+    try:
+        bbox = parse_bbox(request.args.get('bbox'))
+        zoom = request.args.get('zoom', 2, type=int)
+        hotspots = request.args.get('hotspots', HOTSPOTS, type=int)
+        with STAGE_SECONDS.labels('spatial_query').time():
+            result = index.query(bbox, zoom, max(0, hotspots))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    result['session'] = 'fleet' if request.args.get('scope') == 'fleet' else session or 'live'
+    result['bbox'] = bbox
+    result['count'] = len(result['cells'])
+    return _json(result)
+
+
+def _session_trips(session):
+    """(trips, readings, speed alerts, harsh alerts) of a history session or
+    the live one, or None if the session does not exist."""
+    if session:
+        filepath = HISTORY_DIR / session
+        if not is_session_file(session) or not filepath.exists():
+            return None
+        meta = ensure_index(filepath)
+        return session_trips(filepath), open_session(filepath), meta['alerts_speed'], meta['alerts_harsh']
+    live = live_source.poll()
+    with live_source.lock:
+        return live.trips.summaries(), live.readings, list(live.alerts_speed), list(live.alerts_harsh)
+
+
+@app.route('/api/trips')
+def get_trips():
+    """Trip list of the live session, or of a history session (?session=)."""
+    session = request.args.get('session')
+    found = _session_trips(session)
+    if found is None:
+        return jsonify({'error': 'File not found'}), 404
+    trips = found[0]
+    return _json({'session': session or 'live', 'trips': trips, 'count': len(trips)})
+
+
+@app.route('/api/trips/<int:trip_id>')
+def get_trip(trip_id):
+    """Trip report: summary, readings and alerts of one trip.
+    
+    Takes ?session= like /api/trips and max_points/method like /api/data.
+    """
+    session = request.args.get('session')
+    found = _session_trips(session)
+    if found is None:
+        return jsonify({'error': 'File not found'}), 404
+    trips, readings, alerts_speed, alerts_harsh = found
+    if not 0 <= trip_id < len(trips):
+        return jsonify({'error': 'Trip not found'}), 404
+    try:
+        max_points, method = _downsample_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
+    trip = trips[trip_id]
+    start, stop = trip['first_row'], trip['last_row'] + 1
+    columns = {name: readings.column(name, start, stop) for name in COLUMNS}
+    batch_data, downsampled = _chart_records(columns, max_points, method)
+    
+    return _json({
+        'session': session or 'live',
+        'trip': trip,
         'batch_data': batch_data,
-        'alerts_speed': alerts_speed,
-        'alerts_harsh': alerts_harsh,
-        'stats': {
-            'total_readings': total_readings,
-            'total_alerts': len(alerts_speed) + len(alerts_harsh),
-            'current_score': current_score,
-            'max_speed': max_speed,
-            'avg_speed': avg_speed
-        }
+        'downsampled': downsampled,
+        'alerts_speed': trip_alerts(trip, alerts_speed),
+        'alerts_harsh': trip_alerts(trip, alerts_harsh)
     })
 
 
@@ -0,0 +1,271 @@
+"""
+DriveGuard Dashboard - Columnar Session Archive
+Compact, memory-mappable storage for archived driving sessions (.dgc).
+
+File layout:
+    b"DGC1" | uint32 header length | JSON header | padding | column blocks
+
+The JSON header holds the tag dictionary, alerts, status messages, the
+stats block, trip summaries and a descriptor (byte offset, dtype,
+encoding) for every column. Column blocks are raw little-endian arrays aligned to 8 bytes, so
+a reader maps the file once and slices columns without reading the rest:
+
+    delta   - first value in the header, then differences between rows,
+              with an absolute anchor every ANCHOR_EVERY rows so any slice
+              can be decoded without summing from the start
+    scaled  - value / scale rounded to the smallest integer type that fits
+              (0.1 km/h speed, 0.01 g acceleration, 1e-6 degree lat/lon)
+    plain   - stored as is
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from session import SessionData
+from store import COLUMNS, ReadingStore
+from telegraf_parser import decode_line, record_kind, build_record
+
+MAGIC = b"DGC1"
+FORMAT_VERSION = 1
+ARCHIVE_SUFFIX = ".dgc"
+ANCHOR_EVERY = 1024
+ALIGN = 8
+
+# Reading column -> (encoding, scale)
+ENCODINGS = {
+    'timestamp': ('delta', None),
+    'recv_ms': ('delta', None),
+    'speed': ('scaled', 0.1),
+    'lat': ('scaled', 1e-6),
+    'lon': ('scaled', 1e-6),
+    'acc': ('scaled', 0.01),
+    'score': ('plain', None),
+    'gps_valid': ('plain', None),
+    'tag_id': ('plain', None),
+}
+
+_INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def _smallest_int(values):
+    """Smallest signed integer dtype that holds every value."""
+    if len(values) == 0:
+        return np.dtype(np.int8)
+    lo, hi = int(values.min()), int(values.max())
+    for dtype in _INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _encode(name, values, encodings=ENCODINGS):
+    """Encode one column; returns (descriptor, raw array)."""
+    encoding, scale = encodings[name]
+    desc = {'encoding': encoding}
+
+    if encoding == 'delta':
+        values = values.astype(np.int64)
+        deltas = np.diff(values, prepend=values[:1]) if len(values) else values
+        desc['anchors'] = values[::ANCHOR_EVERY].tolist()
+        raw = deltas.astype(_smallest_int(deltas))
+    elif encoding == 'scaled':
+        quantized = np.round(values.astype(np.float64) / scale)
+        if len(quantized) and not np.all(np.isfinite(quantized)):
+            # NaN/inf cannot be quantized; keep the column as floats
+            desc['encoding'] = 'plain'
+            raw = values.astype(np.float64)
+        else:
+            desc['scale'] = scale
+            raw = quantized.astype(_smallest_int(quantized))
+    else:
+        raw = values.astype(_smallest_int(values)) if values.dtype.kind in 'iub' else values
+
+    desc['dtype'] = raw.dtype.str
+    return desc, raw
+
+
+def write_archive(path, data, tag_ids, tag_dict, recv_ms):
+    """Write a SessionData (plus per-reading tag ids/receive times) as .dgc."""
+    readings = data.readings
+    columns = {name: readings.column(name) for name in COLUMNS}
+    columns['tag_id'] = np.asarray(tag_ids, dtype=np.int64)
+    columns['recv_ms'] = np.asarray(recv_ms, dtype=np.int64)
+    write_columns(path, columns, {
+        'tags': tag_dict,
+        'stats': data.summary(),
+        'alerts_speed': data.alerts_speed,
+        'alerts_harsh': data.alerts_harsh,
+        'status': data.status_msgs,
+        'trips': data.trips.finish()
+    })
+
+
+def write_columns(path, columns, extra_header=None, encodings=ENCODINGS):
+    """Write reading columns (any of ENCODINGS) plus header fields as .dgc.
+
+    Pass other encodings to store some columns differently, e.g. 'plain'
+    floats where the scaled integers would lose precision.
+    """
+    descriptors = {}
+    blocks = []
+    offset = 0
+    for name in encodings:
+        if name not in columns:
+            continue
+        desc, raw = _encode(name, np.asarray(columns[name]), encodings)
+        desc['offset'] = offset
+        desc['nbytes'] = raw.nbytes
+        descriptors[name] = desc
+        blocks.append(raw)
+        offset += raw.nbytes + (-raw.nbytes % ALIGN)
+
+    ts = np.asarray(columns['timestamp'])
+    header = {
+        'version': FORMAT_VERSION,
+        'rows': len(ts),
+        'anchor_every': ANCHOR_EVERY,
+        'columns': descriptors,
+        'time_bounds': {
+            'first_ts': int(ts.min()) if len(ts) else None,
+            'last_ts': int(ts.max()) if len(ts) else None
+        }
+    }
+    header.update(extra_header or {})
+    header_bytes = json.dumps(header).encode()
+    preamble = MAGIC + np.uint32(len(header_bytes)).tobytes() + header_bytes
+    preamble += b"\0" * (-len(preamble) % ALIGN)
+
+    tmp = Path(str(path) + ".tmp")
+    with open(tmp, 'wb') as f:
+        f.write(preamble)
+        for raw in blocks:
+            f.write(raw.astype(raw.dtype.newbyteorder('<'), copy=False).tobytes())
+            f.write(b"\0" * (-raw.nbytes % ALIGN))
+    os.replace(tmp, path)
+
+
+def convert_telegraf_file(source, target=None):
+    """Convert a Telegraf session file into a .dgc archive; returns its path."""
+    source = Path(source)
+    target = Path(target) if target else source.with_suffix(ARCHIVE_SUFFIX)
+
+    data = SessionData(running_stats=False)
+    tag_ids = []
+    recv_ms = []
+    tag_lookup = {}
+    tag_dict = []
+
+    with open(source, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            decoded = decode_line(line)
+            if decoded is None:
+                continue
+            measurement, tags, fields, timestamp = decoded
+            kind = record_kind(measurement, tags)
+            if kind is None:
+                continue
+            record = build_record(kind, fields)
+            data.add(kind, record)
+            if kind == 'batch_data':
+                key = (measurement,) + tuple(sorted(tags.items()))
+                if key not in tag_lookup:
+                    tag_lookup[key] = len(tag_dict)
+                    tag_dict.append({'measurement': measurement, **tags})
+                tag_ids.append(tag_lookup[key])
+                recv_ms.append(timestamp // 1000000 if timestamp is not None else 0)
+
+    write_archive(target, data, tag_ids, tag_dict, recv_ms)
+    return target
+
+
+class ColumnarArchive:
+    """Read-only, memory-mapped view of a .dgc session archive."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.buffer = np.memmap(self.path, dtype=np.uint8, mode='r')
+        if self.buffer[:4].tobytes() != MAGIC:
+            raise ValueError(f"{self.path.name} is not a DriveGuard archive")
+        header_len = int(self.buffer[4:8].view('<u4')[0])
+        self.header = json.loads(self.buffer[8:8 + header_len].tobytes())
+        data_start = 8 + header_len
+        self.data_start = data_start + (-data_start % ALIGN)
+        self.rows = self.header['rows']
+        # Absolute timestamp every anchor_every rows: a persisted sparse index
+        self.anchors = np.asarray(self.header['columns']['timestamp']['anchors'], dtype=np.int64)
+        self._ts_sorted = None
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def ts_sorted(self):
+        """True if timestamps never decrease (all stored deltas are >= 0)."""
+        if self._ts_sorted is None:
+            self._ts_sorted = bool(np.all(self.raw('timestamp')[1:] >= 0))
+        return self._ts_sorted
+
+    def _search(self, value, side):
+        """np.searchsorted over the timestamp column, decoding one block."""
+        anchor_every = self.header['anchor_every']
+        block = max(0, int(np.searchsorted(self.anchors, value, side)) - 1)
+        first = block * anchor_every
+        ts = self.column('timestamp', first, min(self.rows, first + anchor_every))
+        return first + int(np.searchsorted(ts, value, side))
+
+    def time_range(self, t_from=None, t_to=None):
+        """Row indices [start, stop) with t_from <= timestamp <= t_to."""
+        if not self.ts_sorted:
+            raise ValueError("timestamps are not sorted")
+        start = 0 if t_from is None else self._search(t_from, 'left')
+        stop = self.rows if t_to is None else self._search(t_to, 'right')
+        return start, max(start, stop)
+
+    def raw(self, name):
+        """Stored (encoded) column as a zero-copy view into the file."""
+        desc = self.header['columns'][name]
+        dtype = np.dtype(desc['dtype'])
+        return np.frombuffer(self.buffer, dtype=dtype, count=self.rows,
+                             offset=self.data_start + desc['offset'])
+
+    def column(self, name, start=None, stop=None):
+        """Decoded values of one column over rows [start, stop)."""
+        start, stop, _ = slice(start, stop).indices(self.rows)
+        stop = max(start, stop)
+        desc = self.header['columns'][name]
+        raw = self.raw(name)
+
+        if desc['encoding'] == 'delta':
+            anchor_every = self.header['anchor_every']
+            block = start // anchor_every
+            first = block * anchor_every
+            if stop == start:
+                return np.zeros(0, dtype=np.int64)
+            base = desc['anchors'][block]
+            # Sum deltas from the anchor row; the anchor's own delta is skipped
+            values = base + np.cumsum(raw[first + 1:stop], dtype=np.int64)
+            values = np.concatenate(([base], values))
+            return values[start - first:]
+        if desc['encoding'] == 'scaled':
+            return raw[start:stop] * desc['scale']
+        return raw[start:stop]
+
+    def slice(self, start=None, stop=None):
+        """Reading columns (API dtypes) for rows [start, stop)."""
+        return {
+            name: self.column(name, start, stop).astype(COLUMNS[name][0])
+            for name in COLUMNS
+        }
+
+    def to_store(self, start=None, stop=None):
+        """Readings as a ReadingStore."""
+        return ReadingStore.from_columns(self.slice(start, stop))
+
+    @property
+    def meta(self):
+        """Stats, alerts, status and time bounds, as in the history index."""
+        return self.header
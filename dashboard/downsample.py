@@ -0,0 +1,124 @@
+"""
+DriveGuard Dashboard - Chart Downsampling
+Reduces reading columns to a bounded number of chart points.
+
+Methods:
+    lttb    - Largest-Triangle-Three-Buckets, keeps the visual shape
+    minmax  - the lowest and highest reading of every bucket
+    avg     - one averaged point per bucket, with the bucket's peaks
+
+lttb and minmax return real readings, picked so the speed and the
+acceleration series each get half of the point budget; spikes in either
+survive. avg returns synthetic rows carrying speed_max/acc_max.
+"""
+
+import numpy as np
+
+METHODS = ('lttb', 'minmax', 'avg')
+DEFAULT_METHOD = 'lttb'
+
+# Series that decide which readings are kept
+SERIES = ('speed', 'acc')
+
+
+def _bucket_edges(start, stop, n_buckets):
+    """Equal-count bucket boundaries over rows [start, stop)."""
+    return np.linspace(start, stop, n_buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x, y, n_out):
+    """Row indices picked by Largest-Triangle-Three-Buckets."""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=np.int64)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    # First and last points are always kept; the rest is split in buckets
+    edges = _bucket_edges(1, n - 1, n_out - 2)
+    sizes = np.diff(edges)
+    avg_x = np.add.reduceat(x, edges[:-1]) / sizes
+    avg_y = np.add.reduceat(y, edges[:-1]) / sizes
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.append(avg_y[1:], y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area between the last pick, each candidate
+        # and the average of the next bucket
+        area = np.abs((x[a] - avg_x[i]) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (avg_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y, n_out):
+    """Row indices of the minimum and maximum of every bucket."""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    n_buckets = max(1, n_out // 2)
+    edges = _bucket_edges(0, n, n_buckets)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    # Sort by (bucket, value): each bucket's run starts with its minimum
+    order = np.lexsort((y, bucket))
+    picks = np.concatenate((order[edges[:-1]], order[edges[1:] - 1]))
+    return np.unique(picks)
+
+
+def _select(columns, max_points, method):
+    """Indices chosen for each series with half the budget each, merged."""
+    n = len(columns['timestamp'])
+    budget = max(3, max_points // len(SERIES))
+    picks = [np.array([0, n - 1])]
+    for name in SERIES:
+        if method == 'lttb':
+            picks.append(lttb_indices(columns['timestamp'], columns[name], budget))
+        else:
+            picks.append(minmax_indices(columns[name], budget))
+    return np.unique(np.concatenate(picks))
+
+
+def _bucket_averages(columns, max_points):
+    """One averaged row per bucket, plus the bucket's speed/acc peaks."""
+    n = len(columns['timestamp'])
+    edges = _bucket_edges(0, n, max_points)
+    starts = edges[:-1]
+    sizes = np.diff(edges)
+
+    def mean(name):
+        return np.add.reduceat(columns[name].astype(np.float64), starts) / sizes
+
+    return {
+        'timestamp': columns['timestamp'][starts],
+        'speed': mean('speed'),
+        'lat': mean('lat'),
+        'lon': mean('lon'),
+        'acc': mean('acc'),
+        'score': np.minimum.reduceat(columns['score'], starts),
+        'gps_valid': np.minimum.reduceat(columns['gps_valid'], starts),
+        'speed_max': np.maximum.reduceat(columns['speed'], starts),
+        'acc_max': np.maximum.reduceat(columns['acc'], starts),
+        'count': sizes
+    }
+
+
+def downsample(columns, max_points, method=DEFAULT_METHOD):
+    """Reduce reading columns to about max_points rows."""
+    if method not in METHODS:
+        raise ValueError(f"unknown method '{method}', use one of {', '.join(METHODS)}")
+    n = len(columns['timestamp'])
+    if max_points is None or n <= max_points:
+        return columns
+    max_points = max(2, int(max_points))
+
+    if method == 'avg':
+        return _bucket_averages(columns, max_points)
+    keep = _select(columns, max_points, method)
+    return {name: arr[keep] for name, arr in columns.items()}
@@ -0,0 +1,183 @@
+"""
+DriveGuard Dashboard - Streaming Export
+Readings and alerts of a session or time range, written out piece by piece.
+
+An export walks its rows EXPORT_CHUNK at a time, straight from the source
+(the live store, a memory-mapped .dgc archive or a loaded history
+session), and encodes each piece as soon as it is read, so memory use does
+not grow with the size of the range. Three formats:
+
+    csv       - one record type, a header row and one line per record
+    ndjson    - one JSON object per line, with its record type in 'kind'
+    columnar  - binary blocks of typed columns (see below)
+
+The columnar stream starts with STREAM_MAGIC. Each block is a 4-byte
+little-endian header length, a JSON header {'kind', 'rows', 'columns':
+[[name, dtype], ...]} and then each column's values back to back in that
+order. A block with kind 'end' (and the record counts) closes the stream,
+so a reader can tell a complete export from a cut-off one.
+read_columnar() turns such a stream back into (kind, columns) pieces.
+"""
+
+import json
+import struct
+from itertools import islice
+
+import numpy as np
+
+from store import COLUMNS
+from telegraf_parser import SCHEMAS
+
+EXPORT_CHUNK = 10000         # Rows read and encoded at a time
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'columnar': ('application/octet-stream', 'dgs'),
+}
+RECORD_KINDS = {
+    'readings': 'batch_data',
+    'alert_speed': 'alert_speed',
+    'alert_harsh': 'alert_harsh',
+}
+STREAM_MAGIC = b"DGS1"
+
+
+def alert_fields(kind):
+    """Column names of an alert type."""
+    return [out for out, _, _ in SCHEMAS[kind]]
+
+
+def _alert_dtype(name):
+    return np.dtype('<i8') if name in ('timestamp', 'score') else np.dtype('<f8')
+
+
+def _typed(name, values):
+    """Column values in their API dtype (archives decode scaled columns as float64)."""
+    return values.astype(COLUMNS[name][0], copy=False)
+
+
+def reading_chunks(source, t_from=None, t_to=None, fields=None, chunk=EXPORT_CHUNK):
+    """Reading columns between two timestamps, chunk rows at a time.
+
+    The rows are fixed when the export starts; readings that arrive while
+    it runs are left for the next one.
+    """
+    fields = fields or list(COLUMNS)
+    n = len(source)
+    if source.ts_sorted:
+        start, stop = source.time_range(t_from, t_to)
+        for lo in range(start, stop, chunk):
+            hi = min(stop, lo + chunk)
+            yield {name: _typed(name, source.column(name, lo, hi)) for name in fields}
+        return
+
+    # Out-of-order timestamps: filter each chunk
+    for lo in range(0, n, chunk):
+        hi = min(n, lo + chunk)
+        ts = source.column('timestamp', lo, hi)
+        mask = np.ones(len(ts), dtype=bool)
+        if t_from is not None:
+            mask &= ts >= t_from
+        if t_to is not None:
+            mask &= ts <= t_to
+        if mask.any():
+            yield {name: _typed(name, source.column(name, lo, hi)[mask]) for name in fields}
+
+
+def alert_chunks(kind, alerts, count, t_from=None, t_to=None, chunk=EXPORT_CHUNK):
+    """Alert columns of the first count alerts in a time range, chunk at a time.
+
+    Alert timestamps are whole seconds, so the range is compared in seconds.
+    """
+    names = alert_fields(kind)
+    s_from = None if t_from is None else t_from // 1000
+    s_to = None if t_to is None else t_to // 1000
+    batch = []
+    for alert in islice(alerts, count):
+        ts = alert.get('timestamp', 0)
+        if (s_from is not None and ts < s_from) or (s_to is not None and ts > s_to):
+            continue
+        batch.append(alert)
+        if len(batch) == chunk:
+            yield _alert_columns(batch, names)
+            batch = []
+    if batch:
+        yield _alert_columns(batch, names)
+
+
+def _alert_columns(alerts, names):
+    return {name: np.array([a.get(name, 0) for a in alerts], dtype=_alert_dtype(name))
+            for name in names}
+
+
+def _rounded(name, values):
+    decimals = COLUMNS[name][1] if name in COLUMNS else None
+    if decimals is not None:
+        return np.round(values.astype(np.float64), decimals)
+    return values
+
+
+def _lines(template, columns):
+    """One line per row, values formatted into template with %r."""
+    lists = [_rounded(name, np.asarray(values)).tolist() for name, values in columns.items()]
+    return ''.join([template % row for row in zip(*lists)])
+
+
+def export_csv(pieces, names):
+    """CSV bytes of one record type's pieces (named columns)."""
+    yield (','.join(names) + '\n').encode()
+    for _, columns in pieces:
+        yield _lines(','.join(['%r'] * len(columns)) + '\n', columns).encode()
+
+
+def export_ndjson(pieces):
+    """NDJSON bytes of (kind, columns) pieces."""
+    for kind, columns in pieces:
+        # Column names are plain identifiers and the values numbers
+        template = '{"kind":"%s",%s}\n' % (kind, ','.join(f'"{name}":%r' for name in columns))
+        yield _lines(template, columns).encode()
+
+
+def export_columnar(pieces):
+    """Columnar stream bytes of (kind, columns) pieces."""
+    yield STREAM_MAGIC
+    counts = {}
+    for kind, columns in pieces:
+        arrays = [(name, np.ascontiguousarray(values, dtype=np.dtype(values.dtype).newbyteorder('<')))
+                  for name, values in columns.items()]
+        rows = len(arrays[0][1]) if arrays else 0
+        counts[kind] = counts.get(kind, 0) + rows
+        yield _block({'kind': kind, 'rows': rows,
+                      'columns': [[name, values.dtype.str] for name, values in arrays]})
+        for _, values in arrays:
+            yield values.tobytes()
+    yield _block({'kind': 'end', 'rows': 0, 'columns': [], 'counts': counts})
+
+
+def _block(header):
+    encoded = json.dumps(header, separators=(',', ':')).encode()
+    return struct.pack('<I', len(encoded)) + encoded
+
+
+def read_columnar(stream):
+    """(kind, columns) pieces of a columnar export read from a binary file object.
+
+    Raises ValueError if the stream is not an export or was cut off.
+    """
+    if stream.read(4) != STREAM_MAGIC:
+        raise ValueError("not a DriveGuard export stream")
+    while True:
+        size = stream.read(4)
+        if len(size) < 4:
+            raise ValueError("export stream ended early")
+        header = json.loads(stream.read(struct.unpack('<I', size)[0]))
+        if header['kind'] == 'end':
+            return
+        columns = {}
+        for name, dtype in header['columns']:
+            dtype = np.dtype(dtype)
+            raw = stream.read(dtype.itemsize * header['rows'])
+            if len(raw) < dtype.itemsize * header['rows']:
+                raise ValueError("export stream ended early")
+            columns[name] = np.frombuffer(raw, dtype=dtype)
+        yield header['kind'], columns
@@ -0,0 +1,217 @@
+"""
+DriveGuard Dashboard - Fleet State
+Live sessions of many boards at once, partitioned by device ID.
+
+Every vehicle owns its SessionData behind its own lock, so ingesting one
+board never blocks queries for another. Vehicles live in hash shards that
+are only locked to add a new device. The per-vehicle reading store is a
+bounded window (older readings are dropped, the running stats keep the
+whole session), and the vehicle list / leaderboard is rebuilt at most once
+per SUMMARY_TTL instead of on every request. One map tile index covers
+all vehicles (harsh alerts are matched to readings of their own board).
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from anomaly import SPEED_LIMIT
+from scoring import grade
+from session import SessionData
+from spatial import TileIndex
+from store import COLUMNS
+from tailer import TelegrafTailer
+from telegraf_parser import parse_fleet_line
+
+SHARDS = 16
+VEHICLE_WINDOW = 8640        # Readings kept per vehicle (24 h at 10 s)
+ALERT_WINDOW = 500           # Alerts of each type kept per vehicle
+SUMMARY_TTL = 1.0            # Seconds a vehicle list may be reused
+UNKNOWN_DEVICE = "unknown"
+
+# Leaderboard sort keys -> (stats field, highest first)
+RANKINGS = {
+    'score': ('current_score', True),
+    'alerts': ('total_alerts', False),
+    'max_speed': ('max_speed', False),
+    'readings': ('total_readings', True),
+}
+
+
+class Vehicle:
+    """One board's live session."""
+
+    def __init__(self, device_id, window=VEHICLE_WINDOW, speed_limit=SPEED_LIMIT):
+        self.device_id = device_id
+        self.window = window
+        # The fleet-wide tile index covers the map; no index per vehicle
+        self.data = SessionData(spatial=False)
+        self.data.set_speed_limit(speed_limit)
+        self.lock = threading.Lock()
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+        # Bumped on every record, so cached results can tell they are stale
+        self.version = 0
+        # Readings trimmed off the front of the window so far
+        self.dropped = 0
+
+    def add(self, kind, record):
+        """Add one record, trimming the window once it doubles."""
+        with self.lock:
+            data = self.data
+            data.add(kind, record)
+            if kind == 'batch_data' and len(data.readings) >= 2 * self.window:
+                self.dropped += len(data.readings) - self.window
+                data.readings.keep_last(self.window)
+            elif kind == 'alert_speed' and len(data.alerts_speed) >= 2 * ALERT_WINDOW:
+                del data.alerts_speed[:-ALERT_WINDOW]
+            elif kind == 'alert_harsh' and len(data.alerts_harsh) >= 2 * ALERT_WINDOW:
+                del data.alerts_harsh[:-ALERT_WINDOW]
+            elif kind == 'quality' and len(data.quality_events) >= 2 * ALERT_WINDOW:
+                del data.quality_events[:-ALERT_WINDOW]
+            elif kind == 'status' and len(data.status_msgs) >= 2 * ALERT_WINDOW:
+                del data.status_msgs[:-ALERT_WINDOW]
+            if kind == 'batch_data' and len(data.alerts_risk) >= 2 * ALERT_WINDOW:
+                # Risk events come out of readings
+                del data.alerts_risk[:-ALERT_WINDOW]
+            self.last_seen = time.time()
+            self.version += 1
+
+    def snapshot(self, window=None):
+        """Copies of the latest readings and alerts plus the stats block."""
+        with self.lock:
+            data = self.data
+            start = -window if window else None
+            columns = {name: np.array(data.readings.column(name, start)) for name in COLUMNS}
+            return {
+                'columns': columns,
+                'alerts_speed': list(data.alerts_speed),
+                'alerts_harsh': list(data.alerts_harsh),
+                'alerts_risk': list(data.alerts_risk),
+                'status': list(data.status_msgs[-1:]),
+                'quality': list(data.quality_events),
+                'stats': data.summary()
+            }
+
+    def trips(self):
+        """Trip summaries with their rows counted in the current window.
+
+        The trip detector numbers readings from the start of the session;
+        rows trimmed off the window since come back as None.
+        """
+        with self.lock:
+            trips, dropped = self.data.trips.summaries(), self.dropped
+        shifted = []
+        for trip in trips:
+            trip = dict(trip)
+            for key in ('first_row', 'last_row'):
+                row = trip[key] - dropped
+                trip[key] = row if row >= 0 else None
+            shifted.append(trip)
+        return shifted
+
+    def summary(self):
+        """Row for the vehicle list and leaderboard."""
+        with self.lock:
+            stats = self.data.summary()
+        return {
+            'id': self.device_id,
+            'grade': grade(stats['current_score']),
+            'current_score': stats['current_score'],
+            'total_readings': stats['total_readings'],
+            'total_alerts': stats['total_alerts'],
+            'speed_alerts': stats['speed_alerts'],
+            'harsh_alerts': stats['harsh_alerts'],
+            'risk_alerts': stats['risk_alerts'],
+            'max_speed': stats['max_speed'],
+            'avg_speed': stats['avg_speed'],
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen
+        }
+
+
+class Fleet:
+    """Vehicles keyed by device ID, spread over independently locked shards."""
+
+    def __init__(self, window=VEHICLE_WINDOW, shards=SHARDS, speed_limit=SPEED_LIMIT):
+        self.window = window
+        self.speed_limit = speed_limit
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self.updates = 0
+        self.spatial = TileIndex()
+        self._summary_lock = threading.Lock()
+        self._summaries = []
+        self._summaries_at = (-1, 0.0)
+
+    def __len__(self):
+        return sum(len(vehicles) for vehicles, _ in self._shards)
+
+    def vehicle(self, device_id, create=False):
+        """The Vehicle for a device ID (created on first use if asked)."""
+        vehicles, lock = self._shards[hash(device_id) % len(self._shards)]
+        vehicle = vehicles.get(device_id)
+        if vehicle is None and create:
+            with lock:
+                vehicle = vehicles.get(device_id)
+                if vehicle is None:
+                    vehicle = vehicles[device_id] = Vehicle(device_id, self.window, self.speed_limit)
+        return vehicle
+
+    def add(self, device_id, kind, record):
+        """Route one parsed record to its vehicle."""
+        self.vehicle(device_id or UNKNOWN_DEVICE, create=True).add(kind, record)
+        self.spatial.add(kind, record, device_id)
+        self.updates += 1
+
+    def set_speed_limit(self, limit):
+        """Risk speed limit of every vehicle, and of those still to come."""
+        self.speed_limit = limit
+        for vehicle in self.vehicles():
+            with vehicle.lock:
+                vehicle.data.set_speed_limit(limit)
+
+    def vehicles(self):
+        """All vehicles (shard by shard, without a global lock)."""
+        found = []
+        for vehicles, lock in self._shards:
+            with lock:
+                found.extend(vehicles.values())
+        return found
+
+    def summaries(self):
+        """Summary rows of every vehicle, rebuilt at most once per SUMMARY_TTL."""
+        with self._summary_lock:
+            updates, built = self._summaries_at
+            now = time.monotonic()
+            if updates != self.updates and now - built >= SUMMARY_TTL:
+                updates = self.updates
+                self._summaries = [v.summary() for v in self.vehicles()]
+                self._summaries.sort(key=lambda row: row['id'])
+                self._summaries_at = (updates, now)
+            return self._summaries
+
+    def leaderboard(self, sort='score', limit=10):
+        """Vehicles ranked by a RANKINGS key."""
+        field, highest_first = RANKINGS[sort]
+        rows = sorted(self.summaries(), key=lambda row: row[field], reverse=highest_first)
+        if limit:
+            rows = rows[:limit]
+        return [dict(row, rank=i + 1) for i, row in enumerate(rows)]
+
+
+class FleetTailer(TelegrafTailer):
+    """TelegrafTailer that splits the live file into per-vehicle sessions."""
+
+    def new_state(self):
+        return Fleet(speed_limit=self.speed_limit)
+
+    def deliver(self, device, kind, record):
+        self.data.add(device, kind, record)
+
+    def add_line(self, line):
+        parsed = parse_fleet_line(line)
+        if parsed:
+            self.reconciler.add(*parsed)
+            return True
+        return False
@@ -0,0 +1,338 @@
+"""
+DriveGuard Dashboard - History Session Index
+Sidecar cache of precomputed data for archived session files.
+
+Archived sessions never change after run.py moves them into the history
+folder, so each one is parsed once and the result is kept next to it as
+session_<date>.idx.npz: the reading columns, the stats block, alert lists,
+trip summaries, time bounds and the byte offset where each time bucket
+starts. The sidecar
+is rebuilt whenever the source file's size or mtime no longer match.
+
+Paging a text session (page_session()) seeks to the bucket a row or time
+falls in and parses only from there, so a page costs O(page) whatever the
+length of the session.
+
+Sessions already converted to the columnar archive format (.dgc) carry the
+same data in their own header and need no sidecar.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from archive import ARCHIVE_SUFFIX, ColumnarArchive
+from metrics import STAGE_SECONDS
+from session import SessionData
+from store import COLUMNS, ReadingStore
+from telegraf_parser import parse_line
+from trips import detect_trips
+
+INDEX_VERSION = 3
+INDEX_SUFFIX = ".idx.npz"
+BUCKET_MS = 60000            # Time bucket width for the offset table (1 min)
+
+SESSION_PATTERNS = ("session_*.out", "session_*" + ARCHIVE_SUFFIX)
+
+# filepath -> (size, mtime_ns, meta) so repeated listings skip the disk
+_meta_cache = {}
+_cache_lock = threading.Lock()
+
+# Recently queried sessions, kept open for paging requests
+OPEN_SESSIONS = 4
+_open_sessions = OrderedDict()
+
+
+def list_sessions(history_dir):
+    """Archived session files, newest first."""
+    history_dir = Path(history_dir)
+    if not history_dir.exists():
+        return []
+    files = [f for pattern in SESSION_PATTERNS for f in history_dir.glob(pattern)]
+    return sorted(files, key=lambda f: f.name, reverse=True)
+
+
+def is_session_file(filename):
+    """True for names the history API serves (not sidecars or temp files)."""
+    return filename.startswith('session_') and filename.endswith(('.out', ARCHIVE_SUFFIX))
+
+
+def index_path(filepath):
+    """Sidecar index path for a session file."""
+    filepath = Path(filepath)
+    return filepath.with_name(filepath.stem + INDEX_SUFFIX)
+
+
+def _source_key(filepath):
+    stat = os.stat(filepath)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_index(filepath):
+    """Parse a session file into (SessionData, meta, bucket table)."""
+    with STAGE_SECONDS.labels('history_index').time():
+        return _build_index(filepath)
+
+
+def _build_index(filepath):
+    data = SessionData(running_stats=False)
+    # Rows of [bucket start ts, byte offset of first line, reading index]
+    buckets = []
+    offset = 0
+
+    with open(filepath, 'rb') as f:
+        for raw in f:
+            parsed = parse_line(raw.decode('utf-8', errors='ignore'))
+            if parsed:
+                kind, record = parsed
+                if kind == 'batch_data':
+                    bucket = int(record['timestamp'] // BUCKET_MS) * BUCKET_MS
+                    if not buckets or bucket > buckets[-1][0]:
+                        buckets.append([bucket, offset, len(data.readings)])
+                data.add(kind, record)
+            offset += len(raw)
+
+    ts = data.readings.column('timestamp')
+    size, mtime_ns = _source_key(filepath)
+    meta = {
+        'version': INDEX_VERSION,
+        'source_size': size,
+        'source_mtime_ns': mtime_ns,
+        'stats': data.summary(),
+        'time_bounds': {
+            'first_ts': int(ts.min()) if len(ts) else None,
+            'last_ts': int(ts.max()) if len(ts) else None
+        },
+        'bucket_ms': BUCKET_MS,
+        'ts_sorted': data.readings.ts_sorted,
+        'alerts_speed': data.alerts_speed,
+        'alerts_harsh': data.alerts_harsh,
+        'status': data.status_msgs,
+        'trips': data.trips.finish()
+    }
+    return data, meta, np.array(buckets, dtype=np.int64).reshape(-1, 3)
+
+
+def write_index(filepath, data, meta, buckets):
+    """Write the sidecar atomically; a read-only history folder is not fatal."""
+    target = index_path(filepath)
+    tmp = target.with_name(target.name + ".tmp")
+    arrays = {f"col_{name}": data.readings.column(name) for name in COLUMNS}
+    try:
+        with open(tmp, 'wb') as f:
+            np.savez(f, meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+                     buckets=buckets, **arrays)
+        os.replace(tmp, target)
+    except OSError as e:
+        print(f"Could not write index {target.name}: {e}")
+
+
+def _read_meta(filepath):
+    """Meta of a valid sidecar, or None if it is missing or stale."""
+    target = index_path(filepath)
+    if not target.exists():
+        return None
+    try:
+        with np.load(target, allow_pickle=False) as npz:
+            meta = json.loads(npz['meta'].tobytes())
+    except (OSError, ValueError, KeyError):
+        return None
+    if meta.get('version') != INDEX_VERSION:
+        return None
+    if (meta.get('source_size'), meta.get('source_mtime_ns')) != _source_key(filepath):
+        return None
+    return meta
+
+
+def ensure_index(filepath):
+    """Return the session's meta, building the sidecar if needed."""
+    filepath = Path(filepath)
+    key = _source_key(filepath)
+    with _cache_lock:
+        cached = _meta_cache.get(filepath)
+    if cached and cached[:2] == key:
+        return cached[2]
+
+    if filepath.suffix == ARCHIVE_SUFFIX:
+        meta = ColumnarArchive(filepath).meta
+    else:
+        meta = _read_meta(filepath)
+        if meta is None:
+            data, meta, buckets = build_index(filepath)
+            write_index(filepath, data, meta, buckets)
+
+    with _cache_lock:
+        _meta_cache[filepath] = (key[0], key[1], meta)
+    return meta
+
+
+def load_buckets(filepath):
+    """Bucket table [ts, byte offset, reading index] of a text session."""
+    ensure_index(filepath)
+    try:
+        with np.load(index_path(filepath), allow_pickle=False) as npz:
+            return npz['buckets']
+    except (OSError, ValueError, KeyError):
+        return build_index(filepath)[2]
+
+
+class TextSession:
+    """Queryable readings of a text session, parsed page by page (see query.py).
+
+    Rows are found through the bucket table: a row range or timestamp is
+    looked up there, the file is read from that bucket's first line and
+    parsed only until the range is complete. The last range read is kept,
+    since a query asks for it once per column.
+    """
+
+    def __init__(self, filepath, meta, buckets):
+        self.filepath = Path(filepath)
+        self.rows = meta['stats']['total_readings']
+        self.ts_sorted = meta['ts_sorted']
+        self.bucket_ms = meta['bucket_ms']
+        self.bucket_ts = buckets[:, 0]
+        self.offsets = buckets[:, 1]
+        self.firsts = buckets[:, 2]
+        self._last = None
+
+    def __len__(self):
+        return self.rows
+
+    def _read(self, start, stop):
+        """Reading columns of rows [start, stop)."""
+        last = self._last
+        if last is not None and last[:2] == (start, stop):
+            return last[2]
+        store = ReadingStore()
+        if start < stop:
+            bucket = int(np.searchsorted(self.firsts, start, side='right')) - 1
+            row = int(self.firsts[bucket])
+            with open(self.filepath, 'rb') as f:
+                f.seek(int(self.offsets[bucket]))
+                for raw in f:
+                    parsed = parse_line(raw.decode('utf-8', errors='ignore'))
+                    if not parsed or parsed[0] != 'batch_data':
+                        continue
+                    if row >= start:
+                        store.append(parsed[1])
+                    row += 1
+                    if row >= stop:
+                        break
+        columns = {name: store.column(name) for name in COLUMNS}
+        self._last = (start, stop, columns)
+        return columns
+
+    def column(self, name, start=None, stop=None):
+        """Values of one column over rows [start, stop)."""
+        start, stop, _ = slice(start, stop).indices(self.rows)
+        return self._read(start, max(start, stop))[name]
+
+    def _search(self, value, side):
+        """np.searchsorted over the timestamp column, parsing one bucket."""
+        bucket = int(np.searchsorted(self.bucket_ts, value // self.bucket_ms * self.bucket_ms, side='right')) - 1
+        if bucket < 0:
+            return 0
+        first = int(self.firsts[bucket])
+        end = int(self.firsts[bucket + 1]) if bucket + 1 < len(self.firsts) else self.rows
+        return first + int(np.searchsorted(self.column('timestamp', first, end), value, side))
+
+    def time_range(self, t_from=None, t_to=None):
+        """Row indices [start, stop) with t_from <= timestamp <= t_to."""
+        if not self.ts_sorted:
+            raise ValueError("timestamps are not sorted")
+        start = 0 if t_from is None else self._search(t_from, 'left')
+        stop = self.rows if t_to is None else self._search(t_to, 'right')
+        return start, max(start, stop)
+
+
+def load_indexed_session(filepath):
+    """Load a session from its sidecar (or archive) as (meta, ReadingStore)."""
+    filepath = Path(filepath)
+    if filepath.suffix == ARCHIVE_SUFFIX:
+        archive = ColumnarArchive(filepath)
+        return archive.meta, archive.to_store()
+
+    meta = ensure_index(filepath)
+    try:
+        with np.load(index_path(filepath), allow_pickle=False) as npz:
+            columns = {name: npz[f"col_{name}"] for name in COLUMNS}
+        return meta, ReadingStore.from_columns(columns)
+    except (OSError, ValueError, KeyError):
+        # Sidecar could not be written (read-only folder): parse directly
+        data, meta, _ = build_index(filepath)
+        return meta, data.readings
+
+
+def open_session(filepath):
+    """Readings of a session for whole-column use, kept in a small LRU.
+
+    Columnar archives stay memory-mapped; text sessions are loaded once
+    from their sidecar.
+    """
+    filepath = Path(filepath)
+    return _cached_source(filepath, 'columns', lambda: (
+        ColumnarArchive(filepath) if filepath.suffix == ARCHIVE_SUFFIX
+        else load_indexed_session(filepath)[1]))
+
+
+def page_session(filepath):
+    """Readings of a session for paging and range queries (see query.py).
+
+    Columnar archives are searched through their timestamp anchors, sorted
+    text sessions through their bucket offsets (TextSession). Text sessions
+    with out-of-order timestamps are loaded from the sidecar, as the query
+    has to scan them anyway.
+    """
+    filepath = Path(filepath)
+    if filepath.suffix == ARCHIVE_SUFFIX:
+        return open_session(filepath)
+    meta = ensure_index(filepath)
+    if not meta['ts_sorted']:
+        return open_session(filepath)
+    return _cached_source(filepath, 'pages', lambda: TextSession(filepath, meta, load_buckets(filepath)))
+
+
+def _cached_source(filepath, use, build):
+    key = (filepath, use) + _source_key(filepath)
+    with _cache_lock:
+        source = _open_sessions.get(key)
+        if source is not None:
+            _open_sessions.move_to_end(key)
+            return source
+
+    source = build()
+    with _cache_lock:
+        _open_sessions[key] = source
+        while len(_open_sessions) > OPEN_SESSIONS:
+            _open_sessions.popitem(last=False)
+    return source
+
+
+def session_summary(filepath):
+    """Short per-session summary for the history list."""
+    meta = ensure_index(filepath)
+    stats = meta['stats']
+    return {
+        'max_speed': stats['max_speed'],
+        'total_alerts': stats['total_alerts'],
+        'final_score': stats['current_score'],
+        'total_readings': stats['total_readings'],
+        'first_ts': meta['time_bounds']['first_ts'],
+        'last_ts': meta['time_bounds']['last_ts'],
+        'trips': len(session_trips(filepath))
+    }
+
+
+def session_trips(filepath):
+    """Trip summaries of a session, as stored with its index or archive."""
+    meta = ensure_index(filepath)
+    if meta.get('trips') is None:
+        # Archive written before trips were stored: detect once, keep in the cached meta
+        archive = ColumnarArchive(filepath)
+        columns = {name: archive.column(name) for name in COLUMNS}
+        meta['trips'] = detect_trips(columns, meta['alerts_speed'], meta['alerts_harsh'])
+    return meta['trips']
@@ -0,0 +1,208 @@
+"""
+DriveGuard Dashboard - HTTP Response Cache
+Versioned JSON bodies, conditional GETs and compressed variants.
+
+An endpoint hands cached_response() a version string that changes exactly
+when its payload would (for the live session: the ingest position and the
+thresholds), plus the validated parameters the payload depends on. The
+encoded body is kept per path, parameters and version, so any number of
+viewers polling the same view share one serialization (however they spell
+the query string, and unknown parameters add no entries), and clients
+that already hold the version get 304 Not Modified. gzip and (if the
+brotli package is installed) Brotli variants are compressed once per
+version, on first request.
+
+compress() is for everything else: it compresses a finished response
+when the client accepts it and the body is worth it. compress_stream()
+gzips a streamed body as it is sent.
+"""
+
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import Response, request
+
+from metrics import Counter
+
+try:
+    import brotli
+except ImportError:      # Optional: gzip only
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+CACHE_BYTES = 64 * 1024 * 1024       # Total size of cached bodies
+MAX_ENTRY_BYTES = 16 * 1024 * 1024   # Larger bodies are served but not kept
+LIVE_CACHE_CONTROL = "no-cache"      # Revalidate every time (cheap with the ETag)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+COMPRESSIBLE = ('application/json', 'text/')
+
+CACHE_REQUESTS = Counter("driveguard_http_cache",
+                         "Cached endpoint requests by result (hit, miss, not_modified)",
+                         labelnames=("result",))
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def accepted_encoding():
+    """Best encoding the client accepts: 'br', 'gzip' or None."""
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+class _Entry:
+    def __init__(self, version, body):
+        self.version = version
+        self.etag = hashlib.blake2b(version.encode(), digest_size=8).hexdigest()
+        self.bodies = {None: body}
+        self.size = len(body)
+
+    def body(self, encoding):
+        """Body in an encoding, compressed on first use."""
+        if encoding is not None and len(self.bodies[None]) < MIN_COMPRESS_BYTES:
+            encoding = None
+        if encoding not in self.bodies:
+            compressed = _compress(self.bodies[None], encoding)
+            self.bodies[encoding] = compressed
+            self.size += len(compressed)
+        return encoding, self.bodies[encoding]
+
+
+class ResponseCache:
+    """Encoded bodies by URL, each valid for one version, least recently used first out."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self._building = {}
+
+    def get(self, key, version, build):
+        """(entry, built) for key at version; build() returns the JSON bytes.
+
+        Concurrent requests for the same key wait for one build instead of
+        each encoding the payload.
+        """
+        entry = self._lookup(key, version)
+        if entry is not None:
+            return entry, False
+        with self.lock:
+            key_lock = self._building.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._lookup(key, version)
+            if entry is not None:
+                return entry, False
+            entry = _Entry(version, build())
+            self._store(key, entry)
+            return entry, True
+
+    def _lookup(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.version != version:
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            if entry.size > MAX_ENTRY_BYTES:
+                self._building.pop(key, None)
+                return
+            self.entries[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, old = self.entries.popitem(last=False)
+                self.bytes -= old.size
+                self._building.pop(old_key, None)
+
+    def resize(self, key, entry, before):
+        """Account for variants compressed after the entry was stored."""
+        with self.lock:
+            if self.entries.get(key) is entry:
+                self.bytes += entry.size - before
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(version, build, cache_control=LIVE_CACHE_CONTROL, params=()):
+    """JSON response for this path and parameters at this version, from the cache when possible.
+
+    params are the normalized request parameters the body depends on.
+    build() is only called on a cache miss and must return the encoded
+    JSON body. Answers If-None-Match with 304 Not Modified.
+    """
+    key = (request.path,) + tuple(params)
+    encoding = accepted_encoding()
+    entry, built = response_cache.get(key, version, build)
+    etag = entry.etag + ("-" + encoding if encoding else "")
+    headers = {'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+
+    # Any variant of this version is the same content
+    if request.if_none_match and any(
+            request.if_none_match.contains_weak(entry.etag + suffix) for suffix in ("", "-gzip", "-br")):
+        CACHE_REQUESTS.labels('not_modified').inc()
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    CACHE_REQUESTS.labels('miss' if built else 'hit').inc()
+    before = entry.size
+    encoding, body = entry.body(encoding)
+    response_cache.resize(key, entry, before)
+    response = Response(body, mimetype='application/json', headers=headers)
+    response.set_etag(entry.etag + ("-" + encoding if encoding else ""))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def compress(response):
+    """Compress a finished response if the client accepts it and it is worth it."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE)):
+        return response
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+    response.set_data(_compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_stream(chunks):
+    """(chunks, encoding): a streamed body, gzipped on the fly if the client accepts it."""
+    if not request.accept_encodings['gzip']:
+        return chunks, None
+
+    def generate():
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    return generate(), 'gzip'
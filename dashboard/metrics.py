@@ -0,0 +1,227 @@
+"""
+DriveGuard Dashboard - Metrics
+Counters, gauges and timing histograms for the backend hot paths.
+
+Metrics register themselves in REGISTRY when created and render() writes
+them in the Prometheus text exposition format served at /metrics:
+
+    with STAGE_SECONDS.labels('parse').time():
+        ...
+    BYTES_READ.inc(len(chunk))
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+REGISTRY = []
+
+# Seconds, from 50 us to 10 s
+TIME_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    """Base class: a named metric, optionally split by label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=(), register=True):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+        if register:
+            REGISTRY.append(self)
+
+    def labels(self, *values):
+        """Child metric for one combination of label values."""
+        values = tuple(str(v) for v in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        """Yield (suffix, label values, extra labels, value)."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} "
+                         f"{_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=(), register=True):
+        super().__init__(name + "_total", help_text, labelnames, register)
+        if not self.labelnames:
+            self.children[()] = _CounterChild()
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.children[()].inc(amount)
+
+    @property
+    def value(self):
+        return self.children[()].value
+
+    def _samples(self):
+        for values, child in list(self.children.items()):
+            yield "", values, (), child.value
+
+
+class Gauge(_Metric):
+    """Current value, either set directly or read from a function at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, func=None, register=True):
+        super().__init__(name, help_text, (), register)
+        self.value = 0
+        self.func = func
+
+    def set(self, value):
+        self.value = value
+
+    def _samples(self):
+        value = self.value
+        if self.func is not None:
+            try:
+                value = self.func()
+            except Exception:
+                value = math.nan
+        yield "", (), (), value
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.count += 1
+            self.sum += value
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.counts):
+                self.counts[i] += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the with-block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=TIME_BUCKETS, register=True):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames, register)
+        if not self.labelnames:
+            self.children[()] = _HistogramChild(self.buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def time(self):
+        return self.children[()].time()
+
+    def _samples(self):
+        for values, child in list(self.children.items()):
+            with child.lock:
+                counts, count, total = list(child.counts), child.count, child.sum
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield "_bucket", values, (("le", _format_value(bound)),), cumulative
+            yield "_bucket", values, (("le", "+Inf"),), count
+            yield "_sum", values, (), total
+            yield "_count", values, (), count
+
+
+def render():
+    """All registered metrics in Prometheus text format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# ==================== DRIVEGUARD METRICS ====================
+
+STAGE_SECONDS = Histogram(
+    "driveguard_stage_seconds",
+    "Time spent per processing stage (read, parse, stats, encode, history_index, ...)",
+    labelnames=("stage",))
+REQUEST_SECONDS = Histogram(
+    "driveguard_request_seconds", "HTTP request handling time by endpoint",
+    labelnames=("endpoint",))
+BYTES_READ = Counter("driveguard_bytes_read", "Bytes read from the live Telegraf file")
+LINES_PARSED = Counter("driveguard_lines_parsed", "Lines turned into DriveGuard records",
+                       labelnames=("source",))
+PARSE_ERRORS = Counter("driveguard_parse_errors",
+                       "Lines or payloads that could not be turned into records",
+                       labelnames=("source",))
+MQTT_MESSAGES = Counter("driveguard_mqtt_messages", "MQTT messages received by the native ingest")
+MQTT_BYTES = Counter("driveguard_mqtt_bytes", "MQTT payload bytes received by the native ingest")
+INGEST_LAG = Histogram(
+    "driveguard_ingest_lag_seconds",
+    "Delay between Telegraf receiving a message and the dashboard parsing it",
+    buckets=LAG_BUCKETS)
+RECONCILED = Counter("driveguard_reconciled",
+                     "Live readings by reconciliation result (duplicate, reordered, late, restart, gap)",
+                     labelnames=("result",))
@@ -0,0 +1,218 @@
+"""
+DriveGuard Dashboard - Native MQTT Ingest
+Subscribes to the DriveGuard topics directly, without the Telegraf file hop.
+
+Firmware payloads are decoded straight into the live SessionData. When an
+archive file is given, every metric is also appended to it as the same
+line protocol Telegraf would have written, so history, the sidecar index
+and the columnar converter keep working unchanged.
+"""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from pathlib import Path
+
+from anomaly import SPEED_LIMIT
+from fleet import Fleet
+from metrics import LINES_PARSED, MQTT_BYTES, MQTT_MESSAGES, PARSE_ERRORS, STAGE_SECONDS
+from mqtt_lite import MQTTClient, MQTTError
+from reconcile import Reconciler
+from spill import live_session
+from telegraf_parser import SCHEMAS, build_record, encode_line, topic_device
+
+RECONNECT_MIN = 1.0       # Seconds before the first reconnect attempt
+RECONNECT_MAX = 60.0      # Backoff ceiling
+
+
+def payload_items(payload):
+    """JSON objects in a firmware payload (batch_data is an array of them).
+
+    Raises ValueError if the payload is not JSON.
+    """
+    decoded = json.loads(payload)
+    return [item for item in (decoded if isinstance(decoded, list) else [decoded])
+            if isinstance(item, dict) and item]
+
+
+def telegraf_lines(topic, items, tags, timestamp_ns):
+    """Line protocol Telegraf's json parser would write for a payload."""
+    tags = dict(tags, topic=topic)
+    return [encode_line('mqtt_consumer', tags, item, timestamp_ns) for item in items]
+
+
+class MqttIngest:
+    """Live data source fed by an MQTT subscription.
+
+    Offers the same poll()/lock/generation interface as TelegrafTailer, so
+    the dashboard can serve either one. The asyncio loop runs in a daemon
+    thread; connection losses are retried with exponential backoff.
+
+    With fleet=True the topic should wildcard the device segment and the
+    state is a Fleet, with records routed by the device in their topic.
+    Records go through a Reconciler on the way, as with the tailer.
+    """
+
+    def __init__(self, host, port, topic, username=None, password=None,
+                 client_id="driveguard_dashboard", archive_file=None, tags=None, fleet=False):
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.username = username
+        self.password = password
+        self.client_id = client_id
+        self.archive_file = Path(archive_file) if archive_file else None
+        self.tags = dict(tags or {})
+        self.tags.setdefault('host', socket.gethostname())
+
+        self.fleet = fleet
+        self.speed_limit = SPEED_LIMIT
+        self.data = self.new_state()
+        self.reconciler = Reconciler(self.deliver)
+        self.updated_at = None       # Wall time the state last changed
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.connected = False
+        self.messages_received = 0
+        self.decode_errors = 0
+
+        self._archive = None
+        self._loop = None
+        self._thread = None
+        self._task = None
+        self._stopping = False
+
+    def poll(self):
+        """Current session state (updates arrive in the background)."""
+        with self.lock:
+            self.reconciler.expire()
+            return self.data
+
+    def reset(self):
+        """Start a new session, as when the live file is replaced.
+
+        Readings the reconciler still holds back are dropped with the old
+        state; with an archive file they were written to it on arrival.
+        """
+        with self.lock:
+            self.data = self.new_state()
+            self.reconciler = Reconciler(self.deliver)
+            self.updated_at = None
+            self.generation += 1
+
+    def new_state(self):
+        """Empty live state."""
+        data = Fleet() if self.fleet else live_session()
+        data.set_speed_limit(self.speed_limit)
+        return data
+
+    def set_speed_limit(self, limit):
+        """Risk detection speed limit (config speed_danger), now and after a reset."""
+        with self.lock:
+            self.speed_limit = limit
+            self.data.set_speed_limit(limit)
+
+    def deliver(self, device, kind, record):
+        """Add a record the reconciler passed on to the state."""
+        if self.fleet:
+            self.data.add(device, kind, record)
+        else:
+            self.data.add(kind, record)
+        self.updated_at = time.time()
+
+    def handle_message(self, topic, payload):
+        """Decode one firmware payload into records (and archive lines)."""
+        self.messages_received += 1
+        MQTT_MESSAGES.inc()
+        MQTT_BYTES.inc(len(payload))
+        kind = topic.rpartition('/')[2]
+        if kind not in SCHEMAS:
+            return
+        try:
+            with STAGE_SECONDS.labels('mqtt_decode').time():
+                items = payload_items(payload)
+        except ValueError as e:
+            self.decode_errors += 1
+            PARSE_ERRORS.labels('mqtt').inc()
+            print(f"Bad payload on {topic}: {e}")
+            return
+        LINES_PARSED.labels('mqtt').inc(len(items))
+
+        if self.fleet:
+            # Vehicles lock themselves; no global lock on the hot path
+            device = topic_device(topic)
+            for item in items:
+                self.reconciler.add(device, kind, build_record(kind, item))
+        else:
+            with self.lock:
+                for item in items:
+                    self.reconciler.add(None, kind, build_record(kind, item))
+
+        if self._archive and items:
+            lines = telegraf_lines(topic, items, self.tags, time.time_ns())
+            try:
+                self._archive.write('\n'.join(lines) + '\n')
+                self._archive.flush()
+            except OSError as e:
+                print(f"Error writing archive: {e}")
+
+    async def run(self):
+        """Connect, subscribe and consume messages until stopped."""
+        delay = RECONNECT_MIN
+        while not self._stopping:
+            client = MQTTClient(self.host, self.port, self.client_id,
+                                self.username, self.password)
+            try:
+                await client.connect()
+                await client.subscribe(self.topic)
+                self.connected = True
+                delay = RECONNECT_MIN
+                print(f"  ✓ MQTT connected to {self.host}:{self.port} ({self.topic})")
+                async for topic, payload in client.messages():
+                    self.handle_message(topic, payload)
+            except asyncio.CancelledError:
+                await client.disconnect()
+                raise
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, MQTTError) as e:
+                if self.connected:
+                    print(f"MQTT connection lost: {e}")
+                else:
+                    print(f"MQTT connect to {self.host}:{self.port} failed: {e}")
+            self.connected = False
+            await client.disconnect()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    def start(self):
+        """Run the ingest loop in a background thread."""
+        if self.archive_file:
+            self._archive = open(self.archive_file, 'a', encoding='utf-8')
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="mqtt-ingest", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(self.run())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def stop(self):
+        """Stop the loop, pass on held-back readings and close the archive file."""
+        self._stopping = True
+        if self._task and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if self._thread:
+            self._thread.join(timeout=5)
+        with self.lock:
+            self.reconciler.flush()
+        if self._archive:
+            self._archive.close()
+            self._archive = None
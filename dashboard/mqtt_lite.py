@@ -0,0 +1,314 @@
+"""
+DriveGuard Dashboard - Minimal asyncio MQTT
+Just enough MQTT 3.1.1 for DriveGuard, built on asyncio streams.
+
+MQTTClient covers connect, subscribe, QoS 0 publish, keep-alive pings and
+receiving messages, which is all the dashboard and the simulator need from
+a broker such as Shiftr.io. StandInBroker is a tiny in-process broker
+(QoS 0, no retained messages or sessions) for running the native ingest
+and the simulator locally without internet access.
+
+A broker that sends nothing, not even a PINGRESP, for KEEPALIVE_GRACE
+keep-alive periods counts as gone: a half-open connection ends in
+ConnectionError (and the ingest's reconnect) instead of a silent hang.
+"""
+
+import asyncio
+import struct
+
+# Packet types (upper nibble of the fixed header)
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+SUBSCRIBE = 0x80
+SUBACK = 0x90
+UNSUBSCRIBE = 0xA0
+UNSUBACK = 0xB0
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+KEEPALIVE_GRACE = 1.5        # Keep-alive periods without a packet before giving up
+
+CONNACK_ERRORS = {
+    1: "unacceptable protocol version",
+    2: "client identifier rejected",
+    3: "server unavailable",
+    4: "bad user name or password",
+    5: "not authorized",
+}
+
+
+class MQTTError(Exception):
+    """Protocol-level failure (refused connection, malformed packet)."""
+
+
+def _encode_length(n):
+    """MQTT variable-length 'remaining length' encoding."""
+    out = bytearray()
+    while True:
+        byte = n % 128
+        n //= 128
+        if n:
+            byte |= 0x80
+        out.append(byte)
+        if not n:
+            return bytes(out)
+
+
+def _encode_string(s):
+    data = s.encode('utf-8') if isinstance(s, str) else s
+    return struct.pack('!H', len(data)) + data
+
+
+def _decode_string(buf, pos):
+    (n,) = struct.unpack_from('!H', buf, pos)
+    return buf[pos + 2:pos + 2 + n].decode('utf-8', errors='replace'), pos + 2 + n
+
+
+def packet(first_byte, body=b''):
+    """Build a packet from its first byte and body."""
+    return bytes([first_byte]) + _encode_length(len(body)) + body
+
+
+async def read_packet(reader):
+    """Read one packet; returns (first byte, body)."""
+    header = await reader.readexactly(1)
+    length = 0
+    multiplier = 1
+    for _ in range(4):
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+    else:
+        raise MQTTError("malformed remaining length")
+    body = await reader.readexactly(length) if length else b''
+    return header[0], body
+
+
+def publish_packet(topic, payload, qos=0, packet_id=0):
+    """Build a PUBLISH packet."""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    body = _encode_string(topic)
+    if qos:
+        body += struct.pack('!H', packet_id)
+    return packet(PUBLISH | (qos << 1), body + payload)
+
+
+def parse_publish(first_byte, body):
+    """Split a PUBLISH body into (topic, payload, qos, packet id)."""
+    qos = (first_byte >> 1) & 0x03
+    topic, pos = _decode_string(body, 0)
+    packet_id = 0
+    if qos:
+        (packet_id,) = struct.unpack_from('!H', body, pos)
+        pos += 2
+    return topic, body[pos:], qos, packet_id
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT topic filter matching with + and # wildcards."""
+    filter_parts = topic_filter.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[i]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class MQTTClient:
+    """Small asyncio MQTT 3.1.1 client (QoS 0 publish, QoS 0/1 receive)."""
+
+    def __init__(self, host, port=1883, client_id="driveguard", username=None,
+                 password=None, keepalive=60):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.reader = None
+        self.writer = None
+        self._packet_id = 0
+        self._ping_task = None
+        self._write_lock = None
+
+    def _next_id(self):
+        self._packet_id = self._packet_id % 65535 + 1
+        return self._packet_id
+
+    async def _send(self, data):
+        async with self._write_lock:
+            self.writer.write(data)
+            await self.writer.drain()
+
+    async def connect(self, timeout=30):
+        """Open the connection and wait for CONNACK."""
+        self._write_lock = asyncio.Lock()
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout)
+
+        flags = 0x02  # clean session
+        payload = _encode_string(self.client_id)
+        if self.username is not None:
+            flags |= 0x80
+            payload += _encode_string(self.username)
+            if self.password is not None:
+                flags |= 0x40
+                payload += _encode_string(self.password)
+        body = _encode_string("MQTT") + bytes([4, flags]) + struct.pack('!H', self.keepalive)
+        await self._send(packet(CONNECT, body + payload))
+
+        first_byte, body = await asyncio.wait_for(read_packet(self.reader), timeout)
+        if first_byte & 0xF0 != CONNACK or len(body) < 2:
+            raise MQTTError("expected CONNACK")
+        if body[1]:
+            raise MQTTError(f"connection refused: {CONNACK_ERRORS.get(body[1], body[1])}")
+
+        if self.keepalive:
+            self._ping_task = asyncio.ensure_future(self._ping_loop())
+
+    async def _ping_loop(self):
+        try:
+            while True:
+                await asyncio.sleep(self.keepalive / 2)
+                await self._send(packet(PINGREQ))
+        except (asyncio.CancelledError, ConnectionError, OSError):
+            pass
+
+    async def subscribe(self, topic_filter, qos=0):
+        """Subscribe to a topic filter (SUBACK arrives through messages())."""
+        body = struct.pack('!H', self._next_id()) + _encode_string(topic_filter) + bytes([qos])
+        await self._send(packet(SUBSCRIBE | 0x02, body))
+
+    async def publish(self, topic, payload):
+        """Publish a QoS 0 message."""
+        await self._send(publish_packet(topic, payload))
+
+    async def _read(self):
+        """Next packet; ConnectionError if the broker has gone quiet."""
+        if not self.keepalive:
+            return await read_packet(self.reader)
+        # Our pings every keepalive / 2 are answered by at least a PINGRESP
+        timeout = KEEPALIVE_GRACE * self.keepalive
+        try:
+            return await asyncio.wait_for(read_packet(self.reader), timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"no packet from the broker in {timeout:g} s") from None
+
+    async def messages(self):
+        """Yield (topic, payload bytes) for every PUBLISH received.
+
+        Raises ConnectionError when the connection is lost or the broker
+        stops answering pings.
+        """
+        while True:
+            first_byte, body = await self._read()
+            kind = first_byte & 0xF0
+            if kind == PUBLISH:
+                topic, payload, qos, packet_id = parse_publish(first_byte, body)
+                if qos == 1:
+                    await self._send(packet(PUBACK, struct.pack('!H', packet_id)))
+                yield topic, payload
+            elif kind == SUBACK and body[2:3] == b'\x80':
+                raise MQTTError("subscription refused")
+
+    async def disconnect(self):
+        """Send DISCONNECT and close the socket."""
+        if self._ping_task:
+            self._ping_task.cancel()
+        if self.writer is None:
+            return
+        try:
+            await self._send(packet(DISCONNECT))
+        except (ConnectionError, OSError):
+            pass
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+class StandInBroker:
+    """Minimal local MQTT broker for development and load tests.
+
+    Accepts any credentials, routes QoS 0 messages to matching subscribers
+    and answers pings. Nothing is persisted or retained.
+    """
+
+    def __init__(self, host="127.0.0.1", port=1883):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.subscriptions = {}   # writer -> set of topic filters
+        self.messages_routed = 0
+
+    async def start(self):
+        """Start listening; port 0 picks a free port (see self.port)."""
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for writer in list(self.subscriptions):
+            writer.close()
+        self.subscriptions.clear()
+
+    async def _handle(self, reader, writer):
+        self.subscriptions[writer] = set()
+        try:
+            while True:
+                first_byte, body = await read_packet(reader)
+                kind = first_byte & 0xF0
+                if kind == CONNECT:
+                    writer.write(packet(CONNACK, b'\x00\x00'))
+                elif kind == SUBSCRIBE:
+                    packet_id = body[:2]
+                    pos, granted = 2, bytearray()
+                    while pos < len(body):
+                        topic_filter, pos = _decode_string(body, pos)
+                        pos += 1  # requested QoS; everything is QoS 0 here
+                        self.subscriptions[writer].add(topic_filter)
+                        granted.append(0)
+                    writer.write(packet(SUBACK, packet_id + bytes(granted)))
+                elif kind == UNSUBSCRIBE:
+                    packet_id = body[:2]
+                    pos = 2
+                    while pos < len(body):
+                        topic_filter, pos = _decode_string(body, pos)
+                        self.subscriptions[writer].discard(topic_filter)
+                    writer.write(packet(UNSUBACK, packet_id))
+                elif kind == PUBLISH:
+                    topic, payload, qos, packet_id = parse_publish(first_byte, body)
+                    if qos == 1:
+                        writer.write(packet(PUBACK, struct.pack('!H', packet_id)))
+                    self._route(topic, payload)
+                elif kind == PINGREQ:
+                    writer.write(packet(PINGRESP))
+                elif kind == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, MQTTError):
+            pass
+        finally:
+            self.subscriptions.pop(writer, None)
+            writer.close()
+
+    def _route(self, topic, payload):
+        data = publish_packet(topic, payload)
+        for writer, filters in list(self.subscriptions.items()):
+            if any(topic_matches(f, topic) for f in filters):
+                writer.write(data)
+                self.messages_routed += 1
@@ -0,0 +1,89 @@
+"""
+DriveGuard Dashboard - Reading Queries
+Time-range and cursor paging over live and archived readings.
+
+A source is anything with len(), column(name, start, stop), ts_sorted and
+time_range(t_from, t_to): the live ReadingStore, a text history session
+(a TextSession, which seeks through the byte offsets of its sidecar's time
+buckets) or a memory-mapped ColumnarArchive (which searches its sparse
+timestamp anchors instead of the whole column). Cursors are row positions,
+so with sorted timestamps a page costs O(log n + k) without reading the
+rest of the session.
+"""
+
+import numpy as np
+
+from store import COLUMNS
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+
+class QueryError(ValueError):
+    """Invalid query parameters."""
+
+
+def parse_fields(text):
+    """Column names from a comma-separated fields parameter (None = all)."""
+    if not text:
+        return list(COLUMNS)
+    fields = [name.strip() for name in text.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in COLUMNS]
+    if unknown:
+        raise QueryError(f"unknown field(s) {', '.join(unknown)}; use {', '.join(COLUMNS)}")
+    return fields
+
+
+def make_cursor(epoch, row):
+    """Opaque cursor for 'continue after this row of this session'."""
+    return f"{epoch}.{row}"
+
+
+def parse_cursor(cursor, epoch):
+    """Row position from a cursor; QueryError if it belongs to another session."""
+    try:
+        cursor_epoch, row = cursor.rsplit('.', 1)
+        row = int(row)
+    except (AttributeError, ValueError):
+        raise QueryError("malformed cursor")
+    if cursor_epoch != str(epoch) or row < 0:
+        raise QueryError("cursor belongs to another session")
+    return row
+
+
+def query_readings(source, t_from=None, t_to=None, after=0, limit=DEFAULT_LIMIT, fields=None):
+    """Readings with t_from <= timestamp <= t_to, from row `after` on.
+
+    Returns (columns, next_row, has_more); next_row is the row position to
+    continue from (use it in the next cursor).
+    """
+    fields = fields or list(COLUMNS)
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    n = len(source)
+    after = min(max(0, after), n)
+
+    if source.ts_sorted:
+        start, stop = source.time_range(t_from, t_to)
+        start = max(start, after)
+        stop = max(start, stop)
+        end = min(stop, start + limit)
+        columns = {name: source.column(name, start, end) for name in fields}
+        return columns, end, end < stop
+
+    # Out-of-order timestamps: filter rows after the cursor
+    ts = source.column('timestamp', after, n)
+    mask = np.ones(len(ts), dtype=bool)
+    if t_from is not None:
+        mask &= ts >= t_from
+    if t_to is not None:
+        mask &= ts <= t_to
+    rows = np.flatnonzero(mask)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_row = after + int(rows[-1]) + 1 if len(rows) else n
+    if len(rows):
+        lo, hi = after + int(rows[0]), after + int(rows[-1]) + 1
+        columns = {name: source.column(name, lo, hi)[rows - rows[0]] for name in fields}
+    else:
+        columns = {name: source.column(name, 0, 0) for name in fields}
+    return columns, next_row, has_more
@@ -0,0 +1,218 @@
+"""
+DriveGuard Dashboard - Ingest Reconciliation
+Duplicate, late and missing readings, sorted out before they reach a session.
+
+The firmware uploads its reading buffer in chunks over QoS 0. A failed chunk
+ends the upload with the buffer already advanced, and the circular buffer
+overwrites readings it could not send, so readings can arrive twice, out of
+order or not at all. A Reconciler sits between the parser and the live
+state and keeps, per device:
+
+    duplicates  - a reading whose ts is among the last DEDUP_WINDOW seen is
+                  dropped (a run of them is reported once)
+    reordering  - readings are held until the device has sent one REORDER_MS
+                  newer, or has been quiet for HOLD_SECONDS, and are passed
+                  on in ts order
+    late        - a reading older than one already passed on (by no more
+                  than REORDER_MS) is dropped, so the series stays sorted
+    restarts    - a step back of more than REORDER_MS is the board's clock
+                  starting over; held readings are passed on and a new
+                  timeline begins
+    gaps        - readings passed on more than GAP_MS apart
+
+Everything but reordering (which loses nothing) is reported as a 'quality'
+record {'type', 'from_ts', 'to_ts', 'count'} in the same stream as the
+alerts. Alerts and status messages pass straight through, so they still
+arrive before their reading as the trip detector and tile index expect.
+
+Each device has its own lock, so in fleet mode boards are reconciled side
+by side, as vehicles are ingested.
+"""
+
+import heapq
+import threading
+import time
+from collections import deque
+
+from metrics import RECONCILED
+
+REORDER_MS = 60000           # Firmware upload interval
+DEDUP_WINDOW = 512           # Timestamps remembered per device (the firmware buffers 60)
+HOLD_SECONDS = 5.0           # Quiet time after which held readings are passed on
+SAMPLE_MS = 10000            # Firmware reading interval
+GAP_MS = 15000               # Spacing that means at least one reading is missing
+
+QUALITY_TYPES = ('duplicate', 'late', 'restart', 'gap')
+
+
+def quality_record(kind, from_ts, to_ts, count):
+    """Data-quality record as kept with a session."""
+    return {'type': kind, 'from_ts': int(from_ts), 'to_ts': int(to_ts), 'count': count}
+
+
+class _Stream:
+    """Reconciliation state of one device."""
+
+    def __init__(self, window):
+        self.lock = threading.Lock()
+        self.pending = []            # Heap of (ts, arrival, reading)
+        self.recent = deque(maxlen=window)
+        self.seen = set()
+        self.watermark = None        # Newest ts received in this timeline
+        self.released = None         # Newest ts passed on
+        self.duplicates = None       # [count, first ts, last ts] not yet reported
+        self.arrivals = 0
+        self.arrived = time.monotonic()
+
+    def new_timeline(self):
+        self.recent.clear()
+        self.seen.clear()
+        self.watermark = self.released = None
+
+    def remember(self, ts):
+        if len(self.recent) == self.recent.maxlen:
+            self.seen.discard(self.recent[0])
+        self.recent.append(ts)
+        self.seen.add(ts)
+
+
+class Reconciler:
+    """Per-device duplicate removal, reordering and gap reporting.
+
+    deliver(device, kind, record) receives everything that passes, in
+    order, while that device's lock is held. Call expire() now and then
+    so readings held back by a device that went quiet get through, and
+    flush() before the state is dropped or the process stops.
+    """
+
+    def __init__(self, deliver, tolerance=REORDER_MS, window=DEDUP_WINDOW, hold=HOLD_SECONDS):
+        self.deliver = deliver
+        self.tolerance = tolerance
+        self.window = window
+        self.hold = hold
+        self.streams = {}
+        self.lock = threading.Lock()     # Guards the streams dict only
+
+    def _stream(self, device):
+        stream = self.streams.get(device)
+        if stream is None:
+            with self.lock:
+                stream = self.streams.get(device)
+                if stream is None:
+                    stream = self.streams[device] = _Stream(self.window)
+        return stream
+
+    def _streams(self):
+        with self.lock:
+            return list(self.streams.items())
+
+    def add(self, device, kind, record):
+        """Take one parsed record of a device."""
+        stream = self._stream(device)
+        with stream.lock:
+            if kind != 'batch_data':
+                self.deliver(device, kind, record)
+                return
+            stream.arrived = time.monotonic()
+            self._add_reading(device, stream, record)
+
+    def _add_reading(self, device, stream, reading):
+        ts = reading['timestamp']
+        if ts in stream.seen:
+            RECONCILED.labels('duplicate').inc()
+            run = stream.duplicates
+            if run is None:
+                stream.duplicates = [1, ts, ts]
+            else:
+                run[0] += 1
+                run[1] = min(run[1], ts)
+                run[2] = max(run[2], ts)
+            return
+        self._report_duplicates(device, stream)
+
+        if stream.watermark is not None and stream.watermark - ts > self.tolerance:
+            # The board's clock started over
+            self._release(device, stream)
+            RECONCILED.labels('restart').inc()
+            self.deliver(device, 'quality', quality_record('restart', stream.watermark, ts, 0))
+            stream.new_timeline()
+        elif stream.released is not None and ts < stream.released:
+            RECONCILED.labels('late').inc()
+            stream.remember(ts)
+            self.deliver(device, 'quality', quality_record('late', ts, ts, 1))
+            return
+
+        stream.remember(ts)
+        if stream.watermark is not None and ts < stream.watermark:
+            RECONCILED.labels('reordered').inc()
+        else:
+            stream.watermark = ts
+        stream.arrivals += 1
+        heapq.heappush(stream.pending, (ts, stream.arrivals, reading))
+        self._release(device, stream, stream.watermark - self.tolerance)
+
+    def _release(self, device, stream, upto=None):
+        """Pass on held readings with ts <= upto (all of them by default)."""
+        pending = stream.pending
+        while pending and (upto is None or pending[0][0] <= upto):
+            ts, _, reading = heapq.heappop(pending)
+            last = stream.released
+            if last is not None and ts - last > GAP_MS:
+                RECONCILED.labels('gap').inc()
+                missing = max(1, round((ts - last) / SAMPLE_MS) - 1)
+                self.deliver(device, 'quality', quality_record('gap', last, ts, missing))
+            self.deliver(device, 'batch_data', reading)
+            stream.released = ts
+
+    def _report_duplicates(self, device, stream):
+        run = stream.duplicates
+        if run is not None:
+            stream.duplicates = None
+            self.deliver(device, 'quality', quality_record('duplicate', run[1], run[2], run[0]))
+
+    def expire(self, now=None):
+        """Pass on what devices quiet for HOLD_SECONDS are holding back."""
+        now = time.monotonic() if now is None else now
+        for device, stream in self._streams():
+            with stream.lock:
+                if (stream.pending or stream.duplicates) and now - stream.arrived >= self.hold:
+                    self._report_duplicates(device, stream)
+                    self._release(device, stream)
+
+    def flush(self):
+        """Pass on everything held back."""
+        for device, stream in self._streams():
+            with stream.lock:
+                self._report_duplicates(device, stream)
+                self._release(device, stream)
+
+    def snapshot(self):
+        """State as plain data, to restore() after a restart."""
+        state = []
+        for device, stream in self._streams():
+            with stream.lock:
+                state.append({
+                    'device': device,
+                    'pending': sorted(stream.pending, key=lambda item: item[:2]),
+                    'recent': list(stream.recent),
+                    'watermark': stream.watermark,
+                    'released': stream.released,
+                    'duplicates': stream.duplicates,
+                    'arrivals': stream.arrivals
+                })
+        return state
+
+    def restore(self, state):
+        """Continue from a snapshot()."""
+        with self.lock:
+            self.streams = {}
+            for saved in state:
+                stream = self.streams[saved['device']] = _Stream(self.window)
+                # A sorted list is a valid heap
+                stream.pending = [tuple(item) for item in saved['pending']]
+                for ts in saved['recent']:
+                    stream.remember(ts)
+                stream.watermark = saved['watermark']
+                stream.released = saved['released']
+                stream.duplicates = saved['duplicates']
+                stream.arrivals = saved['arrivals']
@@ -0,0 +1,302 @@
+"""
+DriveGuard Dashboard - Scoring Engine
+Replays the firmware's driving score over stored readings.
+
+The rules follow checkSpeedViolations(), checkAccelerationViolations(),
+the smooth driving bonus in loop() and updateGrade():
+
+    - speeding: GPS fix and speed > SPEED_DANGER      -> SCORE_SPEEDING
+    - harsh:    |acc - previous acc| > ACCEL_HARSH     -> SCORE_HARSH
+    - the score never drops below 0; each penalty restarts the smooth
+      driving clock and every 600 s without one adds a point (max 100)
+    - a reading stores the score from before its own checks
+    - a timestamp going backwards is a reboot: the score starts again at
+      100, and the first acceleration change is measured from 0 g
+
+Which readings trigger a penalty is decided with array operations; only
+the (sparse) event rows are walked in Python to apply clamping and
+bonuses, so a whole session re-scores in milliseconds. A session can be
+scored piece by piece (rescore_pieces()), carrying the score over from
+one piece to the next, so a spilled live session is read one segment at
+a time. Results are cached per session version and threshold set, and
+per spill segment, threshold set and the score it starts from.
+"""
+
+import itertools
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+SCORE_START = 100
+BONUS_MS = 600 * 1000
+INITIAL_ACCEL = 0.0          # accelMagnitude before the first IMU read
+CACHE_SIZE = 256
+MAX_COMBINATIONS = 100
+
+Thresholds = namedtuple('Thresholds', 'speed_danger accel_harsh score_speeding score_harsh')
+FIRMWARE_THRESHOLDS = Thresholds(120.0, 0.4, -5, -3)
+
+
+def grade(score):
+    """Letter grade, as updateGrade() assigns it."""
+    if score >= 90:
+        return 'A'
+    if score >= 80:
+        return 'B'
+    if score >= 70:
+        return 'C'
+    if score >= 60:
+        return 'D'
+    return 'F'
+
+
+def rescore(columns, thresholds=FIRMWARE_THRESHOLDS, carry=None):
+    """Score a session's readings with the given thresholds.
+
+    columns needs timestamp, speed, acc and gps_valid (score, lat and lon
+    are used when present). carry is the 'carry' of the result for the
+    readings just before these, to go on scoring the same session. Returns
+    a dict with the per-reading 'scores' array, the event rows ('speeding',
+    'harsh' with scores after each penalty) and summary fields.
+    """
+    ts = np.asarray(columns['timestamp'], dtype=np.int64)
+    speed = np.asarray(columns['speed'], dtype=np.float64)
+    acc = np.asarray(columns['acc'], dtype=np.float64)
+    gps = np.asarray(columns['gps_valid']) != 0
+    n = len(ts)
+    if carry is None:
+        score, since = SCORE_START, 0
+    else:
+        score, since = carry['score'], carry['since']
+    if n == 0:
+        return _result(thresholds, columns, np.zeros(0, dtype=np.int16), np.zeros(0, dtype=np.int64),
+                       np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), np.zeros(0), carry)
+
+    reboot = np.zeros(n, dtype=bool)
+    reboot[0] = carry is None or ts[0] < carry['ts']
+    reboot[1:] = ts[1:] < ts[:-1]
+    prev = np.empty(n)
+    prev[0] = INITIAL_ACCEL if carry is None else carry['acc']
+    prev[1:] = acc[:-1]
+    prev[reboot] = INITIAL_ACCEL
+    change = np.abs(acc - prev)
+
+    speeding = gps & (speed > thresholds.speed_danger)
+    harsh = change > thresholds.accel_harsh
+    events = np.flatnonzero(speeding | harsh | reboot)
+
+    # Walk only the event rows: score before the checks, after the speed
+    # check, after the harsh check, and where the smooth clock stands.
+    # Slot 0 holds the score carried in, for readings before the first event.
+    k = len(events)
+    before = np.empty(k, dtype=np.int64)
+    after_speed = np.empty(k, dtype=np.int64)
+    after = np.empty(k + 1, dtype=np.int64)
+    clock = np.empty(k + 1, dtype=np.int64)
+    after[0], clock[0] = score, since
+    ev_ts = ts[events].tolist()
+    ev_speeding = speeding[events].tolist()
+    ev_harsh = harsh[events].tolist()
+    ev_reboot = reboot[events].tolist()
+    for j in range(k):
+        t = ev_ts[j]
+        if ev_reboot[j]:
+            score = SCORE_START
+            since = min(0, t)
+        bonus = (t - since) // BONUS_MS
+        if bonus > 0:
+            score = min(SCORE_START, score + bonus)
+            since += bonus * BONUS_MS
+        before[j] = score
+        if ev_speeding[j]:
+            score = max(0, score + thresholds.score_speeding)
+            since = t
+        after_speed[j] = score
+        if ev_harsh[j]:
+            score = max(0, score + thresholds.score_harsh)
+            since = t
+        after[j + 1] = score
+        clock[j + 1] = since
+
+    # Every other reading: last event's score plus the bonuses since then
+    last = np.searchsorted(events, np.arange(n), side='right')
+    bonus = np.maximum(0, (ts - clock[last]) // BONUS_MS)
+    scores = np.minimum(SCORE_START, after[last] + bonus)
+    scores[events] = before
+    scores = scores.astype(np.int16)
+
+    is_speeding = np.asarray(ev_speeding, dtype=bool)
+    is_harsh = np.asarray(ev_harsh, dtype=bool)
+    carry = {'score': score, 'since': since, 'ts': int(ts[-1]), 'acc': float(acc[-1])}
+    return _result(thresholds, columns, scores, events[is_speeding], events[is_harsh],
+                   after_speed[:k][is_speeding], after[1:][is_harsh], change[events[is_harsh]], carry)
+
+
+def _result(thresholds, columns, scores, speed_rows, harsh_rows, speed_scores, harsh_scores, harsh_change,
+            carry):
+    final = int(scores[-1]) if len(scores) else SCORE_START
+    recorded = columns.get('score')
+    ts = np.asarray(columns['timestamp'])
+    lat, lon = columns.get('lat'), columns.get('lon')
+    return {
+        'thresholds': thresholds._asdict(),
+        'scores': scores,
+        'speeding': {
+            'rows': speed_rows,
+            'scores': speed_scores,
+            'ts': ts[speed_rows],
+            'speed': np.asarray(columns['speed'])[speed_rows],
+            'lat': np.asarray(lat)[speed_rows] if lat is not None else np.zeros(len(speed_rows)),
+            'lon': np.asarray(lon)[speed_rows] if lon is not None else np.zeros(len(speed_rows))
+        },
+        'harsh': {
+            'rows': harsh_rows,
+            'scores': harsh_scores,
+            'ts': ts[harsh_rows],
+            'change': harsh_change
+        },
+        'final_score': final,
+        'grade': grade(final),
+        'min_score': int(scores.min()) if len(scores) else SCORE_START,
+        'speed_alerts': len(speed_rows),
+        'harsh_alerts': len(harsh_rows),
+        'total_alerts': len(speed_rows) + len(harsh_rows),
+        'readings': len(scores),
+        # Readings whose stored firmware score is reproduced
+        'recorded_matches': int(np.sum(scores == np.asarray(recorded))) if recorded is not None else None,
+        'carry': carry
+    }
+
+
+def _combine(thresholds, parts):
+    """One result (without per-reading scores) from the results of consecutive pieces."""
+    scored = [part for part in parts if part['readings']]
+    final = scored[-1]['final_score'] if scored else SCORE_START
+    matches = [part['recorded_matches'] for part in parts]
+    events = {}
+    for kind in ('speeding', 'harsh'):
+        fields = parts[0][kind].keys() if parts else ()
+        events[kind] = {field: np.concatenate([part[kind][field] for part in parts]) for field in fields}
+    speed_alerts = sum(part['speed_alerts'] for part in parts)
+    harsh_alerts = sum(part['harsh_alerts'] for part in parts)
+    return {
+        'thresholds': thresholds._asdict(),
+        'speeding': events['speeding'],
+        'harsh': events['harsh'],
+        'final_score': final,
+        'grade': grade(final),
+        'min_score': min(part['min_score'] for part in scored) if scored else SCORE_START,
+        'speed_alerts': speed_alerts,
+        'harsh_alerts': harsh_alerts,
+        'total_alerts': speed_alerts + harsh_alerts,
+        'readings': sum(part['readings'] for part in parts),
+        'recorded_matches': sum(matches) if parts and None not in matches else None,
+        'carry': parts[-1]['carry'] if parts else None
+    }
+
+
+def _piece(thresholds, first, columns, carry):
+    """rescore() of one piece starting at row first, without per-reading scores."""
+    result = rescore(columns, thresholds, carry)
+    del result['scores']
+    for kind in ('speeding', 'harsh'):
+        result[kind]['rows'] = result[kind]['rows'] + first
+    return result
+
+
+def rescore_pieces(pieces, thresholds=FIRMWARE_THRESHOLDS):
+    """rescore() over a session given as consecutive pieces.
+
+    pieces is a list of (key, first row, load) where load() returns the
+    piece's columns. Only one piece is loaded at a time. A key names a
+    piece that never changes (a spill segment): its result is cached per
+    thresholds and the score it starts from, so scoring the session again
+    only reads the pieces after it. Pieces with key None are scored every
+    time. The result has no per-reading 'scores'.
+    """
+    parts = []
+    carry = None
+    for key, first, load in pieces:
+        if key is None:
+            part = _piece(thresholds, first, load(), carry)
+        else:
+            start = tuple(sorted(carry.items())) if carry else None
+            part = _cached(('piece', key, start), thresholds,
+                           lambda: _piece(thresholds, first, load(), carry))
+        parts.append(part)
+        carry = part['carry']
+    return _combine(thresholds, parts)
+
+
+def summary(result):
+    """JSON-ready summary of a rescore() / rescore_pieces() result."""
+    out = {key: result[key] for key in ('thresholds', 'final_score', 'grade', 'min_score',
+                                        'speed_alerts', 'harsh_alerts', 'total_alerts',
+                                        'readings')}
+    if result['recorded_matches'] is not None:
+        # Share of readings whose stored firmware score is reproduced
+        out['recorded_agreement'] = (round(result['recorded_matches'] / result['readings'], 4)
+                                     if result['readings'] else None)
+    return out
+
+
+def alerts(result):
+    """Alert records (as the firmware would have published them)."""
+    th = result['thresholds']
+    sp, hr = result['speeding'], result['harsh']
+    speeding = [
+        {'timestamp': int(t) // 1000, 'speed': round(float(v), 1),
+         'limit': th['speed_danger'], 'score': int(s),
+         'lat': float(la), 'lon': float(lo)}
+        for t, v, s, la, lo in zip(sp['ts'], sp['speed'], sp['scores'], sp['lat'], sp['lon'])
+    ]
+    harsh = [
+        {'timestamp': int(t) // 1000, 'acceleration': round(float(c), 2),
+         'threshold': th['accel_harsh'], 'score': int(s)}
+        for t, s, c in zip(hr['ts'], hr['scores'], hr['change'])
+    ]
+    return speeding, harsh
+
+
+def threshold_grid(base, values):
+    """Threshold sets for every combination of the given candidate values.
+
+    values maps a Thresholds field to a list of candidates; fields not in
+    it keep the base value. Raises ValueError for too many combinations.
+    """
+    options = [values.get(field) or [getattr(base, field)] for field in Thresholds._fields]
+    count = 1
+    for option in options:
+        count *= len(option)
+    if count > MAX_COMBINATIONS:
+        raise ValueError(f"{count} threshold combinations requested, the limit is {MAX_COMBINATIONS}")
+    return [Thresholds(*combo) for combo in itertools.product(*options)]
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cached(session_key, thresholds, compute):
+    key = (session_key, thresholds)
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+            return result
+    result = compute()
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def rescore_cached(session_key, load_pieces, thresholds):
+    """rescore_pieces() memoized per (session version, thresholds).
+
+    session_key must change whenever the readings do; load_pieces returns
+    the pieces and is only called on a cache miss.
+    """
+    return _cached(session_key, thresholds, lambda: rescore_pieces(load_pieces(), thresholds))
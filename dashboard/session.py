@@ -0,0 +1,95 @@
+"""
+DriveGuard Dashboard - Session State
+In-memory view of one driving session, fed record by record.
+"""
+
+from pathlib import Path
+
+from anomaly import RiskDetector
+from stats import RunningStats
+from store import ReadingStore
+from telegraf_parser import parse_line
+from spatial import TileIndex
+from trips import TripDetector
+
+
+class SessionData:
+    """Parsed readings, alerts and status messages of one session.
+
+    Readings go into a columnar ReadingStore. A live session also keeps
+    RunningStats so its stats block is O(1) per request; sessions loaded in
+    one go (history) compute theirs with vectorized reductions instead.
+    Both split their readings into trips as they arrive; a live session
+    also keeps a map tile index unless spatial is False. Live ingest also
+    adds 'quality' records (see reconcile.py) for duplicate, late and
+    missing readings.
+    """
+
+    def __init__(self, running_stats=True, spatial=True):
+        self.readings = ReadingStore()
+        self.alerts_speed = []
+        self.alerts_harsh = []
+        self.status_msgs = []
+        self.quality_events = []
+        self.alerts_risk = []
+        self.stats = RunningStats() if running_stats else None
+        self.risk = RiskDetector() if running_stats else None
+        self.trips = TripDetector()
+        self.spatial = TileIndex() if running_stats and spatial else None
+
+    def add(self, kind, record):
+        """Append a parsed (kind, record) pair to the matching list."""
+        if self.stats is not None:
+            self.stats.add(kind, record)
+        self.trips.add(kind, record)
+        if self.spatial is not None:
+            self.spatial.add(kind, record)
+        if kind == 'batch_data':
+            self.readings.append(record)
+            if self.risk is not None:
+                for event in self.risk.add(record):
+                    self.add('alert_risk', event)
+        elif kind == 'alert_risk':
+            self.alerts_risk.append(record)
+        elif kind == 'alert_speed':
+            self.alerts_speed.append(record)
+        elif kind == 'alert_harsh':
+            self.alerts_harsh.append(record)
+        elif kind == 'status':
+            self.status_msgs.append(record)
+        elif kind == 'quality':
+            self.quality_events.append(record)
+
+    def summary(self):
+        """Stats block served by the API."""
+        if self.stats is not None:
+            return self.stats.to_dict()
+        summary = self.readings.summary()
+        summary['speed_alerts'] = len(self.alerts_speed)
+        summary['harsh_alerts'] = len(self.alerts_harsh)
+        summary['total_alerts'] = len(self.alerts_speed) + len(self.alerts_harsh)
+        return summary
+
+    def set_speed_limit(self, limit):
+        """Speed limit of the risk detector from now on (km/h)."""
+        if self.risk is not None:
+            self.risk.speed_limit = limit
+
+
+def load_session(filepath):
+    """Parse a whole Telegraf output file into a SessionData."""
+    data = SessionData(running_stats=False)
+    filepath = Path(filepath)
+    if not filepath.exists():
+        return data
+
+    try:
+        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                parsed = parse_line(line)
+                if parsed:
+                    data.add(*parsed)
+    except Exception as e:
+        print(f"Error reading file: {e}")
+
+    return data
@@ -0,0 +1,339 @@
+"""
+DriveGuard Dashboard - Shared Live State
+Serves one process's parsed live session to the dashboard workers.
+
+In production mode (run.py --serve prod) a single ingest process follows
+the Telegraf file (or the MQTT feed), so every line is parsed once and
+the parsed session exists once. The HTTP workers are separate processes
+that keep no copy of it: they answer requests by querying the ingest
+process over a local socket.
+
+    head        - generation, row and list counts, the stats block and
+                  the threshold config; a worker fetches it at most
+                  every SYNC_INTERVAL
+    rows        - reading column slices, items - alert / status slices,
+                  time_range, trips and map queries, on demand
+
+A request only sees rows and list entries below the counts of the head it
+started from; those never change within a generation, so a request reads
+a consistent session even while ingest goes on. Re-scoring gets the spill
+segment paths and reads the segments itself, one at a time.
+"""
+
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+import numpy as np
+
+from archive import ColumnarArchive
+from spill import SpilledReadings
+from store import COLUMNS, columns_to_records
+
+SYNC_INTERVAL = 0.25         # Seconds a worker serves one head before fetching the next
+INGEST_INTERVAL = 0.5        # Seconds between polls of the live source
+ITEM_PAGE = 1000             # Alerts fetched per round trip when iterating
+
+# SessionData lists the workers may read
+LISTS = ('alerts_speed', 'alerts_harsh', 'alerts_risk', 'status_msgs', 'quality_events')
+
+
+class StateManager(BaseManager):
+    """Manager the workers connect to (typeid 'state')."""
+
+
+StateManager.register('state')
+
+
+class LiveState:
+    """Ingest side: answers the workers' queries on the live session.
+
+    Queries name the generation they were made for; once the session has
+    been replaced they get empty results.
+    """
+
+    def __init__(self, source, config):
+        self.source = source
+        self.config = config
+
+    def head(self):
+        """Generation, counts, stats block and config of the live session."""
+        with self.source.lock:
+            data = self.source.data
+            return {
+                'generation': self.source.generation,
+                'readings': len(data.readings),
+                'ts_sorted': data.readings.ts_sorted,
+                'lists': {name: len(getattr(data, name)) for name in LISTS},
+                'stats': data.summary(),
+                'updated_at': self.source.updated_at,
+                'config': dict(self.config)
+            }
+
+    def rows(self, generation, name, start, stop):
+        """Values of one reading column over rows [start, stop)."""
+        with self.source.lock:
+            if generation != self.source.generation:
+                return np.zeros(0, dtype=COLUMNS[name][0])
+            return np.array(self.source.data.readings.column(name, start, stop))
+
+    def time_range(self, generation, t_from, t_to):
+        """readings.time_range() (rows may go past the caller's count)."""
+        with self.source.lock:
+            if generation != self.source.generation:
+                return 0, 0
+            return self.source.data.readings.time_range(t_from, t_to)
+
+    def pieces(self, generation, names):
+        """The readings as ('segment', first row, path) and ('rows', first row, columns) pieces."""
+        with self.source.lock:
+            if generation != self.source.generation:
+                return []
+            readings = self.source.data.readings
+            pieces, base = [], 0
+            if isinstance(readings, SpilledReadings):
+                base = readings.window[0]
+                pieces = [('segment', first, str(path)) for first, _, _, path in readings.segments
+                          if first < base]
+            pieces.append(('rows', base, {name: np.array(readings.column(name, base)) for name in names}))
+            return pieces
+
+    def items(self, generation, name, start, stop):
+        """Entries [start, stop) of one of the LISTS."""
+        if name not in LISTS:
+            raise ValueError(f"unknown list {name}")
+        with self.source.lock:
+            if generation != self.source.generation:
+                return []
+            return getattr(self.source.data, name)[start:stop]
+
+    def trips(self, generation):
+        """Trip summaries of the live session."""
+        with self.source.lock:
+            if generation != self.source.generation:
+                return []
+            return self.source.data.trips.summaries()
+
+    def spatial(self, bbox, zoom, hotspots):
+        """TileIndex.query() on the live session."""
+        return self.source.data.spatial.query(bbox, zoom, hotspots)
+
+    def set_config(self, values):
+        """Update the shared thresholds; returns them."""
+        self.config.update(values)
+        if 'speed_danger' in values:
+            self.source.set_speed_limit(values['speed_danger'])
+        return dict(self.config)
+
+
+def serve_state(source, config, address=('127.0.0.1', 0), authkey=None):
+    """Serve a live source to workers from background threads.
+
+    Also polls the source every INGEST_INTERVAL, so parsing keeps up
+    whether or not anyone is looking. Returns the server; its address
+    attribute is where workers connect.
+    """
+    state = LiveState(source, config)
+
+    class StateServer(StateManager):
+        pass
+    StateServer.register('state', callable=lambda: state)
+
+    server = StateServer(address=address, authkey=authkey).get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def ingest():
+        while True:
+            try:
+                source.poll()
+            except Exception as e:
+                print(f"Ingest error: {e}")
+            time.sleep(INGEST_INTERVAL)
+    threading.Thread(target=ingest, daemon=True).start()
+    return server
+
+
+class RemoteReadings:
+    """ReadingStore lookalike over the ingest process's readings, up to a head's count."""
+
+    def __init__(self, replica, head):
+        self.replica = replica
+        self.generation = head['generation']
+        self.size = head['readings']
+        self.ts_sorted = head['ts_sorted']
+
+    def __len__(self):
+        return self.size
+
+    def column(self, name, start=None, stop=None):
+        """Values of one column over rows [start, stop), fetched from the ingest process."""
+        start, stop, _ = slice(start, stop).indices(self.size)
+        if stop <= start:
+            return np.zeros(0, dtype=COLUMNS[name][0])
+        return self.replica.remote().rows(self.generation, name, start, stop)
+
+    def time_range(self, t_from=None, t_to=None):
+        """Row indices [start, stop) with t_from <= timestamp <= t_to."""
+        if not self.ts_sorted:
+            raise ValueError("timestamps are not sorted")
+        start, stop = self.replica.remote().time_range(self.generation, t_from, t_to)
+        return min(start, self.size), min(stop, self.size)
+
+    def to_records(self, start=None, stop=None):
+        """Serialize a row range as a list of dicts for the JSON API."""
+        return columns_to_records({name: self.column(name, start, stop) for name in COLUMNS})
+
+    def pieces(self, names):
+        """The rows as (key, first row, load) pieces, see spill.reading_pieces().
+
+        Spill segments are read from disk here, so they never travel
+        through the socket.
+        """
+        pieces = []
+        for kind, first, value in self.replica.remote().pieces(self.generation, names):
+            if kind == 'segment':
+                pieces.append((value, first, lambda path=value: {
+                    name: ColumnarArchive(path).column(name).astype(COLUMNS[name][0]) for name in names}))
+            else:
+                pieces.append((None, first, lambda columns=value: columns))
+        return pieces
+
+
+class RemoteList:
+    """Read-only list over one of the ingest process's alert / status lists."""
+
+    def __init__(self, replica, generation, name, size):
+        self.replica = replica
+        self.generation = generation
+        self.name = name
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def _range(self, start, stop):
+        if stop <= start:
+            return []
+        return self.replica.remote().items(self.generation, self.name, start, stop)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+            if step != 1:
+                return self._range(0, self.size)[index]
+            return self._range(start, stop)
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("list index out of range")
+        return self._range(index, index + 1)[0]
+
+    def __iter__(self):
+        for start in range(0, self.size, ITEM_PAGE):
+            yield from self._range(start, min(start + ITEM_PAGE, self.size))
+
+
+class _RemoteTrips:
+    def __init__(self, replica, generation):
+        self.replica = replica
+        self.generation = generation
+
+    def summaries(self):
+        return self.replica.remote().trips(self.generation)
+
+
+class _RemoteTiles:
+    def __init__(self, replica):
+        self.replica = replica
+
+    def query(self, bbox, zoom, hotspots):
+        return self.replica.remote().spatial(bbox, zoom, hotspots)
+
+
+class RemoteSession:
+    """Worker-side view of the live SessionData as of one head.
+
+    Holds no readings or alerts; every read is a query to the ingest process.
+    """
+
+    def __init__(self, replica, head):
+        generation = head['generation']
+        self.readings = RemoteReadings(replica, head)
+        for name in LISTS:
+            setattr(self, name, RemoteList(replica, generation, name, head['lists'][name]))
+        self.trips = _RemoteTrips(replica, generation)
+        self.spatial = _RemoteTiles(replica)
+        self.stats_block = head['stats']
+
+    def summary(self):
+        """Stats block, as computed by the ingest process."""
+        return self.stats_block
+
+
+EMPTY_HEAD = {'generation': None, 'readings': 0, 'ts_sorted': True, 'lists': dict.fromkeys(LISTS, 0),
+              'stats': {}, 'updated_at': None, 'config': {}}
+
+
+class ReplicaSource:
+    """Worker-side live source with TelegrafTailer's poll()/lock/generation.
+
+    config, if given, is a dict kept equal to the ingest process's
+    thresholds (publish_config() sends local changes there).
+    """
+
+    def __init__(self, address, authkey, config=None):
+        self.address = address
+        self.authkey = authkey
+        self.config = config
+        self.lock = threading.Lock()
+        self.generation = None
+        self.updated_at = None
+        self.data = RemoteSession(self, EMPTY_HEAD)
+        self.synced_at = None
+        self._state = None
+
+    def remote(self):
+        """Proxy of the ingest process's LiveState (connects on first use)."""
+        if self._state is None:
+            manager = StateManager(address=self.address, authkey=self.authkey)
+            manager.connect()
+            self._state = manager.state()
+        return self._state
+
+    def poll(self):
+        """The live session as of the latest head, fetched first unless that
+        happened very recently.
+
+        Only one request thread fetches at a time; the others keep using
+        the current head (except before the first one).
+        """
+        synced_at = self.synced_at
+        if synced_at is not None and time.monotonic() - synced_at < SYNC_INTERVAL:
+            return self.data
+        if not self.lock.acquire(blocking=synced_at is None):
+            return self.data
+        try:
+            self._sync()
+        except (OSError, EOFError) as e:
+            print(f"Could not sync live state: {e}")
+            self._state = None
+        finally:
+            self.lock.release()
+        return self.data
+
+    def _sync(self):
+        head = self.remote().head()
+        self.data = RemoteSession(self, head)
+        self.generation = head['generation']
+        self.updated_at = head['updated_at']
+        if self.config is not None:
+            self.config.update(head['config'])
+        self.synced_at = time.monotonic()
+
+    def publish_config(self, config):
+        """Send threshold changes to the ingest process (and so to every worker)."""
+        try:
+            self.remote().set_config(dict(config))
+        except (OSError, EOFError) as e:
+            print(f"Could not share config: {e}")
+            self._state = None
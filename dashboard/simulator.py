@@ -0,0 +1,297 @@
+"""
+DriveGuard Dashboard - Board Simulator
+Emulates DriveGuard boards for load tests, without any hardware.
+
+SimulatedBoard follows the firmware loop: a reading every SAMPLE_INTERVAL,
+speeding and harsh driving checks with the same penalties and clamping,
+the smooth driving bonus, and uploads of the reading buffer in chunks of
+10. Payloads are formatted exactly like uploadBufferedData(),
+publishSpeedingAlert(), publishHarshDrivingAlert() and the start-up status
+message. Messages go to an MQTT broker (MqttSink) or straight into a
+Telegraf-format file (FileSink).
+
+replay_messages() turns an archived session_*.out back into the messages
+that produced it, so a real drive can be played back at N times speed.
+"""
+
+import asyncio
+import json
+import math
+import random
+import socket
+import time
+
+from mqtt_ingest import payload_items, telegraf_lines
+from mqtt_lite import MQTTClient
+from telegraf_parser import decode_line, field_value, record_kind
+
+# Firmware timing (DriveGuard_Shiftr_Production.ino)
+SAMPLE_INTERVAL = 10000      # ms between readings
+UPLOAD_INTERVAL = 60000      # ms between buffer uploads
+BUFFER_SIZE = 60
+CHUNK_SIZE = 10
+BONUS_SECONDS = 600          # Smooth driving needed for +1 point
+
+START_LAT, START_LON = 38.830000, -77.307000
+MAX_REPLAY_GAP = 60.0        # Longest real-time pause while replaying (s)
+
+
+class SimulatedBoard:
+    """One emulated board with the firmware's buffering and scoring."""
+
+    def __init__(self, g_number, seed=None, speed_danger=120.0, accel_harsh=0.4,
+                 score_speeding=-5, score_harsh=-3):
+        self.g_number = g_number
+        self.rng = random.Random(seed)
+        self.speed_danger = speed_danger
+        self.accel_harsh = accel_harsh
+        self.score_speeding = score_speeding
+        self.score_harsh = score_harsh
+
+        self.client_name = f"DG_{self.rng.randint(0, 9999):04d}_{g_number}"
+        self.lat = START_LAT + self.rng.uniform(-0.05, 0.05)
+        self.lon = START_LON + self.rng.uniform(-0.05, 0.05)
+        self.heading = self.rng.uniform(0, 2 * math.pi)
+        self.speed = 0.0
+        self.cruise = self.rng.choice((50.0, 80.0, 110.0))
+        self.acc = 0.0           # accelMagnitude before the first IMU read
+        self.gps_valid = 1
+        self.score = 100
+        self.smooth_seconds = 0
+        self.runtime_ms = 0
+        self.buffer = []
+        # Spread the uploads of many boards over the upload interval
+        self.last_upload = -self.rng.randrange(0, UPLOAD_INTERVAL, SAMPLE_INTERVAL)
+
+    def topic(self, kind):
+        return f"ece508/team4/{self.g_number}/driveguard/{kind}"
+
+    def start(self):
+        """Messages sent once connected (the start-up status)."""
+        return [('status', '{"msg":"System started","buf":%d,"client":"%s"}'
+                 % (BUFFER_SIZE, self.client_name))]
+
+    def _move(self):
+        """Advance the GPS/IMU trace by one sample."""
+        rng = self.rng
+        if rng.random() < 0.01:
+            self.cruise = rng.choice((0.0, 50.0, 80.0, 110.0))
+        self.speed = max(0.0, self.speed + 0.2 * (self.cruise - self.speed) + rng.gauss(0, 6))
+        self.heading += rng.gauss(0, 0.3)
+        step = self.speed / 3600 * SAMPLE_INTERVAL / 1000 / 111.0
+        self.lat += step * math.cos(self.heading)
+        self.lon += step * math.sin(self.heading) / math.cos(math.radians(self.lat))
+
+        prev_acc = self.acc
+        self.acc = max(0.0, rng.gauss(1.0, 0.05))
+        if rng.random() < 0.005:
+            # Hard braking or a pothole
+            self.acc += rng.uniform(0.4, 0.9)
+        self.gps_valid = 0 if rng.random() < 0.02 else 1
+        return abs(self.acc - prev_acc)
+
+    def step(self):
+        """Run one SAMPLE_INTERVAL; returns the (kind, payload) messages sent."""
+        self.runtime_ms += SAMPLE_INTERVAL
+        accel_change = self._move()
+        messages = []
+
+        # The once-a-second smooth driving clock, caught up to this sample
+        self.smooth_seconds += SAMPLE_INTERVAL // 1000
+        if self.smooth_seconds >= BONUS_SECONDS:
+            self.score = min(100, self.score + 1)
+            self.smooth_seconds = 0
+
+        # storeSensorReading() runs before the violation checks
+        self.buffer.append('{"ts":%d,"spd":%.1f,"lat":%.6f,"lon":%.6f,"acc":%.2f,"scr":%d,"gps":%d}'
+                           % (self.runtime_ms, self.speed, self.lat, self.lon, self.acc,
+                              self.score, self.gps_valid))
+        if len(self.buffer) > BUFFER_SIZE:
+            del self.buffer[0]
+
+        runtime = self.runtime_ms // 1000
+        if self.gps_valid and self.speed > self.speed_danger:
+            self.score = max(0, self.score + self.score_speeding)
+            self.smooth_seconds = 0
+            messages.append(('alert_speed', '{"ts":%d,"spd":%.1f,"lim":%.0f,"scr":%d,"lat":%.6f,"lon":%.6f}'
+                             % (runtime, self.speed, self.speed_danger, self.score,
+                                self.lat, self.lon)))
+        if accel_change > self.accel_harsh:
+            self.score = max(0, self.score + self.score_harsh)
+            self.smooth_seconds = 0
+            messages.append(('alert_harsh', '{"ts":%d,"acc":%.2f,"thr":%.2f,"scr":%d}'
+                             % (runtime, accel_change, self.accel_harsh, self.score)))
+
+        if self.runtime_ms - self.last_upload >= UPLOAD_INTERVAL:
+            self.last_upload = self.runtime_ms
+            for i in range(0, len(self.buffer), CHUNK_SIZE):
+                messages.append(('batch_data', '[' + ','.join(self.buffer[i:i + CHUNK_SIZE]) + ']'))
+            self.buffer = []
+        return messages
+
+
+def set_topic_device(topic, device):
+    """Replace the device segment of a DriveGuard topic."""
+    parts = topic.split('/')
+    if 'driveguard' in parts and parts.index('driveguard') > 0:
+        parts[parts.index('driveguard') - 1] = device
+    return '/'.join(parts)
+
+
+def replay_messages(filepath):
+    """Rebuild (receive time in s, topic, payload) messages from a session file.
+
+    Telegraf writes each element of a batch_data array as its own line with
+    the receive timestamp of the message, so consecutive batch lines with
+    the same topic and timestamp are joined back into one array.
+    """
+    pending = None
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            decoded = decode_line(line)
+            if decoded is None:
+                continue
+            measurement, tags, fields, timestamp = decoded
+            kind = record_kind(measurement, tags)
+            if kind is None:
+                continue
+            topic = tags.get('topic') or f"ece508/team4/unknown/driveguard/{kind}"
+            item = '{' + ','.join(f'"{key}":{json.dumps(field_value(val))}'
+                                  for key, val in fields.items()) + '}'
+            received = (timestamp or 0) / 1e9
+
+            if kind == 'batch_data' and pending and pending[:2] == (received, topic):
+                pending[2].append(item)
+                continue
+            if pending:
+                yield pending[0], pending[1], '[' + ','.join(pending[2]) + ']'
+                pending = None
+            if kind == 'batch_data':
+                pending = (received, topic, [item])
+            else:
+                yield received, topic, item
+    if pending:
+        yield pending[0], pending[1], '[' + ','.join(pending[2]) + ']'
+
+
+class FileSink:
+    """Appends messages as Telegraf line protocol, like Telegraf's file output."""
+
+    def __init__(self, path, tags=None):
+        self.path = path
+        self.tags = {'host': socket.gethostname(), 'project': 'driveguard', 'team': 'team4'}
+        self.tags.update(tags or {})
+        self.file = None
+        self.pending = []
+
+    async def connect(self):
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    async def publish(self, topic, payload):
+        self.pending.extend(telegraf_lines(topic, payload_items(payload), self.tags, time.time_ns()))
+
+    def flush(self):
+        """Write everything published since the last flush."""
+        if self.pending:
+            self.file.write('\n'.join(self.pending) + '\n')
+            self.file.flush()
+            self.pending = []
+
+    async def close(self):
+        if self.file:
+            self.flush()
+            self.file.close()
+
+
+class MqttSink:
+    """Publishes messages to an MQTT broker over one connection."""
+
+    def __init__(self, host, port=1883, username=None, password=None):
+        self.client = MQTTClient(host, port, f"driveguard_sim_{random.randrange(10**6)}",
+                                 username, password)
+
+    async def connect(self):
+        await self.client.connect()
+
+    async def publish(self, topic, payload):
+        await self.client.publish(topic, payload)
+
+    def flush(self):
+        pass
+
+    async def close(self):
+        await self.client.disconnect()
+
+
+class Counter:
+    """Messages and readings sent, for the progress report."""
+
+    def __init__(self):
+        self.messages = 0
+        self.readings = 0
+        self.started = time.monotonic()
+
+    def add(self, kind, payload):
+        self.messages += 1
+        if kind == 'batch_data':
+            self.readings += payload.count('{')
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (f"{self.messages} messages, {self.readings} readings in {elapsed:.0f} s "
+                f"({self.messages / elapsed:.0f} msg/s, {self.readings / elapsed:.0f} readings/s)")
+
+
+async def simulate(boards, sink, speedup=1.0, duration=None, report_every=10.0):
+    """Drive the boards in lockstep; simulated time runs speedup times faster.
+
+    duration is in simulated seconds (None runs until cancelled).
+    """
+    counter = Counter()
+    loop = asyncio.get_running_loop()
+    for board in boards:
+        for kind, payload in board.start():
+            await sink.publish(board.topic(kind), payload)
+            counter.add(kind, payload)
+    sink.flush()
+
+    tick = SAMPLE_INTERVAL / 1000 / speedup
+    deadline = loop.time()
+    last_report = loop.time()
+    steps = 0
+    while duration is None or steps * SAMPLE_INTERVAL / 1000 < duration:
+        for board in boards:
+            for kind, payload in board.step():
+                await sink.publish(board.topic(kind), payload)
+                counter.add(kind, payload)
+        sink.flush()
+        steps += 1
+
+        if loop.time() - last_report >= report_every:
+            print(f"  [sim] {counter.report()}")
+            last_report = loop.time()
+        deadline += tick
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+    return counter
+
+
+async def replay(filepath, sink, speedup=1.0, devices=None, report_every=10.0):
+    """Play an archived session back, optionally as several devices at once."""
+    counter = Counter()
+    loop = asyncio.get_running_loop()
+    previous = None
+    last_report = loop.time()
+    for received, topic, payload in replay_messages(filepath):
+        if previous is not None and received > previous:
+            await asyncio.sleep(min(received - previous, MAX_REPLAY_GAP) / speedup)
+        previous = received
+        kind = topic.rpartition('/')[2]
+        for device in devices or [None]:
+            target = set_topic_device(topic, device) if device else topic
+            await sink.publish(target, payload)
+            counter.add(kind, payload)
+        sink.flush()
+        if loop.time() - last_report >= report_every:
+            print(f"  [replay] {counter.report()}")
+            last_report = loop.time()
+    return counter
@@ -0,0 +1,228 @@
+"""
+DriveGuard Dashboard - Live Snapshots
+Checkpoints of the live tailer's parsed state, for fast restarts.
+
+A snapshot is an .npz file like the history sidecars: the reading columns,
+the map tile array and a JSON meta block with the file position (path,
+inode, byte offset and a hash of the bytes just before the offset), the
+alert, risk, status and data-quality lists, and the state of the running
+stats, the trip detector, the risk detector, the tile index and the ingest
+reconciler (including the readings it is still holding back).
+
+With a memory budget (spill.py) only the rows and entries still in memory
+are written; the spilled part is recorded as the paths of its segment
+files, which are kept for the restart. The ingest lock is held just long
+enough to take references; the copying happens after it is released.
+
+On start, a snapshot that still matches the live file is loaded and the
+tailer carries on from the saved offset, so only lines appended since the
+last checkpoint are parsed. A file that was replaced, truncated or
+rewritten does not match and is read from the start as before.
+"""
+
+import atexit
+import gc
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from reconcile import Reconciler
+from store import COLUMNS
+
+SNAPSHOT_VERSION = 7
+CHECKPOINT_INTERVAL = 60.0   # Seconds between checkpoints (when something changed)
+HASH_BYTES = 4096            # Bytes before the offset that must still match
+
+# Snapshot key -> SessionData list attribute
+LISTS = {
+    'alerts_speed': 'alerts_speed',
+    'alerts_harsh': 'alerts_harsh',
+    'status': 'status_msgs',
+    'quality': 'quality_events',
+    'alerts_risk': 'alerts_risk',
+}
+
+
+def _tail_hash(filepath, offset):
+    """Hash of the HASH_BYTES bytes before offset (None if unreadable)."""
+    try:
+        with open(filepath, 'rb') as f:
+            f.seek(max(0, offset - HASH_BYTES))
+            return hashlib.blake2b(f.read(min(offset, HASH_BYTES)), digest_size=16).hexdigest()
+    except OSError:
+        return None
+
+
+def _readings_checkpoint(readings):
+    """(spill state, column views) of a ReadingStore or SpilledReadings."""
+    if hasattr(readings, 'checkpoint'):
+        return readings.checkpoint()
+    state = {'base': 0, 'sorted': True, 'segments': []}
+    return state, {name: readings.column(name) for name in COLUMNS}
+
+
+def _list_checkpoint(items):
+    """(spill state, entries) of a list or SpilledList."""
+    if hasattr(items, 'checkpoint'):
+        return items.checkpoint()
+    return {'base': 0, 'count': len(items), 'segments': []}, items
+
+
+def save_snapshot(tailer, path):
+    """Write the tailer's state to path; returns False if there is nothing to save."""
+    with tailer.lock:
+        data = tailer.data
+        offset, inode = tailer.offset, tailer.inode
+        if not offset:
+            return False
+        meta = {
+            'version': SNAPSHOT_VERSION,
+            'file': str(Path(tailer.filepath).resolve()),
+            'inode': inode,
+            'offset': offset,
+            'updated_at': tailer.updated_at,
+            'risk': data.risk.snapshot(),
+            'stats': data.stats.snapshot(),
+            'trips': data.trips.snapshot(),
+            'reconcile': tailer.reconciler.snapshot()
+        }
+        meta['spatial'], tiles = data.spatial.snapshot()
+        meta['readings'], views = _readings_checkpoint(data.readings)
+        lists = {key: _list_checkpoint(getattr(data, attr)) for key, attr in LISTS.items()}
+        log = getattr(data.readings, 'log', None)
+        meta['spill'] = log.state() if log else None
+    # Rows and entries already taken never change: copy them without the lock
+    arrays = {f"col_{name}": np.array(view) for name, view in views.items()}
+    arrays['tiles'] = tiles
+    for key, (state, items) in lists.items():
+        meta[key] = dict(state, items=list(items[:state['count']]))
+    if log:
+        log.keep()
+    # Lines before the offset are never rewritten, so this needs no lock
+    meta['tail_hash'] = _tail_hash(tailer.filepath, offset)
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp, 'wb') as f:
+            np.savez(f, meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), **arrays)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not write snapshot {path.name}: {e}")
+        return False
+    return True
+
+
+def _segment_paths(meta):
+    """Every spill segment file the snapshot refers to."""
+    paths = [segment[-1] for segment in meta['readings']['segments']]
+    for key in LISTS:
+        paths.extend(segment[-1] for segment in meta[key]['segments'])
+    return paths
+
+
+def _drop_segments(meta):
+    """Remove the spill directory of a snapshot that will not be resumed."""
+    spill = meta.get('spill')
+    if spill and spill.get('directory'):
+        shutil.rmtree(spill['directory'], ignore_errors=True)
+
+
+def load_snapshot(tailer, path):
+    """Restore the tailer from path if it matches the live file; True if it did."""
+    path = Path(path)
+    if not path.exists():
+        return False
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(npz['meta'].tobytes())
+            if not _matches(tailer, meta):
+                _drop_segments(meta)
+                return False
+            columns = {name: npz[f"col_{name}"] for name in COLUMNS}
+            tiles = npz['tiles']
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not read snapshot {path.name}: {e}")
+        return False
+
+    data = tailer.new_state()
+    spilled = hasattr(data.readings, 'resume')
+    segments = _segment_paths(meta)
+    if segments and not (spilled and all(os.path.exists(p) for p in segments)):
+        print(f"Snapshot {path.name} refers to spill segments that are not available")
+        _drop_segments(meta)
+        return False
+
+    reconciler = Reconciler(tailer.deliver)
+    # Restoring creates one container per tile and trip; collecting cycles
+    # in between would only rescan them
+    gc.disable()
+    try:
+        if spilled:
+            data.readings.log.adopt(meta['spill'] or {'directory': None, 'count': 0})
+            data.readings.resume(meta['readings'], columns)
+        else:
+            data.readings.extend(columns)
+        for key, attr in LISTS.items():
+            items = getattr(data, attr)
+            if spilled:
+                items.resume(meta[key], meta[key]['items'])
+            else:
+                items.extend(meta[key]['items'])
+        data.risk.restore(meta['risk'])
+        data.stats.restore(meta['stats'])
+        data.trips.restore(meta['trips'])
+        data.spatial.restore(meta['spatial'], tiles)
+        reconciler.restore(meta['reconcile'])
+    finally:
+        gc.enable()
+    with tailer.lock:
+        tailer.data = data
+        tailer.reconciler = reconciler
+        tailer.offset = meta['offset']
+        tailer.inode = meta['inode']
+        tailer.updated_at = meta['updated_at']
+    return True
+
+
+def _matches(tailer, meta):
+    """True if the snapshot was taken of the file the tailer follows, as it still is."""
+    if meta.get('version') != SNAPSHOT_VERSION:
+        return False
+    if meta.get('file') != str(Path(tailer.filepath).resolve()):
+        return False
+    try:
+        stat = os.stat(tailer.filepath)
+    except OSError:
+        return False
+    if stat.st_ino != meta['inode'] or stat.st_size < meta['offset']:
+        return False
+    return _tail_hash(tailer.filepath, meta['offset']) == meta['tail_hash']
+
+
+def start_checkpoints(tailer, path, interval=CHECKPOINT_INTERVAL):
+    """Poll and checkpoint the tailer every interval seconds, and once more at exit."""
+    saved = [None]
+
+    def checkpoint():
+        position = (tailer.generation, tailer.offset)
+        if position != saved[0] and save_snapshot(tailer, path):
+            saved[0] = position
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                tailer.poll()
+                checkpoint()
+            except Exception as e:
+                print(f"Checkpoint error: {e}")
+
+    threading.Thread(target=run, daemon=True).start()
+    atexit.register(checkpoint)
@@ -0,0 +1,305 @@
+"""
+DriveGuard Dashboard - Spatial Index
+Map tile aggregates of readings and alerts for viewport queries.
+
+Points are binned into Web Mercator tiles (the z/x/y scheme map libraries
+use) at a few stored zoom LEVELS. Every tile keeps its reading count,
+speed sum and maximum, coordinate sums (the centre of its cluster) and the
+speeding and harsh events raised in it. Tiles of each level are grouped
+under their ancestor GROUP_SPAN zooms up, so a viewport query visits only
+the groups it overlaps instead of every tile ever seen:
+
+    index.query((west, south, east, north), zoom=12)
+
+Live sessions and the fleet buffer incoming points and merge them in
+batches of FLUSH_EVERY (and before every query); history sessions build
+their index from the reading columns in one pass. Either way the merge is
+a handful of array operations per level.
+"""
+
+import math
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+LEVELS = (2, 6, 10, 14, 18)
+GROUP_SPAN = 4               # Zoom levels between a tile and its group
+CELL_ZOOM = 2                # Cells are 4x4 per map tile (64 px)
+MAX_GROUPS = 256             # Groups one query may visit
+HOTSPOTS = 10
+MAX_LAT = 85.05112878        # Web Mercator limit
+WORLD = (-180.0, -MAX_LAT, 180.0, MAX_LAT)
+CACHE_SIZE = 8
+FLUSH_EVERY = 1024          # Buffered points per batch merge
+
+# Per-tile aggregate layout
+READINGS, SPEED_SUM, MAX_SPEED, POINTS, LAT_SUM, LON_SUM, SPEEDING, HARSH = range(8)
+
+
+def tile_xy(lat, lon, zoom):
+    """Tile (x, y) containing a point at a zoom level."""
+    n = 1 << zoom
+    lat = math.radians(min(max(lat, -MAX_LAT), MAX_LAT))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_xy_array(lat, lon, zoom):
+    """tile_xy() over arrays."""
+    n = 1 << zoom
+    lat = np.radians(np.clip(lat, -MAX_LAT, MAX_LAT))
+    x = ((np.asarray(lon) + 180.0) / 360.0 * n).astype(np.int64)
+    y = ((1.0 - np.arcsinh(np.tan(lat)) / np.pi) / 2.0 * n).astype(np.int64)
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def parse_bbox(text):
+    """(west, south, east, north) from 'west,south,east,north' (None = world)."""
+    if not text:
+        return WORLD
+    try:
+        west, south, east, north = (float(v) for v in text.split(','))
+    except ValueError:
+        raise ValueError("bbox must be west,south,east,north in degrees")
+    if not (-180 <= west <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("bbox must have west <= east and south <= north (no antimeridian crossing)")
+    return west, south, east, north
+
+
+def _has_fix(lat, lon):
+    return lat != 0 or lon != 0
+
+
+class TileIndex:
+    """Tile aggregates of one session or of the whole fleet."""
+
+    def __init__(self):
+        # level -> {group (x, y): {tile (x, y): aggregate list}}
+        self.levels = {level: {} for level in LEVELS}
+        self.lock = threading.Lock()
+        self.version = 0
+        self._harsh = {}         # Device -> harsh alert times (ms) waiting for their reading
+        self._pending = []
+
+    def add(self, kind, record, device=None):
+        """Feed one parsed (kind, record) pair of a device (None: a single board).
+
+        Safe to call from several ingest threads at once.
+        """
+        with self.lock:
+            if kind == 'batch_data':
+                harsh = 0
+                waiting = self._harsh.get(device)
+                while waiting and waiting[0] <= record['timestamp']:
+                    waiting.popleft()
+                    harsh += 1
+                if record['gps_valid'] and _has_fix(record['lat'], record['lon']):
+                    self._pending.append((record['lat'], record['lon'], record['speed'], True, 0, harsh))
+            elif kind == 'alert_speed':
+                if _has_fix(record['lat'], record['lon']):
+                    self._pending.append((record['lat'], record['lon'], 0.0, False, 1, 0))
+            elif kind == 'alert_harsh':
+                # Harsh alerts carry no position: they land on their reading's
+                # tile, which only the same board's clock can tell
+                self._harsh.setdefault(device, deque()).append(record['timestamp'] * 1000)
+            # Points are merged into the tiles in batches (see _flush)
+            full = len(self._pending) >= FLUSH_EVERY
+        if full:
+            self._flush()
+
+    def _flush(self):
+        """Merge the buffered points into the tiles."""
+        with self.lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                lat, lon, speed, is_reading, speeding, harsh = (np.array(c) for c in zip(*pending))
+                self._merge(lat, lon, speed, is_reading, speeding, harsh)
+
+    def _merge(self, lat, lon, speed, is_reading, speeding, harsh):
+        """Add point arrays to the tile aggregates of every level."""
+        top = LEVELS[-1]
+        x, y = tile_xy_array(lat, lon, top)
+        for level in LEVELS:
+            shift = top - level
+            keys, inverse = np.unique(((x >> shift) << 32) | (y >> shift), return_inverse=True)
+            max_speed = np.zeros(len(keys))
+            np.maximum.at(max_speed, inverse, speed)
+            sums = [np.bincount(inverse, weights=w, minlength=len(keys)).tolist()
+                    for w in (is_reading, speed, None, lat, lon, speeding, harsh)]
+            max_speed = max_speed.tolist()
+            span = min(GROUP_SPAN, level)
+            groups = self.levels[level]
+            for i, key in enumerate(keys.tolist()):
+                tile = (key >> 32, key & 0xFFFFFFFF)
+                group = groups.setdefault((tile[0] >> span, tile[1] >> span), {})
+                agg = group.get(tile)
+                if agg is None:
+                    agg = group[tile] = [0, 0.0, 0.0, 0, 0.0, 0.0, 0, 0]
+                agg[READINGS] += int(sums[0][i])
+                agg[SPEED_SUM] += sums[1][i]
+                agg[MAX_SPEED] = max(agg[MAX_SPEED], max_speed[i])
+                agg[POINTS] += int(sums[2][i])
+                agg[LAT_SUM] += sums[3][i]
+                agg[LON_SUM] += sums[4][i]
+                agg[SPEEDING] += int(sums[5][i])
+                agg[HARSH] += int(sums[6][i])
+        self.version += len(lat)
+
+    def snapshot(self):
+        """State as (plain data, tile array) to restore() after a restart.
+
+        The array has a row per stored tile: level, x, y and its aggregate.
+        """
+        self._flush()
+        parts = []
+        with self.lock:
+            for level, groups in self.levels.items():
+                tiles = [tile for group in groups.values() for tile in group]
+                aggs = [agg for group in groups.values() for agg in group.values()]
+                part = np.empty((len(tiles), 3 + 8))
+                part[:, 0] = level
+                part[:, 1:3] = np.array(tiles, dtype=np.float64).reshape(-1, 2)
+                part[:, 3:] = np.array(aggs, dtype=np.float64).reshape(-1, 8)
+                parts.append(part)
+            state = {'version': self.version,
+                     'harsh': [[device, list(waiting)] for device, waiting in self._harsh.items()]}
+        return state, np.concatenate(parts)
+
+    def restore(self, state, tiles):
+        """Continue from a snapshot()."""
+        levels = {}
+        for level in LEVELS:
+            rows = tiles[tiles[:, 0] == level]
+            span = min(GROUP_SPAN, level)
+            x, y = rows[:, 1].astype(np.int64), rows[:, 2].astype(np.int64)
+            values = [rows[:, 3 + i].astype(np.int64 if i in (READINGS, POINTS, SPEEDING, HARSH) else np.float64).tolist()
+                      for i in range(8)]
+            groups = levels[level] = {}
+            for group, tile, agg in zip(zip((x >> span).tolist(), (y >> span).tolist()),
+                                        zip(x.tolist(), y.tolist()), zip(*values)):
+                groups.setdefault(group, {})[tile] = list(agg)
+        with self.lock:
+            self.levels = levels
+            self.version = state['version']
+            self._harsh = {device: deque(waiting) for device, waiting in state['harsh']}
+            self._pending = []
+
+    @classmethod
+    def from_columns(cls, columns, alerts_speed=(), alerts_harsh=()):
+        """Index of a recorded session, built with array operations.
+
+        Harsh alerts are matched to their reading by timestamp, which needs
+        the timestamps in order (one boot, one board); otherwise they are
+        left out.
+        """
+        index = cls()
+        ts = np.asarray(columns['timestamp'])
+        lat = np.asarray(columns['lat'], dtype=np.float64)
+        lon = np.asarray(columns['lon'], dtype=np.float64)
+        keep = (np.asarray(columns['gps_valid']) != 0) & ((lat != 0) | (lon != 0))
+
+        harsh = np.zeros(len(ts), dtype=np.int64)
+        if len(alerts_harsh) and len(ts) and np.all(ts[1:] >= ts[:-1]):
+            alert_ms = np.array([a['timestamp'] for a in alerts_harsh], dtype=np.float64) * 1000
+            rows = np.searchsorted(ts, alert_ms, side='left')
+            harsh = np.bincount(rows[rows < len(ts)], minlength=len(ts))
+
+        speed_lat = np.array([a['lat'] for a in alerts_speed], dtype=np.float64)
+        speed_lon = np.array([a['lon'] for a in alerts_speed], dtype=np.float64)
+        alert_fix = (speed_lat != 0) | (speed_lon != 0)
+        n_readings = int(keep.sum())
+        n_alerts = int(alert_fix.sum())
+
+        lat = np.concatenate([lat[keep], speed_lat[alert_fix]])
+        lon = np.concatenate([lon[keep], speed_lon[alert_fix]])
+        is_reading = np.arange(len(lat)) < n_readings
+        speed = np.concatenate([np.asarray(columns['speed'], dtype=np.float64)[keep], np.zeros(n_alerts)])
+        harsh = np.concatenate([harsh[keep], np.zeros(n_alerts, dtype=np.int64)])
+        index._merge(lat, lon, speed, is_reading, ~is_reading, harsh)
+        return index
+
+    def query(self, bbox=WORLD, zoom=2, hotspots=HOTSPOTS):
+        """Cells of a viewport with their aggregates, plus the top hotspots.
+
+        Cells are tiles of zoom + CELL_ZOOM (limited to the finest stored
+        level). Raises ValueError if the viewport covers too many groups
+        for the zoom.
+        """
+        west, south, east, north = bbox
+        cell_zoom = min(max(int(zoom), 0) + CELL_ZOOM, LEVELS[-1])
+        level = next(l for l in LEVELS if l >= cell_zoom)
+        span = min(GROUP_SPAN, level)
+        x0, y0 = tile_xy(north, west, level)
+        x1, y1 = tile_xy(south, east, level)
+        gx0, gy0, gx1, gy1 = x0 >> span, y0 >> span, x1 >> span, y1 >> span
+        if (gx1 - gx0 + 1) * (gy1 - gy0 + 1) > MAX_GROUPS:
+            raise ValueError(f"bbox is too large for zoom {zoom}; zoom out or shrink it")
+        shift = level - cell_zoom
+
+        self._flush()
+        cells = {}
+        with self.lock:
+            groups = self.levels[level]
+            for gx in range(gx0, gx1 + 1):
+                for gy in range(gy0, gy1 + 1):
+                    group = groups.get((gx, gy))
+                    if not group:
+                        continue
+                    for (x, y), agg in group.items():
+                        if not (x0 <= x <= x1 and y0 <= y <= y1):
+                            continue
+                        key = (x >> shift, y >> shift)
+                        cell = cells.get(key)
+                        if cell is None:
+                            cells[key] = list(agg)
+                        else:
+                            for i in (READINGS, SPEED_SUM, POINTS, LAT_SUM, LON_SUM, SPEEDING, HARSH):
+                                cell[i] += agg[i]
+                            cell[MAX_SPEED] = max(cell[MAX_SPEED], agg[MAX_SPEED])
+
+        rows = [_cell_row(cell_zoom, key, agg) for key, agg in sorted(cells.items())]
+        ranked = sorted((row for row in rows if row['events']), key=lambda row: row['events'], reverse=True)
+        return {
+            'zoom': int(zoom),
+            'cell_zoom': cell_zoom,
+            'cells': rows,
+            'hotspots': ranked[:hotspots]
+        }
+
+
+def _cell_row(zoom, key, agg):
+    points = agg[POINTS]
+    return {
+        'z': zoom,
+        'x': key[0],
+        'y': key[1],
+        'lat': round(agg[LAT_SUM] / points, 6),
+        'lon': round(agg[LON_SUM] / points, 6),
+        'readings': agg[READINGS],
+        'avg_speed': round(agg[SPEED_SUM] / agg[READINGS], 1) if agg[READINGS] else None,
+        'max_speed': round(agg[MAX_SPEED], 1),
+        'speeding': agg[SPEEDING],
+        'harsh': agg[HARSH],
+        'events': agg[SPEEDING] + agg[HARSH]
+    }
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def cached_index(session_key, build):
+    """TileIndex of a recorded session, built once per session version."""
+    with _cache_lock:
+        index = _cache.get(session_key)
+        if index is not None:
+            _cache.move_to_end(session_key)
+            return index
+    index = build()
+    with _cache_lock:
+        _cache[session_key] = index
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
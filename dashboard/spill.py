@@ -0,0 +1,404 @@
+"""
+DriveGuard Dashboard - Spill Segments
+Bounded memory for long-running live sessions.
+
+With a memory budget, a live session keeps only its newest readings and
+alerts in memory. Once a column store or alert list holds twice its share,
+the older half is written to a segment file and dropped from memory:
+
+    readings    - a .dgc archive of the rows (floats stored exactly)
+    alerts      - a JSON list per alert type / status / quality messages
+
+Rows and list entries keep their position for good. column(), slices and
+time_range() read across the segments and memory, so cursors and windows
+work as before; only reads that reach back past memory touch the disk.
+Re-scoring reads the segments one at a time (reading_pieces()). Segment
+files live in a directory per session that is removed when the session
+is dropped. live_session() builds such a session.
+
+A live snapshot stores only what is in memory plus the segment paths
+(checkpoint() / resume()); once a snapshot refers to them, the segments
+stay on disk when the process exits so a restart can take them over.
+
+The budget comes from the environment (run.py sets it from config.py):
+
+    DRIVEGUARD_SPILL_DIR       - where segment directories go
+    DRIVEGUARD_LIVE_READINGS   - readings kept in memory (0 = no limit)
+    DRIVEGUARD_LIVE_ALERTS     - alerts / status / quality messages of each kind kept
+"""
+
+import bisect
+import json
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from archive import ENCODINGS, ColumnarArchive, write_columns
+from session import SessionData
+from store import COLUMNS, ReadingStore, columns_to_records, summarize
+
+OPEN_SEGMENTS = 4            # Segment files kept mapped per session
+DEFAULT_ALERTS = 1000
+
+# Spilled rows must read back exactly (re-scoring compares raw values)
+SEGMENT_ENCODINGS = dict(ENCODINGS, speed=('plain', None), acc=('plain', None),
+                         lat=('plain', None), lon=('plain', None))
+
+MemoryBudget = namedtuple('MemoryBudget', ['directory', 'readings', 'alerts'])
+
+
+def live_budget():
+    """MemoryBudget from the environment, or None to keep everything in memory."""
+    readings = int(os.environ.get("DRIVEGUARD_LIVE_READINGS", 0) or 0)
+    if readings <= 0:
+        return None
+    directory = os.environ.get("DRIVEGUARD_SPILL_DIR") or tempfile.gettempdir()
+    alerts = int(os.environ.get("DRIVEGUARD_LIVE_ALERTS", DEFAULT_ALERTS) or DEFAULT_ALERTS)
+    return MemoryBudget(Path(directory), readings, alerts)
+
+
+def live_session(budget=None):
+    """Empty live SessionData, within a memory budget (default: live_budget())."""
+    return apply_budget(SessionData(), budget)
+
+
+def apply_budget(data, budget=None):
+    """Give an empty session spilling readings and lists; returns it."""
+    budget = budget or live_budget()
+    if budget is not None:
+        log = SegmentLog(budget.directory)
+        data.readings = SpilledReadings(log, budget.readings)
+        data.alerts_speed = SpilledList(log, 'alerts_speed', budget.alerts)
+        data.alerts_harsh = SpilledList(log, 'alerts_harsh', budget.alerts)
+        data.status_msgs = SpilledList(log, 'status', budget.alerts)
+        data.quality_events = SpilledList(log, 'quality', budget.alerts)
+        data.alerts_risk = SpilledList(log, 'alerts_risk', budget.alerts)
+    return data
+
+
+class SegmentLog:
+    """Segment files of one session, in a directory of their own."""
+
+    def __init__(self, directory):
+        self.parent = Path(directory)
+        self.directory = None
+        self.lock = threading.Lock()
+        self._open = OrderedDict()
+        self._count = 0
+        self._finalizer = None
+        self._keep = False
+
+    def _own(self, directory):
+        self.directory = Path(directory)
+        # Segments go with the session (or the process, unless kept)
+        self._finalizer = weakref.finalize(self, shutil.rmtree, str(self.directory), True)
+        self._finalizer.atexit = not self._keep
+
+    def _path(self, name):
+        if self.directory is None:
+            self.parent.mkdir(parents=True, exist_ok=True)
+            self._own(tempfile.mkdtemp(prefix="live_", dir=self.parent))
+        self._count += 1
+        return self.directory / f"{self._count:06d}_{name}"
+
+    def keep(self):
+        """Leave the segments on disk when the process exits (a snapshot refers to them)."""
+        self._keep = True
+        if self._finalizer is not None:
+            self._finalizer.atexit = False
+
+    def state(self):
+        """Directory and segment count, for a snapshot."""
+        return {'directory': str(self.directory) if self.directory else None,
+                'count': self._count}
+
+    def adopt(self, state):
+        """Take over the segment directory recorded by state()."""
+        if state['directory'] is not None:
+            self._own(state['directory'])
+        self._count = state['count']
+
+    def write_rows(self, columns):
+        """Store reading columns; returns the segment path."""
+        path = self._path("readings.dgc")
+        write_columns(path, columns, encodings=SEGMENT_ENCODINGS)
+        return path
+
+    def write_items(self, name, items):
+        """Store a list of alert / status dicts; returns the segment path."""
+        path = self._path(f"{name}.json")
+        with open(path, 'w') as f:
+            json.dump(items, f)
+        return path
+
+    def archive(self, path):
+        """Mapped ColumnarArchive of a readings segment (a few stay open)."""
+        with self.lock:
+            archive = self._open.get(path)
+            if archive is None:
+                archive = self._open[path] = ColumnarArchive(path)
+                while len(self._open) > OPEN_SEGMENTS:
+                    self._open.popitem(last=False)
+            else:
+                self._open.move_to_end(path)
+            return archive
+
+    def items(self, path):
+        """Entries of an alert / status segment."""
+        with open(path) as f:
+            return json.load(f)
+
+
+class SpilledReadings:
+    """ReadingStore lookalike that keeps only the newest rows in memory.
+
+    Rows before base are in segments, the rest in a ReadingStore of
+    between capacity and 2 * capacity rows. A spill swaps in a new
+    (base, store) pair at once, so readers that do not hold the ingest
+    lock see either the old window or the new one.
+    """
+
+    def __init__(self, log, capacity):
+        self.log = log
+        self.capacity = capacity
+        self.window = (0, ReadingStore())
+        self.segments = []       # (first row, rows, last timestamp, path)
+        self._firsts = []
+        self._sorted = True
+
+    def __len__(self):
+        base, memory = self.window
+        return base + len(memory)
+
+    @property
+    def ts_sorted(self):
+        return self._sorted and self.window[1].ts_sorted
+
+    def append(self, reading):
+        """Append one reading dict (as built by the parser)."""
+        memory = self.window[1]
+        memory.append(reading)
+        if len(memory) >= 2 * self.capacity:
+            self._spill()
+
+    def extend(self, columns):
+        """Append many readings given as a dict of equal-length arrays."""
+        memory = self.window[1]
+        memory.extend(columns)
+        if len(memory) >= 2 * self.capacity:
+            self._spill()
+
+    def _spill(self):
+        """Move all but the newest capacity rows to a segment."""
+        base, memory = self.window
+        n = len(memory) - self.capacity
+        columns = {name: memory.column(name, 0, n) for name in COLUMNS}
+        path = self.log.write_rows(columns)
+        kept = ReadingStore.from_columns({name: memory.column(name, n).copy() for name in COLUMNS})
+        self.segments.append((base, n, int(columns['timestamp'].max()), path))
+        self._firsts.append(base)
+        # memory's flag still covers the rows on both sides of the cut
+        self._sorted = self._sorted and memory.ts_sorted
+        self.window = (base + n, kept)
+
+    def column(self, name, start=None, stop=None):
+        """Values of one column over rows [start, stop), from disk where needed.
+
+        Rows still in memory come back as a view, as from ReadingStore.
+        """
+        base, memory = self.window
+        start, stop, _ = slice(start, stop).indices(base + len(memory))
+        stop = max(start, stop)
+        if start >= base:
+            return memory.column(name, start - base, stop - base)
+        dtype = COLUMNS[name][0]
+        parts = []
+        i = bisect.bisect_right(self._firsts, start) - 1
+        for first, rows, _, path in self.segments[i:]:
+            if first >= min(stop, base):
+                break
+            lo, hi = max(start, first) - first, min(stop, first + rows) - first
+            parts.append(self.log.archive(path).column(name, lo, hi).astype(dtype))
+        if stop > base:
+            parts.append(memory.column(name, 0, stop - base))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+    def _search(self, value, side):
+        """Row position np.searchsorted would give over the whole column."""
+        base, memory = self.window
+        for first, rows, last_ts, path in self.segments:
+            if first >= base:
+                break
+            if value < last_ts or (side == 'left' and value == last_ts):
+                archive = self.log.archive(path)
+                if side == 'left':
+                    return first + archive.time_range(value, None)[0]
+                return first + archive.time_range(None, value)[1]
+        if side == 'left':
+            return base + memory.time_range(value, None)[0]
+        return base + memory.time_range(None, value)[1]
+
+    def time_range(self, t_from=None, t_to=None):
+        """Row indices [start, stop) with t_from <= timestamp <= t_to."""
+        if not self.ts_sorted:
+            raise ValueError("timestamps are not sorted")
+        n = len(self)
+        start = 0 if t_from is None else self._search(t_from, 'left')
+        stop = n if t_to is None else self._search(t_to, 'right')
+        return start, max(start, stop)
+
+    def to_records(self, start=None, stop=None):
+        """Serialize a row range as a list of dicts for the JSON API."""
+        return columns_to_records({name: self.column(name, start, stop) for name in COLUMNS})
+
+    def summary(self):
+        """Reading statistics over every row (reads the segments)."""
+        return summarize(self.column('speed'), self.column('acc'), self.column('score'))
+
+    def pieces(self, names):
+        """The rows as (key, first row, load) pieces, see reading_pieces()."""
+        base, memory = self.window
+        log = self.log
+        pieces = []
+        for first, rows, _, path in self.segments:
+            if first >= base:
+                break
+            pieces.append((str(path), first, lambda path=path: {
+                name: log.archive(path).column(name).astype(COLUMNS[name][0]) for name in names}))
+        columns = {name: np.array(memory.column(name)) for name in names}
+        pieces.append((None, base, lambda: columns))
+        return pieces
+
+    def checkpoint(self):
+        """(segment state, views of the rows in memory) for a snapshot.
+
+        Call under the ingest lock. Appends and spills never change rows a
+        view already covers, so the views can be copied after releasing it.
+        """
+        base, memory = self.window
+        state = {
+            'base': base,
+            'sorted': self._sorted,
+            'segments': [[first, rows, last_ts, str(path)]
+                         for first, rows, last_ts, path in self.segments]
+        }
+        return state, {name: memory.column(name) for name in COLUMNS}
+
+    def resume(self, state, columns):
+        """Restore from checkpoint(): segments by path, memory from columns."""
+        self.segments = [(first, rows, last_ts, Path(path))
+                         for first, rows, last_ts, path in state['segments']]
+        self._firsts = [segment[0] for segment in self.segments]
+        self._sorted = state['sorted']
+        self.window = (state['base'], ReadingStore.from_columns(columns))
+
+
+def reading_pieces(readings, names):
+    """Columns of a reading store as consecutive (key, first row, load) pieces.
+
+    For scoring.rescore_pieces(); call under the ingest lock. Stores that
+    spill (or query another process) give their own pieces(): segments are
+    keyed by path and only read when loaded, one at a time. Rows in
+    memory, or all rows of a store that does not spill, are copied now.
+    """
+    if hasattr(readings, 'pieces'):
+        return readings.pieces(names)
+    columns = {name: np.array(readings.column(name)) for name in names}
+    return [(None, 0, lambda: columns)]
+
+
+class SpilledList:
+    """List of alert / status dicts that keeps only the newest in memory.
+
+    Supports what the API does with these lists: len(), iteration,
+    indexing, slicing, append() and extend().
+    """
+
+    def __init__(self, log, name, capacity):
+        self.log = log
+        self.name = name
+        self.capacity = capacity
+        self.window = (0, [])    # (index of the first entry in memory, entries)
+        self.segments = []       # (first index, count, path)
+
+    def __len__(self):
+        base, recent = self.window
+        return base + len(recent)
+
+    def append(self, item):
+        self.extend([item])
+
+    def extend(self, items):
+        recent = self.window[1]
+        recent.extend(items)
+        if len(recent) >= 2 * self.capacity:
+            self._spill()
+
+    def _spill(self):
+        base, recent = self.window
+        n = len(recent) - self.capacity
+        path = self.log.write_items(self.name, recent[:n])
+        self.segments.append((base, n, path))
+        self.window = (base + n, recent[n:])
+
+    def _range(self, start, stop):
+        """Entries [start, stop) as a new list."""
+        base, recent = self.window
+        if start >= base:
+            return recent[start - base:stop - base]
+        items = []
+        for first, count, path in self.segments:
+            if first + count <= start:
+                continue
+            if first >= min(stop, base):
+                break
+            items.extend(self.log.items(path)[max(start, first) - first:min(stop, first + count) - first])
+        if stop > base:
+            items.extend(recent[:stop - base])
+        return items
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self._range(0, len(self))[index]
+            return self._range(start, max(start, stop))
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("list index out of range")
+        return self._range(index, index + 1)[0]
+
+    def __iter__(self):
+        base, recent = self.window
+        for first, count, path in self.segments:
+            if first >= base:
+                break
+            yield from self.log.items(path)
+        yield from recent[:]
+
+    def checkpoint(self):
+        """(segment state, entries in memory) for a snapshot.
+
+        Call under the ingest lock; state['count'] entries of the list are
+        fixed and can be copied after releasing it.
+        """
+        base, recent = self.window
+        state = {
+            'base': base,
+            'count': len(recent),
+            'segments': [[first, count, str(path)] for first, count, path in self.segments]
+        }
+        return state, recent
+
+    def resume(self, state, items):
+        """Restore from checkpoint(): segments by path, memory from items."""
+        self.segments = [(first, count, Path(path)) for first, count, path in state['segments']]
+        self.window = (state['base'], list(items))
@@ -0,0 +1,178 @@
+"""
+DriveGuard Dashboard - Running Statistics
+Session statistics updated in constant time per reading.
+"""
+
+import math
+
+import numpy as np
+
+from store import COLUMNS, quantile_rank
+
+SPEED_RANGE = (0, 400)       # km/h kept in the speed quantile bins
+ACCEL_RANGE = (0, 16)        # g, the IMU's full scale
+
+
+class BinnedQuantiles:
+    """Exact quantiles of a series of values rounded to a few decimals.
+
+    Sensor values only take a few thousand distinct values at the precision
+    the store keeps (0.1 km/h, 0.01 g), so one count per value over a fixed
+    range answers any quantile exactly in constant memory. Adding a value
+    bumps one count and a read walks the fixed bins once, so neither grows
+    with the session. Values outside the range are counted in the edge bins.
+    Quantiles use the nearest-rank definition of store.quantiles().
+    """
+
+    def __init__(self, decimals, low, high):
+        self.scale = 10.0 ** decimals
+        self.low = round(low * self.scale)
+        self.counts = np.zeros(round(high * self.scale) - self.low + 1, dtype=np.int64)
+        self.total = 0
+        self._ranks = None           # Cumulative counts, until the next add()
+
+    def add(self, x):
+        """Feed one observation."""
+        if not math.isfinite(x):
+            return
+        i = min(max(round(x * self.scale) - self.low, 0), len(self.counts) - 1)
+        self.counts[i] += 1
+        self.total += 1
+        self._ranks = None
+
+    def value(self, p):
+        """The p-quantile, 0 before the first observation."""
+        if not self.total:
+            return 0
+        if self._ranks is None:
+            self._ranks = np.cumsum(self.counts)
+        i = int(np.searchsorted(self._ranks, quantile_rank(self.total, p)))
+        return (i + self.low) / self.scale
+
+    def snapshot(self):
+        """Counts as plain data (see restore())."""
+        bins = np.flatnonzero(self.counts)
+        return {'keys': (bins + self.low).tolist(), 'counts': self.counts[bins].tolist()}
+
+    def restore(self, state):
+        """Continue from a snapshot() of the same series."""
+        self.counts[:] = 0
+        bins = np.clip(np.array(state['keys'], dtype=np.int64) - self.low, 0, len(self.counts) - 1)
+        np.add.at(self.counts, bins, np.array(state['counts'], dtype=np.int64))
+        self.total = int(self.counts.sum())
+        self._ranks = None
+
+
+def _num(value):
+    """Return value as a float, or None if it is not numeric."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RunningStats:
+    """Counts, sums, extrema and quantiles of a session's readings."""
+
+    def __init__(self):
+        self.total_readings = 0
+        self.speed_sum = 0.0
+        self.max_speed = 0
+        self.max_accel = 0
+        self.current_score = 100
+        self.speed_alerts = 0
+        self.harsh_alerts = 0
+        self.risk_alerts = 0
+        self.duplicates = 0
+        self.late_readings = 0
+        self.missing_readings = 0
+        self.gaps = 0
+        self.restarts = 0
+        self.speed_values = BinnedQuantiles(COLUMNS['speed'][1], *SPEED_RANGE)
+        self.accel_values = BinnedQuantiles(COLUMNS['acc'][1], *ACCEL_RANGE)
+
+    def add(self, kind, record):
+        """Update the statistics with one parsed record."""
+        if kind == 'batch_data':
+            self.add_reading(record)
+        elif kind == 'alert_speed':
+            self.speed_alerts += 1
+        elif kind == 'alert_harsh':
+            self.harsh_alerts += 1
+        elif kind == 'alert_risk':
+            self.risk_alerts += 1
+        elif kind == 'quality':
+            self.add_quality(record)
+
+    def add_quality(self, event):
+        """Count one data-quality record from the ingest reconciler."""
+        kind = event.get('type')
+        if kind == 'duplicate':
+            self.duplicates += event['count']
+        elif kind == 'late':
+            self.late_readings += event['count']
+        elif kind == 'gap':
+            self.gaps += 1
+            self.missing_readings += event['count']
+        elif kind == 'restart':
+            self.restarts += 1
+
+    def add_reading(self, reading):
+        """Update the statistics with one batch reading."""
+        speed = _num(reading.get('speed', 0))
+        acc = _num(reading.get('acc', 0))
+
+        # Match the old full-scan behaviour: max() started from the first reading
+        if self.total_readings == 0:
+            self.max_speed = speed if speed is not None else 0
+            self.max_accel = acc if acc is not None else 0
+        self.total_readings += 1
+        self.current_score = reading.get('score', 100)
+
+        if speed is not None:
+            self.speed_sum += speed
+            self.max_speed = max(self.max_speed, speed)
+            self.speed_values.add(speed)
+        if acc is not None:
+            self.max_accel = max(self.max_accel, acc)
+            self.accel_values.add(acc)
+
+    def snapshot(self):
+        """State as plain data, to restore() after a restart."""
+        return {name: value.snapshot() if isinstance(value, BinnedQuantiles) else value
+                for name, value in vars(self).items()}
+
+    def restore(self, state):
+        """Continue from a snapshot()."""
+        for name, value in state.items():
+            current = getattr(self, name)
+            if isinstance(current, BinnedQuantiles):
+                current.restore(value)
+            else:
+                setattr(self, name, value)
+
+    def to_dict(self):
+        """Stats block served by the API."""
+        avg_speed = self.speed_sum / self.total_readings if self.total_readings else 0
+        return {
+            'total_readings': self.total_readings,
+            'total_alerts': self.speed_alerts + self.harsh_alerts,
+            'current_score': self.current_score,
+            'max_speed': self.max_speed,
+            'avg_speed': avg_speed,
+            'max_accel': self.max_accel,
+            'p50_speed': self.speed_values.value(0.50),
+            'p95_speed': self.speed_values.value(0.95),
+            'p50_accel': self.accel_values.value(0.50),
+            'p95_accel': self.accel_values.value(0.95),
+            'speed_alerts': self.speed_alerts,
+            'harsh_alerts': self.harsh_alerts,
+            'risk_alerts': self.risk_alerts,
+            'data_quality': {
+                'duplicates': self.duplicates,
+                'late_readings': self.late_readings,
+                'missing_readings': self.missing_readings,
+                'gaps': self.gaps,
+                'restarts': self.restarts
+            }
+        }
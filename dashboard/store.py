@@ -0,0 +1,208 @@
+"""
+DriveGuard Dashboard - Columnar Reading Store
+Batch readings kept in growable typed NumPy arrays instead of dicts.
+"""
+
+import math
+
+import numpy as np
+
+
+# API key -> (dtype, decimals kept when serializing, default)
+COLUMNS = {
+    'timestamp': (np.int64, None, 0),
+    'speed': (np.float32, 1, 0),
+    'lat': (np.float64, 6, 0),
+    'lon': (np.float64, 6, 0),
+    'acc': (np.float32, 2, 0),
+    'score': (np.int16, None, 100),
+    'gps_valid': (np.uint8, None, 0),
+}
+
+INITIAL_CAPACITY = 1024
+
+
+class ReadingStore:
+    """Append-only column store for batch readings.
+
+    Each column is a typed array that doubles in size when full, so an
+    append is amortised O(1) and a reading costs 35 bytes instead of a
+    7-key dict. Timestamps are the firmware's millis() since start-up.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        self.capacity = capacity
+        self.columns = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, (dtype, _, _) in COLUMNS.items()
+        }
+        # Stays True while timestamps arrive in non-decreasing order
+        self.ts_sorted = True
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Wrap existing column arrays (e.g. loaded from disk) without copying."""
+        store = cls(capacity=1)
+        n = len(columns['timestamp'])
+        for name, (dtype, _, default) in COLUMNS.items():
+            arr = np.asarray(columns[name]) if name in columns else np.full(n, default)
+            store.columns[name] = arr.astype(dtype, copy=False)
+        store.size = store.capacity = n
+        ts = store.columns['timestamp']
+        store.ts_sorted = bool(n < 2 or np.all(ts[1:] >= ts[:-1]))
+        return store
+
+    def _grow(self, needed):
+        capacity = max(self.capacity, 1)
+        while capacity < needed:
+            capacity *= 2
+        for name, arr in self.columns.items():
+            grown = np.zeros(capacity, dtype=arr.dtype)
+            grown[:self.size] = arr[:self.size]
+            self.columns[name] = grown
+        self.capacity = capacity
+
+    def append(self, reading):
+        """Append one reading dict (as built by the parser)."""
+        if self.size == self.capacity:
+            self._grow(self.size + 1)
+        i = self.size
+        ts = reading.get('timestamp', 0)
+        if i and ts < self.columns['timestamp'][i - 1]:
+            self.ts_sorted = False
+        for name, (_, _, default) in COLUMNS.items():
+            value = reading.get(name, default)
+            try:
+                self.columns[name][i] = value
+            except (TypeError, ValueError, OverflowError):
+                self.columns[name][i] = default
+        self.size = i + 1
+
+    def extend(self, columns):
+        """Append many readings given as a dict of equal-length arrays."""
+        n = len(columns['timestamp'])
+        if n == 0:
+            return
+        if self.size + n > self.capacity:
+            self._grow(self.size + n)
+        start, stop = self.size, self.size + n
+        for name, (_, _, default) in COLUMNS.items():
+            self.columns[name][start:stop] = columns.get(name, default)
+        ts = self.columns['timestamp']
+        if np.any(np.diff(ts[max(0, start - 1):stop]) < 0):
+            self.ts_sorted = False
+        self.size = stop
+
+    def keep_last(self, n):
+        """Drop all but the newest n readings, in place."""
+        if self.size <= n:
+            return
+        start = self.size - n
+        for arr in self.columns.values():
+            arr[:n] = arr[start:self.size]
+        self.size = n
+
+    def column(self, name, start=None, stop=None):
+        """View of one column over the filled rows (no copy)."""
+        return self.columns[name][:self.size][start:stop]
+
+    def time_range(self, t_from=None, t_to=None):
+        """Row indices [start, stop) with t_from <= timestamp <= t_to."""
+        ts = self.column('timestamp')
+        if not self.ts_sorted:
+            raise ValueError("timestamps are not sorted")
+        start = 0 if t_from is None else int(np.searchsorted(ts, t_from, side='left'))
+        stop = self.size if t_to is None else int(np.searchsorted(ts, t_to, side='right'))
+        return start, max(start, stop)
+
+    def slice_by_time(self, t_from=None, t_to=None):
+        """Columns (views) of the readings between two timestamps."""
+        if self.ts_sorted:
+            start, stop = self.time_range(t_from, t_to)
+            return {name: self.column(name, start, stop) for name in COLUMNS}
+        ts = self.column('timestamp')
+        mask = np.ones(self.size, dtype=bool)
+        if t_from is not None:
+            mask &= ts >= t_from
+        if t_to is not None:
+            mask &= ts <= t_to
+        return {name: self.column(name)[mask] for name in COLUMNS}
+
+    def to_records(self, start=None, stop=None, columns=None):
+        """Serialize a row range as a list of dicts for the JSON API."""
+        if columns is None:
+            columns = {name: self.column(name, start, stop) for name in COLUMNS}
+        return columns_to_records(columns)
+
+    def summary(self):
+        """Reading statistics computed with vectorized reductions."""
+        return summarize(self.column('speed'), self.column('acc'), self.column('score'))
+
+
+# Decimals for derived columns that are not stored (e.g. downsampling peaks)
+EXTRA_DECIMALS = {
+    'speed_max': 1,
+    'acc_max': 2,
+}
+
+
+def columns_to_records(columns):
+    """Turn a dict of column arrays into a list of row dicts."""
+    names = [name for name in COLUMNS if name in columns]
+    names += [name for name in columns if name not in COLUMNS]
+    lists = []
+    for name in names:
+        arr = np.asarray(columns[name])
+        decimals = COLUMNS[name][1] if name in COLUMNS else EXTRA_DECIMALS.get(name)
+        if decimals is not None:
+            # float32 -> float64 would otherwise print as 45.20000076293945
+            arr = np.round(arr.astype(np.float64), decimals)
+        lists.append(arr.tolist())
+    return [dict(zip(names, row)) for row in zip(*lists)]
+
+
+def quantile_rank(n, p):
+    """1-based rank of the p-quantile among n sorted values (nearest rank)."""
+    return max(1, math.ceil(p * n))
+
+
+def quantiles(values, ps):
+    """Nearest-rank p-quantiles of an array, the definition RunningStats uses."""
+    ranks = [quantile_rank(len(values), p) - 1 for p in ps]
+    return np.partition(values, ranks)[ranks]
+
+
+def summarize(speed, acc, score):
+    """Stats block fields for a set of readings."""
+    n = len(speed)
+    if n == 0:
+        return {
+            'total_readings': 0,
+            'current_score': 100,
+            'max_speed': 0,
+            'avg_speed': 0,
+            'max_accel': 0,
+            'p50_speed': 0,
+            'p95_speed': 0,
+            'p50_accel': 0,
+            'p95_accel': 0
+        }
+    speed = speed.astype(np.float64)
+    acc = acc.astype(np.float64)
+    p_speed = quantiles(speed, [0.50, 0.95])
+    p_acc = quantiles(acc, [0.50, 0.95])
+    return {
+        'total_readings': n,
+        'current_score': int(score[-1]),
+        'max_speed': round(float(speed.max()), 1),
+        'avg_speed': float(speed.mean()),
+        'max_accel': round(float(acc.max()), 2),
+        'p50_speed': round(float(p_speed[0]), 2),
+        'p95_speed': round(float(p_speed[1]), 2),
+        'p50_accel': round(float(p_acc[0]), 3),
+        'p95_accel': round(float(p_acc[1]), 3)
+    }
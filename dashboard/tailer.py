@@ -0,0 +1,165 @@
+"""
+DriveGuard Dashboard - Live File Tailer
+Follows the live Telegraf output file and parses only newly appended lines.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from anomaly import SPEED_LIMIT
+from metrics import BYTES_READ, INGEST_LAG, LINES_PARSED, PARSE_ERRORS, STAGE_SECONDS
+from reconcile import Reconciler
+from spill import live_session
+from telegraf_parser import parse_line, skippable
+
+READ_CHUNK = 1 << 20         # Bytes read and parsed per hold of the lock
+
+
+class TelegrafTailer:
+    """Incremental reader for a file Telegraf keeps appending to.
+
+    Remembers the byte offset and inode of the file between polls. When the
+    file is truncated, replaced (run.py archives live_data.out and touches a
+    fresh one) or removed, the parsed state is dropped and reading restarts
+    from the beginning of the new file.
+
+    Parsed records go through a Reconciler, which drops duplicate readings
+    and puts late ones in order before they reach the state.
+
+    A poll reads READ_CHUNK bytes at a time and releases the lock between
+    chunks, so catching up with a long file never blocks requests for
+    more than one chunk.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = Path(filepath)
+        self.offset = 0
+        self.inode = None
+        self.speed_limit = SPEED_LIMIT
+        self.data = self.new_state()
+        self.reconciler = Reconciler(self.deliver)
+        self.updated_at = None       # Wall time the state last changed
+        self.lock = threading.Lock()
+        self._reading = threading.Lock()
+        # Bumped whenever the parsed state is thrown away, so stream
+        # clients can tell their cursor belongs to an older session
+        self.generation = 0
+
+    def reset(self, inode=None):
+        """Forget everything read so far.
+
+        Readings the reconciler still holds back are dropped with the rest
+        of the old state. They are in the old file, which run.py archives,
+        so history still has them.
+        """
+        self.offset = 0
+        self.inode = inode
+        self.data = self.new_state()
+        self.reconciler = Reconciler(self.deliver)
+        self.updated_at = None
+        self.generation += 1
+
+    def new_state(self):
+        """Empty state that parsed lines are added to."""
+        data = live_session()
+        data.set_speed_limit(self.speed_limit)
+        return data
+
+    def set_speed_limit(self, limit):
+        """Risk detection speed limit (config speed_danger), now and after a reset."""
+        with self.lock:
+            self.speed_limit = limit
+            self.data.set_speed_limit(limit)
+
+    def deliver(self, device, kind, record):
+        """Add a record the reconciler passed on to the state."""
+        self.data.add(kind, record)
+        self.updated_at = time.time()
+
+    def add_line(self, line):
+        """Parse one complete line into the state; False if it held no record."""
+        parsed = parse_line(line)
+        if parsed:
+            self.reconciler.add(None, *parsed)
+            return True
+        return False
+
+    def poll(self):
+        """Parse any complete lines appended since the last poll.
+
+        A request that finds another thread already reading serves the
+        state as it is instead of waiting for the rest of the file.
+        """
+        if not self._reading.acquire(blocking=False):
+            return self.data
+        try:
+            more = True
+            while more:
+                with self.lock:
+                    more = self._poll()
+            return self.data
+        finally:
+            self._reading.release()
+
+    def _poll(self):
+        """Read one chunk; the caller holds self.lock. True if more is waiting."""
+        try:
+            stat = os.stat(self.filepath)
+        except OSError:
+            # Live file is gone (archived or deleted)
+            if self.inode is not None or self.offset:
+                self.reset()
+            return False
+
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.reset(stat.st_ino)
+
+        more = False
+        if stat.st_size > self.offset:
+            more = self._read_new_lines()
+        self.reconciler.expire()
+        return more
+
+    def _read_new_lines(self):
+        """Read up to READ_CHUNK bytes of complete lines; True if the chunk was full."""
+        try:
+            with STAGE_SECONDS.labels('read').time():
+                with open(self.filepath, 'rb') as f:
+                    f.seek(self.offset)
+                    chunk = f.read(READ_CHUNK)
+                    full = len(chunk) == READ_CHUNK
+                    if full and b'\n' not in chunk:
+                        # One line longer than a chunk
+                        chunk += f.readline()
+        except OSError as e:
+            print(f"Error reading file: {e}")
+            return False
+
+        # Leave a partially written last line for the next poll
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            return False
+        chunk = chunk[:end + 1]
+        self.offset += len(chunk)
+        BYTES_READ.inc(len(chunk))
+
+        lines = chunk.decode('utf-8', errors='ignore').splitlines()
+        parsed = errors = 0
+        with STAGE_SECONDS.labels('parse').time():
+            for line in lines:
+                if self.add_line(line):
+                    parsed += 1
+                elif not skippable(line):
+                    errors += 1
+        LINES_PARSED.labels('telegraf').inc(parsed)
+        PARSE_ERRORS.labels('telegraf').inc(errors)
+
+        # The line timestamp is when Telegraf received the message
+        for line in reversed(lines[-10:]):
+            received = line.rstrip().rpartition(' ')[2]
+            if received.isdigit():
+                INGEST_LAG.observe(max(0.0, time.time() - int(received) / 1e9))
+                break
+        return full
@@ -0,0 +1,394 @@
+"""
+DriveGuard Dashboard - Telegraf Output Parser
+Turns Influx line protocol written by Telegraf into DriveGuard records.
+
+Each line is decoded once into measurement, tags, fields and timestamp,
+then the record type (taken from the MQTT topic tag) selects a schema that
+builds the row served by the API.
+"""
+
+import re
+from pathlib import Path
+
+from metrics import LINES_PARSED, PARSE_ERRORS, STAGE_SECONDS
+
+
+# Record type -> (output key, field key, default) for every column
+SCHEMAS = {
+    'batch_data': (
+        ('timestamp', 'ts', 0),
+        ('speed', 'spd', 0),
+        ('lat', 'lat', 0),
+        ('lon', 'lon', 0),
+        ('acc', 'acc', 0),
+        ('score', 'scr', 100),
+        ('gps_valid', 'gps', 0),
+    ),
+    'alert_speed': (
+        ('timestamp', 'ts', 0),
+        ('speed', 'spd', 0),
+        ('limit', 'lim', 120),
+        ('score', 'scr', 0),
+        ('lat', 'lat', 0),
+        ('lon', 'lon', 0),
+    ),
+    'alert_harsh': (
+        ('timestamp', 'ts', 0),
+        ('acceleration', 'acc', 0),
+        ('threshold', 'thr', 0.5),
+        ('score', 'scr', 0),
+    ),
+    # Status messages keep every field, as text
+    'status': None,
+}
+
+# Fallback for lines that need escape handling: series, field set, timestamp
+_ESCAPED_LINE = re.compile(
+    r'((?:[^\\ ]|\\.)+) ((?:[^\\ "]|\\.|"(?:[^\\"]|\\.)*")+)(?: (-?\d+))?$'
+)
+_ESCAPED_ITEM = re.compile(r'(?:[^\\,"]|\\.|"(?:[^\\"]|\\.)*")+')
+_ESCAPED_TAG = re.compile(r'(?:[^\\,]|\\.)+')
+_ESCAPED_KEY = re.compile(r'((?:[^\\=]|\\.)+)=(.*)$', re.S)
+_UNESCAPE = re.compile(r'\\(.)')
+
+
+def _split_pairs(text):
+    """Split 'k=v,k=v' honouring backslash escapes and quoted strings."""
+    pairs = {}
+    for item in _ESCAPED_ITEM.findall(text):
+        match = _ESCAPED_KEY.match(item)
+        if match:
+            key, val = match.groups()
+            pairs[_UNESCAPE.sub(r'\1', key)] = val
+    return pairs
+
+
+def _unquote(value):
+    """Turn a raw field value into its text form."""
+    if not isinstance(value, str):
+        return str(value)
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return _UNESCAPE.sub(r'\1', value[1:-1])
+    return value
+
+
+def _number(value, default):
+    """Convert a raw field value to a number, or return default."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        if not isinstance(value, str):
+            return default
+    if value[-1:] in ('i', 'u'):
+        try:
+            return float(value[:-1])
+        except ValueError:
+            return default
+    if value in ('t', 'T', 'true', 'True', 'TRUE'):
+        return 1.0
+    if value in ('f', 'F', 'false', 'False', 'FALSE'):
+        return 0.0
+    return default
+
+
+def decode_line(line):
+    """Decode one line of line protocol.
+
+    Returns (measurement, tags, fields, timestamp) with raw field values,
+    or None for blank lines, comments and malformed input.
+    """
+    line = line.strip()
+    if not line or line[0] == '#':
+        return None
+
+    if '\\' in line or '"' in line:
+        match = _ESCAPED_LINE.match(line)
+        if not match:
+            return None
+        series, field_set, timestamp = match.groups()
+        series_parts = _ESCAPED_TAG.findall(series)
+        if not series_parts:
+            return None
+        measurement = _UNESCAPE.sub(r'\1', series_parts[0])
+        tags = {}
+        for item in series_parts[1:]:
+            pair = _ESCAPED_KEY.match(item)
+            if pair:
+                tags[_UNESCAPE.sub(r'\1', pair.group(1))] = _UNESCAPE.sub(r'\1', pair.group(2))
+        fields = _split_pairs(field_set)
+    else:
+        # Fast path: nothing escaped, so plain splits are exact
+        parts = line.split(' ')
+        if len(parts) == 2:
+            series, field_set = parts
+            timestamp = None
+        elif len(parts) == 3:
+            series, field_set, timestamp = parts
+        else:
+            return None
+        measurement, _, tag_set = series.partition(',')
+        tags = {}
+        if tag_set:
+            for item in tag_set.split(','):
+                key, _, val = item.partition('=')
+                tags[key] = val
+        fields = {}
+        for item in field_set.split(','):
+            key, sep, val = item.partition('=')
+            if sep:
+                fields[key] = val
+
+    if not fields:
+        return None
+    if timestamp:
+        if not timestamp.lstrip('-').isdigit():
+            return None
+        timestamp = int(timestamp)
+    return measurement, tags, fields, timestamp
+
+
+def record_kind(measurement, tags):
+    """Work out which DriveGuard record type a decoded line holds."""
+    topic = tags.get('topic', '')
+    kind = topic.rpartition('/')[2]
+    if kind in SCHEMAS:
+        return kind
+    for kind in SCHEMAS:
+        if kind in topic or kind in measurement:
+            return kind
+    return None
+
+
+def topic_device(topic):
+    """Device (G-number) segment of ece508/<team>/<device>/driveguard/<kind>."""
+    parts = topic.split('/')
+    if 'driveguard' in parts:
+        i = parts.index('driveguard')
+        if i > 0:
+            return parts[i - 1]
+    return None
+
+
+def build_record(kind, fields):
+    """Build the API row for a record type from raw field values."""
+    schema = SCHEMAS[kind]
+    if schema is None:
+        return {key: _unquote(val) for key, val in fields.items()}
+    return {
+        out: _number(fields[key], default) if key in fields else default
+        for out, key, default in schema
+    }
+
+
+def field_value(value):
+    """Raw field value as it was in the JSON payload: number, bool or text."""
+    if value in ('t', 'T', 'true', 'True', 'TRUE'):
+        return True
+    if value in ('f', 'F', 'false', 'False', 'FALSE'):
+        return False
+    if value[:1] == '"':
+        return _unquote(value)
+    number = _number(value, None)
+    if number is None:
+        return value
+    if value.rstrip('iu').lstrip('-').isdigit():
+        return int(number)
+    return number
+
+
+def _layout_builder(kind, keys):
+    """Row builder for one record type and field layout.
+
+    Telegraf writes the fields of a metric in a fixed (sorted) order, so
+    the same few layouts repeat on every line. The builder reads the raw
+    values by position and converts them with float() directly; anything
+    float() rejects raises ValueError and the caller falls back to
+    build_record().
+    """
+    schema = SCHEMAS[kind]
+    if schema is None:
+        return None
+    position = {key: i for i, key in enumerate(keys)}
+    columns = [(out, position.get(key), default) for out, key, default in schema]
+
+    def build(v):
+        return {out: float(v[i]) if i is not None else default for out, i, default in columns}
+    return build
+
+
+# Caches for the fast path, keyed by series (measurement + tags) and layout
+_series_kinds = {}
+_builders = {}
+_CACHE_LIMIT = 10000
+
+
+def _series_kind(series):
+    """Record type for a series key, decoded once and then cached."""
+    try:
+        return _series_kinds[series]
+    except KeyError:
+        pass
+    measurement, _, tag_set = series.partition(',')
+    tags = {}
+    if tag_set:
+        for item in tag_set.split(','):
+            key, _, val = item.partition('=')
+            tags[key] = val
+    kind = record_kind(measurement, tags)
+    if len(_series_kinds) >= _CACHE_LIMIT:
+        _series_kinds.clear()
+    _series_kinds[series] = kind
+    return kind
+
+
+def skippable(line):
+    """True for blank lines and comments, which are not parse errors."""
+    line = line.strip()
+    return not line or line[0] == '#'
+
+
+def parse_line(line):
+    """Parse one line of Telegraf output.
+
+    Returns a (kind, record) tuple where kind is one of 'batch_data',
+    'alert_speed', 'alert_harsh' or 'status', or None if the line is not
+    a DriveGuard record.
+    """
+    line = line.strip()
+    if not line or line[0] == '#':
+        return None
+
+    if '\\' not in line and '"' not in line:
+        parts = line.split(' ')
+        if 2 <= len(parts) <= 3:
+            kind = _series_kind(parts[0])
+            if kind is None:
+                return None
+            # "k1=v1,k2=v2" -> [k1, v1, k2, v2]
+            tokens = parts[1].replace('=', ',').split(',')
+            keys = tuple(tokens[0::2])
+            builder = _builders.get((kind, keys))
+            if builder is None and len(tokens) % 2 == 0 and all(keys):
+                builder = _layout_builder(kind, keys)
+                if builder and len(_builders) < _CACHE_LIMIT:
+                    _builders[(kind, keys)] = builder
+            if builder is not None:
+                try:
+                    return kind, builder(tokens[1::2])
+                except ValueError:
+                    pass
+
+    # Escaped, quoted or unusual lines take the general decoder
+    decoded = decode_line(line)
+    if decoded is None:
+        return None
+    measurement, tags, fields, _ = decoded
+    kind = record_kind(measurement, tags)
+    if kind is None:
+        return None
+    return kind, build_record(kind, fields)
+
+
+_series_devices = {}
+
+
+def _series_device(series):
+    """Device ID for a series key, decoded once and then cached."""
+    try:
+        return _series_devices[series]
+    except KeyError:
+        pass
+    tags = dict(item.partition('=')[::2] for item in series.split(',')[1:])
+    device = topic_device(tags.get('topic', ''))
+    if len(_series_devices) >= _CACHE_LIMIT:
+        _series_devices.clear()
+    _series_devices[series] = device
+    return device
+
+
+def parse_fleet_line(line):
+    """Parse one line of Telegraf output along with the device it came from.
+
+    Returns (device, kind, record), or None like parse_line(). device is
+    None when the topic does not follow the DriveGuard layout.
+    """
+    parsed = parse_line(line)
+    if parsed is None:
+        return None
+    line = line.strip()
+    if '\\' in line:
+        decoded = decode_line(line)
+        device = topic_device(decoded[1].get('topic', '')) if decoded else None
+    else:
+        device = _series_device(line.partition(' ')[0])
+    return (device,) + parsed
+
+
+def _escape(text, chars):
+    """Backslash-escape the given characters."""
+    for ch in chars:
+        text = text.replace(ch, '\\' + ch)
+    return text
+
+
+def _format_field(value):
+    """Field value as line protocol: floats, true/false or a quoted string."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        # Plain numbers are floats in line protocol, as Telegraf writes JSON
+        return repr(value)
+    return '"' + _escape(str(value), '\\"') + '"'
+
+
+def encode_line(measurement, tags, fields, timestamp=None):
+    """Write one metric as line protocol, the way Telegraf's file output does."""
+    series = _escape(measurement, ', ')
+    for key in sorted(tags):
+        series += f",{_escape(key, ',= ')}={_escape(str(tags[key]), ',= ')}"
+    field_set = ','.join(
+        f"{_escape(key, ',= ')}={_format_field(fields[key])}" for key in sorted(fields)
+    )
+    line = f"{series} {field_set}"
+    if timestamp is not None:
+        line += f" {int(timestamp)}"
+    return line
+
+
+def parse_telegraf_file(filepath):
+    """Parse the Telegraf output file and extract DriveGuard data."""
+    batch_data = []
+    alerts_speed = []
+    alerts_harsh = []
+    status_msgs = []
+    targets = {
+        'batch_data': batch_data,
+        'alert_speed': alerts_speed,
+        'alert_harsh': alerts_harsh,
+        'status': status_msgs
+    }
+
+    filepath = Path(filepath)
+    if not filepath.exists():
+        return batch_data, alerts_speed, alerts_harsh, status_msgs
+
+    parsed_count = errors = 0
+    try:
+        with STAGE_SECONDS.labels('parse_file').time():
+            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+                for line in f:
+                    parsed = parse_line(line)
+                    if parsed:
+                        kind, record = parsed
+                        targets[kind].append(record)
+                        parsed_count += 1
+                    elif not skippable(line):
+                        errors += 1
+
+    except Exception as e:
+        print(f"Error reading file: {e}")
+
+    LINES_PARSED.labels('file').inc(parsed_count)
+    PARSE_ERRORS.labels('file').inc(errors)
+
+    return batch_data, alerts_speed, alerts_harsh, status_msgs
@@ -0,0 +1,235 @@
+"""
+DriveGuard Dashboard - Trip Detection
+Splits a session's reading stream into trips and summarizes each one.
+
+A trip ends when
+    - the timestamps jump forward by more than GAP_MS or go backwards
+      (the board was switched off or rebooted), or
+    - the vehicle has stood still for DWELL_MS: no reading faster than
+      STOP_SPEED with a GPS fix. The trip then ends at its last moving
+      reading; the parked readings belong to no trip.
+The next moving reading with a GPS fix starts a new trip.
+
+TripDetector is fed the same (kind, record) pairs as SessionData, so a live
+session keeps its trips current at O(1) per reading. History sessions keep
+the finished list in their sidecar or archive header and never rebuild it.
+"""
+
+import math
+from collections import deque
+
+GAP_MS = 5 * 60 * 1000
+DWELL_MS = 5 * 60 * 1000
+STOP_SPEED = 3.0             # km/h; GPS speed jitters around 0 when parked
+MAX_STEP_KMH = 250.0         # Faster implied movement is a GPS jump, not driving
+MIN_READINGS = 2             # Shorter trips are dropped as noise
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points, in km."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class _Trip:
+    """Running totals of the trip being driven."""
+
+    def __init__(self, row, record):
+        self.first_row = row
+        self.start_ts = record['timestamp']
+        self.start_score = record['score']
+        self.start_pos = (record['lat'], record['lon'])
+        self.readings = 0
+        self.distance = 0.0
+        self.speed_sum = 0.0
+        self.max_speed = 0.0
+        self.speed_alerts = 0
+        self.harsh_alerts = 0
+        self.fix = None          # (ts, lat, lon) of the last reading with a fix
+
+    def add(self, row, record, speed_alerts, harsh_alerts):
+        ts, speed = record['timestamp'], record['speed']
+        self.last_row = row
+        self.end_ts = ts
+        self.end_score = record['score']
+        self.readings += 1
+        self.speed_sum += speed
+        self.max_speed = max(self.max_speed, speed)
+        self.speed_alerts += speed_alerts
+        self.harsh_alerts += harsh_alerts
+        if record['gps_valid']:
+            lat, lon = record['lat'], record['lon']
+            if self.fix is not None and ts > self.fix[0]:
+                step = haversine_km(self.fix[1], self.fix[2], lat, lon)
+                if step / ((ts - self.fix[0]) / 3600000) <= MAX_STEP_KMH:
+                    self.distance += step
+            self.fix = (ts, lat, lon)
+            self.end_pos = (lat, lon)
+
+    def summary(self, trip_id, is_open=False):
+        duration = (self.end_ts - self.start_ts) / 1000
+        end_pos = getattr(self, 'end_pos', self.start_pos)
+        return {
+            'trip': trip_id,
+            'open': is_open,
+            'start_ts': int(self.start_ts),
+            'end_ts': int(self.end_ts),
+            'duration_s': duration,
+            'first_row': self.first_row,
+            'last_row': self.last_row,
+            'readings': self.readings,
+            'distance_km': round(self.distance, 3),
+            'max_speed': round(self.max_speed, 1),
+            'avg_speed': round(self.speed_sum / self.readings, 1),
+            'speed_alerts': self.speed_alerts,
+            'harsh_alerts': self.harsh_alerts,
+            'total_alerts': self.speed_alerts + self.harsh_alerts,
+            'start_score': int(self.start_score),
+            'end_score': int(self.end_score),
+            'score_delta': int(self.end_score - self.start_score),
+            'start_lat': self.start_pos[0],
+            'start_lon': self.start_pos[1],
+            'end_lat': end_pos[0],
+            'end_lon': end_pos[1]
+        }
+
+
+class TripDetector:
+    """Streaming trip segmentation of one board's records.
+
+    Alerts are published right away while readings wait for the next batch
+    upload, so alerts queue until the reading they were raised at (the
+    first one at or after their timestamp) arrives and count towards that
+    reading's trip.
+    """
+
+    def __init__(self):
+        self.trips = []          # Summaries of finished trips
+        self.rows = 0            # Readings seen (row position of the next one)
+        self._trip = None
+        self._idle = []          # Readings since the trip's last moving one
+        self._alerts = deque()   # (ts in ms, kind) waiting for their reading
+        self._last_ts = None
+
+    def add(self, kind, record):
+        """Feed one parsed (kind, record) pair."""
+        if kind == 'batch_data':
+            self._add_reading(record)
+        elif kind in ('alert_speed', 'alert_harsh'):
+            self._alerts.append((record['timestamp'] * 1000, kind))
+
+    def _add_reading(self, record):
+        row = self.rows
+        self.rows += 1
+        ts = record['timestamp']
+        if self._last_ts is not None and (ts < self._last_ts or ts - self._last_ts > GAP_MS):
+            self._close()
+            if ts < self._last_ts:
+                # Reboot: alerts after the old clock's last reading never got one
+                self._alerts = deque(a for a in self._alerts if a[0] <= ts)
+        self._last_ts = ts
+
+        speed_alerts = harsh_alerts = 0
+        alerts = self._alerts
+        while alerts and alerts[0][0] <= ts:
+            if alerts.popleft()[1] == 'alert_speed':
+                speed_alerts += 1
+            else:
+                harsh_alerts += 1
+
+        moving = bool(record['gps_valid']) and record['speed'] > STOP_SPEED
+        if self._trip is None:
+            if moving:
+                self._trip = _Trip(row, record)
+                self._trip.add(row, record, speed_alerts, harsh_alerts)
+            return
+        if moving:
+            for idle in self._idle:
+                self._trip.add(*idle)
+            self._idle = []
+            self._trip.add(row, record, speed_alerts, harsh_alerts)
+        elif ts - self._trip.end_ts >= DWELL_MS:
+            self._close()
+        else:
+            self._idle.append((row, record, speed_alerts, harsh_alerts))
+
+    def _close(self):
+        """End the current trip at its last moving reading."""
+        trip = self._trip
+        if trip is not None and trip.readings >= MIN_READINGS:
+            self.trips.append(trip.summary(len(self.trips)))
+        self._trip = None
+        self._idle = []
+
+    def finish(self):
+        """Close the trip in progress (end of a recorded session)."""
+        self._close()
+        return self.trips
+
+    def summaries(self):
+        """Finished trips plus the one in progress (marked open)."""
+        finished, current = self.since(0)
+        return finished + [current] if current is not None else finished
+
+    def since(self, finished):
+        """(trips finished after the first `finished`, summary of the open trip or None).
+
+        Finished summaries never change, so a copy of the trip list can be
+        kept current with only these.
+        """
+        trip = self._trip
+        current = None
+        if trip is not None and trip.readings >= MIN_READINGS:
+            current = trip.summary(len(self.trips), is_open=True)
+        return self.trips[finished:], current
+
+    def snapshot(self):
+        """State as plain data, to restore() after a restart."""
+        trip = self._trip
+        return {
+            'trips': list(self.trips),
+            'rows': self.rows,
+            'trip': dict(vars(trip)) if trip is not None else None,
+            'idle': list(self._idle),
+            'alerts': list(self._alerts),
+            'last_ts': self._last_ts
+        }
+
+    def restore(self, state):
+        """Continue from a snapshot()."""
+        self.trips = list(state['trips'])
+        self.rows = state['rows']
+        self._trip = None
+        if state['trip'] is not None:
+            self._trip = _Trip.__new__(_Trip)
+            vars(self._trip).update(state['trip'])
+        self._idle = [tuple(idle) for idle in state['idle']]
+        self._alerts = deque(tuple(alert) for alert in state['alerts'])
+        self._last_ts = state['last_ts']
+
+
+def detect_trips(columns, alerts_speed=(), alerts_harsh=()):
+    """Trips of readings already in columns (sessions without stored trips)."""
+    detector = TripDetector()
+    alerts = sorted([(a['timestamp'], 'alert_speed') for a in alerts_speed]
+                    + [(a['timestamp'], 'alert_harsh') for a in alerts_harsh])
+    i = 0
+    names = ('timestamp', 'speed', 'lat', 'lon', 'gps_valid', 'score')
+    for values in zip(*(columns[name].tolist() for name in names)):
+        record = dict(zip(names, values))
+        # Hand each alert over just before its reading, as a live stream would
+        while i < len(alerts) and alerts[i][0] * 1000 <= record['timestamp']:
+            detector.add(alerts[i][1], {'timestamp': alerts[i][0]})
+            i += 1
+        detector.add('batch_data', record)
+    return detector.finish()
+
+
+def trip_alerts(trip, alerts):
+    """Alerts (timestamps in s) raised during a trip."""
+    # Alert timestamps are whole seconds of the reading they were raised at
+    start, end = trip['start_ts'] - 1000, trip['end_ts']
+    return [a for a in alerts if start < a['timestamp'] * 1000 <= end]
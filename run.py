@@ -21,16 +21,23 @@ Usage:
     python run.py              - Start Telegraf + Dashboard
     python run.py --update     - Update Arduino code with config settings
     python run.py --dashboard  - Start only the dashboard
+    python run.py --ingest native - Subscribe to MQTT directly (no Telegraf)
+    python run.py --fleet      - Track every board on the team topic
+    python run.py --simulate N - Emulate N boards (load testing)
     python run.py --help       - Show help
 """
 
 import os
 import sys
+import socket
+import multiprocessing
 import subprocess
 import shutil
 import webbrowser
 import time
 import signal
+import asyncio
+import threading
 from datetime import datetime
 from pathlib import Path
 
@@ -43,6 +50,8 @@ TELEGRAF_CONF = TELEGRAF_DIR / "telegraf_driveguard.conf"
 DATA_DIR = BASE_DIR / "data"
 HISTORY_DIR = DATA_DIR / "history"
 LIVE_DATA_FILE = DATA_DIR / "live_data.out"
+SPILL_DIR = DATA_DIR / "spill"
+SNAPSHOT_FILE = DATA_DIR / "live_snapshot.npz"
 DASHBOARD_DIR = BASE_DIR / "dashboard"
 
 # Import config
@@ -55,6 +64,46 @@ except ImportError:
     sys.exit(1)
 
 
+def fleet_mode():
+    """True when every board's topic is followed (--fleet or FLEET_MODE)."""
+    return "--fleet" in sys.argv[1:] or getattr(config, "FLEET_MODE", False)
+
+
+def serve_mode():
+    """'prod' for worker processes sharing one ingest, else 'dev' (--serve)."""
+    return _arg_value(sys.argv[1:], "--serve", getattr(config, "SERVE_MODE", "dev"))
+
+
+def resume_mode():
+    """True if the live session should survive a restart (--resume)."""
+    return "--resume" in sys.argv[1:] or getattr(config, "RESUME_SESSION", False)
+
+
+def worker_count():
+    """Worker processes for --serve prod (--workers N, default one per CPU)."""
+    workers = _arg_value(sys.argv[1:], "--workers", getattr(config, "DASHBOARD_WORKERS", 0))
+    return int(workers) or os.cpu_count() or 1
+
+
+def set_memory_budget():
+    """Pass the live memory budget to the dashboard, clearing old spill segments."""
+    readings = getattr(config, "LIVE_MEMORY_READINGS", 0)
+    if not readings:
+        return
+    # Segments only belong to a running session, or the snapshot it resumes
+    if not resume_mode():
+        shutil.rmtree(SPILL_DIR, ignore_errors=True)
+    os.environ["DRIVEGUARD_SPILL_DIR"] = str(SPILL_DIR)
+    os.environ["DRIVEGUARD_LIVE_READINGS"] = str(readings)
+    os.environ["DRIVEGUARD_LIVE_ALERTS"] = str(getattr(config, "LIVE_MEMORY_ALERTS", 1000))
+
+
+def device_topic():
+    """MQTT topic filter for this board, or all boards in fleet mode."""
+    device = "+" if fleet_mode() else config.G_NUMBER
+    return f"ece508/team4/{device}/driveguard/#"
+
+
 def print_banner():
     """Print the startup banner."""
     print()
@@ -163,23 +212,78 @@ def update_arduino_code():
     return True
 
 
-def update_telegraf_config():
-    """Update Telegraf config with correct paths and G-number."""
-    print("[2/3] Updating Telegraf configuration...")
+def convert_archive(archive_file):
+    """Convert an archived session to the columnar .dgc format."""
+    sys.path.insert(0, str(DASHBOARD_DIR))
+    try:
+        from archive import convert_telegraf_file
+        target = convert_telegraf_file(archive_file)
+    except Exception as e:
+        print(f"  ⚠ Could not convert {archive_file.name} to columnar format: {e}")
+        print("    The text archive was kept.")
+        return None
     
+    old_size = archive_file.stat().st_size
+    archive_file.unlink()
+    new_size = target.stat().st_size
+    print(f"  ✓ Converted to columnar: {target.name} "
+          f"({old_size / 1024:.0f} KB → {new_size / 1024:.0f} KB)")
+    return target
+
+
+def archive_live_data():
+    """Move the previous session to history and start a fresh live file."""
     # Ensure data directories exist
     DATA_DIR.mkdir(exist_ok=True)
     HISTORY_DIR.mkdir(exist_ok=True)
     
+    if resume_mode() and LIVE_DATA_FILE.exists() and LIVE_DATA_FILE.stat().st_size > 0:
+        print(f"  ✓ Resuming the live session in {LIVE_DATA_FILE.name}")
+        return
+    
     # Archive existing live data if it exists
     if LIVE_DATA_FILE.exists() and LIVE_DATA_FILE.stat().st_size > 0:
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         archive_file = HISTORY_DIR / f"session_{timestamp}.out"
         shutil.move(str(LIVE_DATA_FILE), str(archive_file))
         print(f"  ✓ Previous session archived to: {archive_file.name}")
+        
+        if getattr(config, "ARCHIVE_FORMAT", "text") == "columnar":
+            convert_archive(archive_file)
     
-    # Create fresh live data file
+    # Create fresh live data file; its old snapshot no longer applies
+    SNAPSHOT_FILE.unlink(missing_ok=True)
     LIVE_DATA_FILE.touch()
+
+
+def resume_live_session(tailer):
+    """Restore the live tailer from its snapshot and keep checkpointing it."""
+    interval = getattr(config, "SNAPSHOT_INTERVAL", 60)
+    if not interval:
+        return
+    from snapshot import load_snapshot, start_checkpoints
+    started = time.perf_counter()
+    if load_snapshot(tailer, SNAPSHOT_FILE):
+        print(f"  ✓ Restored {len(tailer.data.readings)} readings from snapshot "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    drop_stale_segments(tailer)
+    start_checkpoints(tailer, SNAPSHOT_FILE, interval)
+
+
+def drop_stale_segments(tailer):
+    """Remove spill directories left by earlier runs that were not resumed."""
+    log = getattr(tailer.data.readings, 'log', None)
+    kept = log.directory.resolve() if log and log.directory else None
+    for directory in SPILL_DIR.glob("live_*"):
+        if directory.resolve() != kept:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def update_telegraf_config():
+    """Update Telegraf config with correct paths and G-number."""
+    print("[2/3] Updating Telegraf configuration...")
+    
+    archive_live_data()
     
     # Generate Telegraf config
     telegraf_config = f'''# Telegraf Configuration for DriveGuard IoT System
@@ -207,7 +311,7 @@ def update_telegraf_config():
   servers = ["tcp://{config.MQTT_SERVER}:{config.MQTT_PORT}"]
   
   topics = [
-    "ece508/team4/{config.G_NUMBER}/driveguard/#"
+    "{device_topic()}"
   ]
   
   username = "{config.MQTT_USER}"
@@ -323,7 +427,107 @@ def start_telegraf():
         return None
 
 
-def start_dashboard():
+def start_local_broker(port):
+    """Run the stand-in MQTT broker in a background thread."""
+    sys.path.insert(0, str(DASHBOARD_DIR))
+    from mqtt_lite import StandInBroker
+    
+    loop = asyncio.new_event_loop()
+    broker = StandInBroker("0.0.0.0", port)
+    loop.run_until_complete(broker.start())
+    threading.Thread(target=loop.run_forever, name="mqtt-broker", daemon=True).start()
+    print(f"  ✓ Local MQTT broker listening on port {broker.port}")
+    return broker
+
+
+def start_native_ingest(local_broker=None):
+    """Subscribe to the DriveGuard topics directly instead of via Telegraf."""
+    print("[2/2] Starting native MQTT ingest...")
+    
+    archive_live_data()
+    
+    sys.path.insert(0, str(DASHBOARD_DIR))
+    from mqtt_ingest import MqttIngest
+    
+    if local_broker:
+        host, port = "127.0.0.1", local_broker.port
+    else:
+        host, port = config.MQTT_SERVER, config.MQTT_PORT
+    ingest = MqttIngest(
+        host, port,
+        topic=device_topic(),
+        username=config.MQTT_USER,
+        password=config.MQTT_PASSWORD,
+        client_id=f"driveguard_native_{config.G_NUMBER}",
+        archive_file=LIVE_DATA_FILE,
+        tags={"project": "driveguard", "team": "team4", "student": config.G_NUMBER},
+        fleet=fleet_mode()
+    )
+    ingest.start()
+    print(f"  ✓ Broker: {host}:{port}")
+    print(f"  ✓ Live data: {LIVE_DATA_FILE}")
+    print()
+    return ingest
+
+
+def run_simulator(args):
+    """Emulate boards (or replay a session) into the live file or a broker."""
+    sys.path.insert(0, str(DASHBOARD_DIR))
+    import simulator
+    
+    count = int(_arg_value(args, "--simulate", "1"))
+    speedup = float(_arg_value(args, "--rate", "1"))
+    duration = _arg_value(args, "--duration")
+    duration = float(duration) if duration else None
+    target = _arg_value(args, "--target", "file")
+    replay_file = _arg_value(args, "--replay")
+    
+    # One board uses your G-number; more get SIM00000, SIM00001, ...
+    devices = [config.G_NUMBER] if count == 1 else [f"SIM{i:05d}" for i in range(count)]
+    
+    if target == "mqtt":
+        if _arg_value(args, "--broker") == "local":
+            host, port = "127.0.0.1", config.MQTT_PORT
+        else:
+            host, port = config.MQTT_SERVER, config.MQTT_PORT
+        sink = simulator.MqttSink(host, port, config.MQTT_USER, config.MQTT_PASSWORD)
+        print(f"  ✓ Publishing to {host}:{port}")
+    else:
+        DATA_DIR.mkdir(exist_ok=True)
+        sink = simulator.FileSink(LIVE_DATA_FILE, {"student": config.G_NUMBER})
+        print(f"  ✓ Writing to {LIVE_DATA_FILE}")
+    
+    async def run():
+        await sink.connect()
+        try:
+            if replay_file:
+                print(f"  ✓ Replaying {replay_file} as {count} device(s) at {speedup:g}x")
+                counter = await simulator.replay(
+                    replay_file, sink, speedup, devices if count > 1 else None)
+            else:
+                print(f"  ✓ Simulating {count} board(s) at {speedup:g}x real time")
+                boards = [
+                    simulator.SimulatedBoard(
+                        device, seed=i,
+                        speed_danger=config.SPEED_DANGER,
+                        accel_harsh=config.ACCEL_HARSH,
+                        score_speeding=config.SCORE_SPEEDING,
+                        score_harsh=config.SCORE_HARSH)
+                    for i, device in enumerate(devices)
+                ]
+                counter = await simulator.simulate(boards, sink, speedup, duration)
+            print(f"  ✓ Done: {counter.report()}")
+        finally:
+            await sink.close()
+    
+    print("Press Ctrl+C to stop the simulator")
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\nSimulator stopped.")
+
+
+def start_dashboard(live_source=None):
     """Start the Flask dashboard."""
     print()
     print("Starting Dashboard...")
@@ -342,10 +546,23 @@ def start_dashboard():
     # Set environment variable for data file path
     os.environ["DRIVEGUARD_DATA_FILE"] = str(LIVE_DATA_FILE)
     os.environ["DRIVEGUARD_HISTORY_DIR"] = str(HISTORY_DIR)
+    if fleet_mode():
+        os.environ["DRIVEGUARD_FLEET"] = "1"
+    
+    if serve_mode() == "prod":
+        serve_production(live_source)
+        return
     
     # Import and run Flask app
     sys.path.insert(0, str(DASHBOARD_DIR))
-    from app import app
+    from app import app, set_fleet_source, set_live_source
+    if live_source is not None and fleet_mode():
+        set_fleet_source(live_source)
+    elif live_source is not None:
+        set_live_source(live_source)
+    elif not fleet_mode():
+        import app as dashboard
+        resume_live_session(dashboard.live_source)
     
     try:
         app.run(host='0.0.0.0', port=config.DASHBOARD_PORT, debug=False)
@@ -353,6 +570,63 @@ def start_dashboard():
         print("\nShutting down...")
 
 
+def serve_production(live_source=None):
+    """Serve the dashboard from worker processes that share this one's state.
+    
+    This process only ingests: it parses the live data once, keeps the only
+    copy of the parsed session and answers the workers' queries on it over
+    a loopback socket. The workers accept
+    connections on one shared listening socket, so requests are spread over
+    as many cores as there are workers.
+    """
+    sys.path.insert(0, str(DASHBOARD_DIR))
+    import app as dashboard
+    from shared_state import serve_state
+    
+    if live_source is None:
+        resume_live_session(dashboard.live_source)
+    authkey = os.urandom(16)
+    state_server = serve_state(live_source or dashboard.live_source, dashboard.config, authkey=authkey)
+    listener = socket.create_server(('0.0.0.0', config.DASHBOARD_PORT), backlog=256)
+    
+    # spawn rather than fork: the ingest threads are already running
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_dashboard_worker, args=(listener, state_server.address, authkey),
+                        daemon=True)
+        for _ in range(worker_count())
+    ]
+    for worker in workers:
+        worker.start()
+    print(f"  ✓ Serving with {len(workers)} worker processes")
+    
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        for worker in workers:
+            worker.terminate()
+        listener.close()
+
+
+def _dashboard_worker(listener, state_address, authkey):
+    """One --serve prod worker: HTTP on the shared socket, live state from the ingest."""
+    sys.path.insert(0, str(DASHBOARD_DIR))
+    from werkzeug.serving import make_server
+    import app as dashboard
+    from shared_state import ReplicaSource
+    
+    dashboard.set_live_source(ReplicaSource(state_address, authkey, dashboard.config))
+    server = make_server('0.0.0.0', config.DASHBOARD_PORT, dashboard.app, threaded=True,
+                         fd=listener.fileno())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
 def show_help():
     """Show help message."""
     print("""
@@ -362,6 +636,28 @@ USAGE:
     python run.py              Start Telegraf + Dashboard (normal operation)
     python run.py --update     Update Arduino code with settings from config.py
     python run.py --dashboard  Start only the dashboard (no Telegraf)
+    python run.py --ingest native
+                               Subscribe to MQTT from Python (no Telegraf)
+    python run.py --ingest native --broker local
+                               Same, with a local stand-in broker on
+                               MQTT_PORT for offline development
+    python run.py --fleet      Follow every board (ece508/team4/+/...) and
+                               serve /api/vehicles and /api/fleet/leaderboard;
+                               combine with the options above
+    python run.py --simulate N Emulate N boards with firmware-shaped data
+        --rate X               Run X times faster than real time (default 1)
+        --duration S           Stop after S simulated seconds
+        --target file|mqtt     Append to data/live_data.out (default) or
+                               publish to MQTT_SERVER (--broker local: to
+                               a local broker started with --ingest native)
+        --replay FILE          Replay an archived session_*.out instead
+    python run.py --serve prod Serve the dashboard from several worker
+                               processes; parsing stays in one process
+                               (not with --fleet)
+        --workers N            Worker processes (default: one per CPU)
+    python run.py --resume     Keep the live session instead of archiving
+                               it; the parsed state is restored from its
+                               last snapshot (combine with the options above)
     python run.py --help       Show this help message
 
 SETUP STEPS:
@@ -381,6 +677,15 @@ FILES:
 """)
 
 
+def _arg_value(args, name, default=None):
+    """Value following a command-line option, e.g. --ingest native."""
+    if name in args:
+        i = args.index(name)
+        if i + 1 < len(args):
+            return args[i + 1]
+    return default
+
+
 def main():
     """Main entry point."""
     print_banner()
@@ -399,11 +704,35 @@ def main():
         print("Done! Now open Arduino IDE and upload the code to your board.")
         return
     
+    if serve_mode() == "prod" and fleet_mode():
+        print("ERROR: --serve prod does not support fleet mode yet")
+        print("Run fleet mode with the default single-process server (--serve dev)")
+        sys.exit(1)
+    
     if "--dashboard" in args:
         print_config()
+        set_memory_budget()
         start_dashboard()
         return
     
+    if "--simulate" in args:
+        run_simulator(args)
+        return
+    
+    set_memory_budget()
+    
+    if _arg_value(args, "--ingest", "telegraf") == "native":
+        print_config()
+        broker = None
+        if _arg_value(args, "--broker") == "local":
+            broker = start_local_broker(config.MQTT_PORT)
+        ingest = start_native_ingest(broker)
+        try:
+            start_dashboard(ingest)
+        finally:
+            ingest.stop()
+        return
+    
     # Normal operation: start everything
     print_config()
     
@@ -0,0 +1,107 @@
+"""
+DriveGuard Tests - History Analytics
+Session summaries, roll-ups, period trends and the summary cache.
+"""
+
+import os
+
+import pytest
+
+import analytics
+import app as dashboard
+from analytics import SPEED_BIN, history_report, summarize_session
+from telegraf_parser import encode_line
+
+TOPIC = "ece508/team4/G1/driveguard/"
+SESSIONS = {'2024-01-05': 60.0, '2024-01-20': 80.0, '2024-02-03': 100.0}
+
+
+def write_session(path, cruise, n=200):
+    lines = []
+    for i in range(n):
+        speed = 0.0 if i < 10 else cruise + (i % 5)
+        lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "batch_data"},
+                                 {'ts': (i + 1) * 10000, 'spd': speed, 'lat': 45.5 + i * 1e-3, 'lon': -122.6,
+                                  'acc': 1.0, 'scr': 100 - i // 50, 'gps': 1}))
+        if i % 50 == 25:
+            lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "alert_speed"},
+                                     {'ts': (i + 1) * 10, 'spd': 130.0, 'lim': 120, 'scr': 95,
+                                      'lat': 45.5, 'lon': -122.6}))
+    path.write_text(''.join(line + '\n' for line in lines))
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, '_summaries', {})
+    monkeypatch.setattr(analytics, 'POOL_WORKERS', 1)
+    for day, cruise in SESSIONS.items():
+        write_session(tmp_path / f"session_{day}_10-00-00.out", cruise)
+    return tmp_path
+
+
+def test_session_summary(history):
+    summary = summarize_session(history / "session_2024-01-20_10-00-00.out")
+    assert summary['date'] == '2024-01-20'
+    assert summary['readings'] == 200 and summary['moving_readings'] == 190
+    assert sum(summary['speed_hist']) == 190
+    assert summary['speed_hist'][80 // SPEED_BIN] == 190
+    assert summary['speed_alerts'] == 4 and summary['harsh_alerts'] == 0
+    assert summary['max_speed'] == 84.0
+    assert (summary['start_score'], summary['final_score'], summary['min_score']) == (100, 97, 97)
+    assert summary['trips'] == 1 and summary['distance_km'] > 20
+
+
+def test_report_rolls_up_every_session(history):
+    report = history_report(history)
+    totals = report['totals']
+    assert totals['sessions'] == 3 and totals['readings'] == 600
+    assert totals['speed_alerts'] == 12
+    assert totals['speed_distribution']['p50'] == 80
+    assert totals['speed_distribution']['p95'] == 100
+    assert [s['date'] for s in report['sessions']] == sorted(SESSIONS)
+    assert [(row['period'], row['sessions']) for row in report['trend']] == [('2024-01', 2), ('2024-02', 1)]
+    assert report['computed'] == 3 and report['errors'] == []
+
+
+def test_filters_and_periods(history):
+    report = history_report(history, since='2024-01-10', until='2024-01-31', period='day', sessions=False)
+    assert report['totals']['sessions'] == 1
+    assert [row['period'] for row in report['trend']] == ['2024-01-20']
+    assert 'sessions' not in report
+    weeks = history_report(history, period='week')['trend']
+    assert [row['period'] for row in weeks] == ['2024-W01', '2024-W03', '2024-W05']
+
+
+def test_summaries_are_cached_per_file_version(history):
+    history_report(history)
+    again = history_report(history)
+    assert (again['computed'], again['cached']) == (0, 3)
+    changed = history / "session_2024-02-03_10-00-00.out"
+    write_session(changed, 120.0, n=300)
+    os.utime(changed, ns=(0, changed.stat().st_mtime_ns + 10**9))
+    report = history_report(history)
+    assert (report['computed'], report['cached']) == (1, 2)
+    assert report['totals']['readings'] == 700
+    # The risk speed limit is part of the summary
+    assert history_report(history, speed_limit=90.0)['computed'] == 3
+
+
+def test_pool_matches_serial(history, monkeypatch):
+    serial = history_report(history)
+    monkeypatch.setattr(analytics, '_summaries', {})
+    monkeypatch.setattr(analytics, 'POOL_WORKERS', 2)
+    try:
+        pooled = history_report(history)
+    finally:
+        analytics._reset_executor()
+    assert pooled['computed'] == 3
+    assert pooled['totals'] == serial['totals'] and pooled['sessions'] == serial['sessions']
+
+
+def test_analytics_endpoint(history, monkeypatch):
+    monkeypatch.setattr(dashboard, 'HISTORY_DIR', history)
+    client = dashboard.app.test_client()
+    body = client.get('/api/history/analytics?since=2024-02-01&sessions=0').json
+    assert body['totals']['sessions'] == 1 and 'sessions' not in body
+    assert client.get('/api/history/analytics?period=year').status_code == 400
+    assert client.get('/api/history/analytics?since=yesterday').status_code == 400
@@ -0,0 +1,73 @@
+"""
+DriveGuard Tests - Risk Detection
+Streaming and batch risk detection must raise the same events.
+"""
+
+import numpy as np
+import pytest
+
+from anomaly import RiskDetector, detect_risks
+from session import SessionData
+from store import COLUMNS, ReadingStore
+
+
+def drive(n, seed=7):
+    """Reading dicts with speeding runs, jerky acc and a gap."""
+    rng = np.random.default_rng(seed)
+    speed = np.round(np.clip(rng.normal(90, 35, n), 0, 200), 1)
+    acc = np.round(np.abs(rng.normal(1.0, 0.08, n)), 2)
+    acc[::53] += 0.6
+    speed[500:520] = 140.0
+    ts = np.arange(n, dtype=np.int64) * 10000
+    ts[n // 3:] += 120000
+    return [{'timestamp': int(ts[i]), 'speed': float(speed[i]), 'acc': float(acc[i]),
+             'lat': 45.5 + i * 1e-4, 'lon': -122.6, 'score': 100, 'gps_valid': 1}
+            for i in range(n)]
+
+
+def columns_of(rows):
+    store = ReadingStore()
+    for row in rows:
+        store.append(row)
+    return {name: store.column(name) for name in COLUMNS}
+
+
+@pytest.mark.parametrize('speed_limit', [120.0, 100.0])
+def test_risk_batch_matches_streaming(speed_limit):
+    rows = drive(4000)
+    detector = RiskDetector(speed_limit)
+    live = [event for row in rows for event in detector.add(row)]
+    assert {event['type'] for event in live} == {'acc_anomaly', 'jerk', 'sustained_speeding'}
+    assert detect_risks(columns_of(rows), speed_limit=speed_limit) == live
+
+
+def test_risk_batch_continues_from_streaming_state():
+    rows = drive(3000)
+    whole = detect_risks(columns_of(rows))
+
+    detector = RiskDetector()
+    events = [event for row in rows[:1111] for event in detector.add(row)]
+    resumed = RiskDetector()
+    resumed.restore(detector.snapshot())
+    events += detect_risks(columns_of(rows[1111:]), resumed)
+    assert events == whole
+
+
+def test_speed_limit_is_not_state():
+    detector = RiskDetector(90.0)
+    assert 'speed_limit' not in detector.snapshot()
+    restored = RiskDetector(110.0)
+    restored.restore(detector.snapshot())
+    assert restored.speed_limit == 110.0
+    speeding = [event for event in detect_risks(columns_of(drive(2000)), speed_limit=300.0)
+                if event['type'] == 'sustained_speeding']
+    assert speeding == []
+
+
+def test_live_session_follows_the_speed_limit():
+    data = SessionData()
+    data.set_speed_limit(100.0)
+    for row in drive(2000):
+        data.add('batch_data', row)
+    assert list(data.alerts_risk) == detect_risks(columns_of(drive(2000)), speed_limit=100.0)
+    assert data.summary()['risk_alerts'] == len(data.alerts_risk)
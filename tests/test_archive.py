@@ -0,0 +1,142 @@
+"""
+DriveGuard Tests - Columnar Archive
+.dgc write/read round trips and the Telegraf-file conversion.
+"""
+
+import numpy as np
+import pytest
+
+from archive import ANCHOR_EVERY, ColumnarArchive, convert_telegraf_file, write_columns
+from session import load_session
+from spill import SEGMENT_ENCODINGS
+from store import COLUMNS
+from telegraf_parser import encode_line
+
+TAGS = {'host': 'LAPTOP', 'student': 'G1', 'team': 'team4'}
+
+
+def reading_columns(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return {
+        'timestamp': np.cumsum(rng.integers(9000, 11000, n)).astype(np.int64),
+        'speed': np.round(rng.uniform(0, 150, n), 1).astype(np.float32),
+        'lat': np.round(38.8 + np.arange(n) * 1e-5, 6),
+        'lon': np.round(-77.3 - np.arange(n) * 1e-5, 6),
+        'acc': np.round(rng.uniform(0.5, 1.5, n), 2).astype(np.float32),
+        'score': np.maximum(0, 100 - np.arange(n) // 100).astype(np.int16),
+        'gps_valid': (rng.random(n) > 0.1).astype(np.uint8),
+    }
+
+
+def assert_stored(restored, columns):
+    """Columns equal up to the archive's rounding (half a unit of the kept decimals)."""
+    for name, (dtype, decimals, _) in COLUMNS.items():
+        values = np.asarray(restored[name]).astype(dtype)
+        if decimals is None:
+            assert np.array_equal(values, columns[name]), name
+        else:
+            assert np.allclose(values, columns[name], rtol=0, atol=10.0 ** -decimals / 2), name
+
+
+def test_columns_round_trip(tmp_path):
+    n = 3 * ANCHOR_EVERY + 17
+    columns = reading_columns(n)
+    write_columns(tmp_path / "s.dgc", columns, {'note': 'kept'})
+    archive = ColumnarArchive(tmp_path / "s.dgc")
+
+    assert len(archive) == n
+    assert archive.header['note'] == 'kept'
+    assert archive.header['time_bounds'] == {'first_ts': int(columns['timestamp'][0]),
+                                             'last_ts': int(columns['timestamp'][-1])}
+    assert_stored({name: archive.column(name) for name in COLUMNS}, columns)
+
+
+@pytest.mark.parametrize('start, stop', [(0, 5), (ANCHOR_EVERY - 1, ANCHOR_EVERY + 1),
+                                         (1500, 3100), (3000, None), (7, 7)])
+def test_delta_slices_decode_from_anchors(tmp_path, start, stop):
+    columns = reading_columns(3 * ANCHOR_EVERY + 17)
+    write_columns(tmp_path / "s.dgc", columns)
+    archive = ColumnarArchive(tmp_path / "s.dgc")
+    assert np.array_equal(archive.column('timestamp', start, stop), columns['timestamp'][start:stop])
+
+
+def test_time_range_matches_searchsorted(tmp_path):
+    columns = reading_columns(2500)
+    write_columns(tmp_path / "s.dgc", columns)
+    archive = ColumnarArchive(tmp_path / "s.dgc")
+    ts = columns['timestamp']
+    assert archive.ts_sorted
+    for t_from, t_to in [(None, None), (ts[10], ts[2000]), (ts[5] + 1, ts[5] + 2), (-1, 0)]:
+        start = 0 if t_from is None else np.searchsorted(ts, t_from, 'left')
+        stop = len(ts) if t_to is None else np.searchsorted(ts, t_to, 'right')
+        assert archive.time_range(t_from, t_to) == (start, max(start, stop))
+
+
+def test_unsorted_timestamps_refuse_time_range(tmp_path):
+    columns = reading_columns(10)
+    columns['timestamp'][5] = 0
+    write_columns(tmp_path / "s.dgc", columns)
+    archive = ColumnarArchive(tmp_path / "s.dgc")
+    assert not archive.ts_sorted
+    assert np.array_equal(archive.column('timestamp'), columns['timestamp'])
+    with pytest.raises(ValueError):
+        archive.time_range(0, 1)
+
+
+def test_nan_falls_back_to_plain(tmp_path):
+    columns = reading_columns(10)
+    columns['speed'][3] = np.nan
+    write_columns(tmp_path / "s.dgc", columns)
+    archive = ColumnarArchive(tmp_path / "s.dgc")
+    assert archive.header['columns']['speed']['encoding'] == 'plain'
+    assert np.isnan(archive.column('speed')[3])
+
+
+def test_segment_encodings_are_exact(tmp_path):
+    columns = reading_columns(100)
+    columns['speed'] = (columns['speed'] + np.float32(0.0137)).astype(np.float32)
+    write_columns(tmp_path / "s.dgc", columns, encodings=SEGMENT_ENCODINGS)
+    archive = ColumnarArchive(tmp_path / "s.dgc")
+    for name, (dtype, _, _) in COLUMNS.items():
+        assert np.array_equal(archive.column(name).astype(dtype), columns[name]), name
+
+
+def test_empty_archive(tmp_path):
+    write_columns(tmp_path / "s.dgc", {name: np.zeros(0, dtype) for name, (dtype, _, _) in COLUMNS.items()})
+    archive = ColumnarArchive(tmp_path / "s.dgc")
+    assert len(archive) == 0
+    assert len(archive.column('timestamp')) == 0
+    assert archive.header['time_bounds'] == {'first_ts': None, 'last_ts': None}
+
+
+def test_not_an_archive(tmp_path):
+    (tmp_path / "s.dgc").write_bytes(b"nope" * 4)
+    with pytest.raises(ValueError):
+        ColumnarArchive(tmp_path / "s.dgc")
+
+
+def test_convert_telegraf_file(tmp_path):
+    source = tmp_path / "session.out"
+    columns = reading_columns(50)
+    lines = [encode_line('mqtt_consumer', dict(TAGS, topic="ece508/team4/G1/driveguard/status"),
+                         {'msg': 'System started'}, 1700000000000000000)]
+    for i in range(50):
+        fields = {'ts': int(columns['timestamp'][i]), 'spd': float(columns['speed'][i]),
+                  'lat': float(columns['lat'][i]), 'lon': float(columns['lon'][i]),
+                  'acc': float(columns['acc'][i]), 'scr': int(columns['score'][i]),
+                  'gps': int(columns['gps_valid'][i])}
+        lines.append(encode_line('mqtt_consumer', dict(TAGS, topic="ece508/team4/G1/driveguard/batch_data"),
+                                 fields, 1700000000000000000 + i * 10 ** 9))
+        if i == 20:
+            lines.append(encode_line('mqtt_consumer', dict(TAGS, topic="ece508/team4/G1/driveguard/alert_harsh"),
+                                     {'ts': 200, 'acc': 0.6, 'thr': 0.4, 'scr': 97}))
+    source.write_text('\n'.join(lines) + '\n')
+
+    archive = ColumnarArchive(convert_telegraf_file(source))
+    data = load_session(source)
+    assert len(archive) == len(data.readings) == 50
+    assert_stored(archive.slice(), {name: data.readings.column(name) for name in COLUMNS})
+    assert archive.header['alerts_harsh'] == data.alerts_harsh
+    assert archive.header['status'] == data.status_msgs
+    assert np.array_equal(archive.column('recv_ms'), 1700000000000 + np.arange(50) * 1000)
+    assert len(archive.header['tags']) == 1
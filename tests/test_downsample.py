@@ -0,0 +1,73 @@
+"""
+DriveGuard Tests - Chart Downsampling
+Bounded chart payloads that keep the first, last and peak readings.
+"""
+
+import numpy as np
+import pytest
+
+from downsample import downsample, lttb_indices, minmax_indices
+
+
+def columns(n, seed=5):
+    rng = np.random.default_rng(seed)
+    speed = rng.uniform(40, 90, n).astype(np.float32)
+    acc = rng.uniform(0.9, 1.1, n).astype(np.float32)
+    speed[n // 3] = 180.0
+    acc[2 * n // 3] = 3.5
+    return {
+        'timestamp': np.arange(n, dtype=np.int64) * 10000,
+        'speed': speed,
+        'lat': np.linspace(45.5, 45.6, n),
+        'lon': np.linspace(-122.6, -122.5, n),
+        'acc': acc,
+        'score': np.full(n, 100, dtype=np.int16),
+        'gps_valid': np.ones(n, dtype=np.uint8),
+    }
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_real_readings_keep_ends_and_peaks(method):
+    data = columns(20000)
+    out = downsample(data, 500, method)
+    n = len(out['timestamp'])
+    assert 2 < n <= 510
+    assert np.all(np.diff(out['timestamp']) > 0)
+    assert out['timestamp'][0] == 0 and out['timestamp'][-1] == data['timestamp'][-1]
+    assert out['speed'].max() == 180.0
+    assert out['acc'].max() == pytest.approx(3.5)
+    # Every kept row is a real reading
+    rows = out['timestamp'] // 10000
+    for name in data:
+        assert np.array_equal(out[name], data[name][rows]), name
+
+
+def test_avg_buckets_carry_peaks():
+    data = columns(10000)
+    out = downsample(data, 100, 'avg')
+    assert len(out['timestamp']) == 100
+    assert out['count'].sum() == 10000
+    assert out['speed_max'].max() == 180.0
+    assert out['speed'].max() < 180.0
+    assert out['speed'].mean() == pytest.approx(data['speed'].astype(np.float64).mean())
+
+
+def test_small_inputs_pass_through():
+    data = columns(50)
+    assert downsample(data, 100) is data
+    assert downsample(data, None) is data
+    assert lttb_indices(data['timestamp'], data['speed'], 2).tolist() == [0, 49]
+    assert minmax_indices(data['speed'], 100).tolist() == list(range(50))
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample(columns(10), 5, 'median')
+
+
+def test_lttb_picks_one_row_per_bucket():
+    data = columns(1000)
+    picks = lttb_indices(data['timestamp'], data['speed'], 52)
+    assert len(picks) == 52
+    assert np.all(np.diff(picks) > 0)
+    assert picks[0] == 0 and picks[-1] == 999
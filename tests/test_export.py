@@ -0,0 +1,147 @@
+"""
+DriveGuard Tests - Streaming Export
+Chunked reading / alert pieces, the three formats and /api/export.
+"""
+
+import csv
+import gzip
+import io
+import json
+
+import numpy as np
+import pytest
+
+import app as dashboard
+from export import alert_chunks, export_columnar, export_csv, export_ndjson, read_columnar, reading_chunks
+from store import COLUMNS, ReadingStore
+from tailer import TelegrafTailer
+from telegraf_parser import encode_line
+
+TOPIC = "ece508/team4/G1/driveguard/"
+
+
+def store(n, shuffle=False):
+    rng = np.random.default_rng(4)
+    ts = np.arange(n, dtype=np.int64) * 10000
+    if shuffle:
+        rng.shuffle(ts)
+    return ReadingStore.from_columns({
+        'timestamp': ts, 'speed': rng.uniform(0, 150, n), 'lat': rng.uniform(45, 46, n),
+        'lon': rng.uniform(-123, -122, n), 'acc': rng.uniform(0.8, 1.5, n),
+        'score': rng.integers(0, 101, n), 'gps_valid': rng.integers(0, 2, n)})
+
+
+def joined(chunks):
+    chunks = list(chunks)
+    return {name: np.concatenate([c[name] for c in chunks]) for name in chunks[0]}, len(chunks)
+
+
+def test_reading_chunks_cover_the_range():
+    source = store(2500)
+    columns, count = joined(reading_chunks(source, 1000000, 20000000, chunk=400))
+    start, stop = 100, 2001
+    assert count == 5
+    for name in COLUMNS:
+        assert np.array_equal(columns[name], source.column(name, start, stop)), name
+        assert columns[name].dtype == COLUMNS[name][0]
+    only, _ = joined(reading_chunks(source, fields=['timestamp', 'speed']))
+    assert list(only) == ['timestamp', 'speed'] and len(only['speed']) == 2500
+
+
+def test_unsorted_readings_are_filtered():
+    source = store(2000, shuffle=True)
+    assert not source.ts_sorted
+    columns, _ = joined(reading_chunks(source, 500000, 900000, chunk=300))
+    ts = source.column('timestamp')
+    assert columns['timestamp'].tolist() == ts[(ts >= 500000) & (ts <= 900000)].tolist()
+
+
+def test_alert_chunks():
+    alerts = [{'timestamp': t, 'speed': 130.5, 'limit': 120, 'score': 95, 'lat': 45.5, 'lon': -122.6}
+              for t in range(0, 100)]
+    chunks = list(alert_chunks('alert_speed', alerts, 90, t_from=10500, t_to=40999, chunk=8))
+    ts = np.concatenate([c['timestamp'] for c in chunks])
+    assert ts.tolist() == list(range(10, 41))
+    assert [len(c['timestamp']) for c in chunks] == [8, 8, 8, 7]
+    assert list(alert_chunks('alert_speed', alerts, 5, t_from=10000)) == []
+
+
+def test_csv_and_ndjson():
+    source = store(30)
+    pieces = [('batch_data', c) for c in reading_chunks(source, chunk=7)]
+    records = source.to_records()
+
+    rows = list(csv.DictReader(io.StringIO(b''.join(export_csv(pieces, list(COLUMNS))).decode())))
+    assert len(rows) == 30
+    assert {k: type(v)(rows[5][k]) for k, v in records[5].items()} == records[5]
+
+    lines = b''.join(export_ndjson(pieces)).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [dict(r, kind='batch_data') for r in records]
+
+
+def test_columnar_round_trip():
+    source = store(1000)
+    alerts = [{'timestamp': t, 'acceleration': 0.61, 'threshold': 0.4, 'score': 90} for t in range(3)]
+    pieces = [('batch_data', c) for c in reading_chunks(source, chunk=300)]
+    pieces += [('alert_harsh', c) for c in alert_chunks('alert_harsh', alerts, 3)]
+    body = b''.join(export_columnar(pieces))
+
+    back = list(read_columnar(io.BytesIO(body)))
+    assert [kind for kind, _ in back] == ['batch_data'] * 4 + ['alert_harsh']
+    for (_, want), (_, got) in zip(pieces, back):
+        for name in want:
+            assert np.array_equal(want[name], got[name]) and want[name].dtype == got[name].dtype
+    with pytest.raises(ValueError):
+        list(read_columnar(io.BytesIO(body[:-10])))
+    with pytest.raises(ValueError):
+        list(read_columnar(io.BytesIO(b"nope" + body[4:])))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    lines = []
+    for i in range(300):
+        lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "batch_data"},
+                                 {'ts': (i + 1) * 10000, 'spd': 60.0, 'lat': 45.5, 'lon': -122.6,
+                                  'acc': 1.0, 'scr': 100, 'gps': 1}))
+        if i % 30 == 0:
+            lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "alert_speed"},
+                                     {'ts': (i + 1) * 10, 'spd': 130.0, 'lim': 120, 'scr': 95,
+                                      'lat': 45.5, 'lon': -122.6}))
+    text = ''.join(line + '\n' for line in lines)
+    (tmp_path / "live.out").write_text(text)
+    (tmp_path / "session_2024-03-01_09-00-00.out").write_text(text)
+    monkeypatch.setattr(dashboard, 'live_source', TelegrafTailer(tmp_path / "live.out"))
+    monkeypatch.setattr(dashboard, 'HISTORY_DIR', tmp_path)
+    return dashboard.app.test_client()
+
+
+def test_export_endpoint(client):
+    live = dashboard.live_source.poll()
+    body = client.get('/api/export?records=readings,alert_speed').data.decode().splitlines()
+    kinds = [json.loads(line)['kind'] for line in body]
+    assert kinds.count('batch_data') == len(live.readings)
+    assert kinds.count('alert_speed') == len(live.alerts_speed)
+
+    response = client.get('/api/export?session=session_2024-03-01_09-00-00.out&format=csv'
+                          '&fields=timestamp,speed&from=100000&to=200000',
+                          headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Disposition'].endswith('session_2024-03-01_09-00-00.csv"')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    rows = gzip.decompress(response.data).decode().splitlines()
+    assert rows[0] == 'timestamp,speed' and len(rows) == 12
+    assert rows[1] == '100000,60.0'
+
+    history = client.get('/api/export?session=session_2024-03-01_09-00-00.out&format=columnar')
+    counts = {}
+    for kind, columns in read_columnar(io.BytesIO(history.data)):
+        counts[kind] = counts.get(kind, 0) + len(columns['timestamp'])
+    assert counts == {'batch_data': 300, 'alert_speed': 10}
+
+
+def test_export_rejects_bad_requests(client):
+    assert client.get('/api/export?format=xml').status_code == 400
+    assert client.get('/api/export?records=trips').status_code == 400
+    assert client.get('/api/export?format=csv&records=readings,alert_speed').status_code == 400
+    assert client.get('/api/export?fields=altitude').status_code == 400
+    assert client.get('/api/export?session=session_none.out').status_code == 404
@@ -0,0 +1,85 @@
+"""
+DriveGuard Tests - Fleet State
+Per-vehicle sessions, bounded windows, trips and the leaderboard.
+"""
+
+import fleet
+from fleet import ALERT_WINDOW, Fleet, FleetTailer, Vehicle
+from telegraf_parser import encode_line
+
+
+def reading(i, speed=50.0, score=100):
+    return {'timestamp': i * 10000, 'speed': speed, 'lat': 45.5 + i * 1e-4, 'lon': -122.6,
+            'acc': 1.0, 'score': score, 'gps_valid': 1}
+
+
+def test_records_go_to_their_vehicle():
+    cars = Fleet()
+    for i in range(30):
+        cars.add('G1', 'batch_data', reading(i))
+    cars.add('G2', 'batch_data', reading(0, speed=80.0))
+    cars.add(None, 'status', {'msg': 'System started'})
+    assert len(cars) == 3
+    assert len(cars.vehicle('G1').data.readings) == 30
+    assert cars.vehicle('G2').data.summary()['max_speed'] == 80.0
+    assert cars.vehicle('unknown').data.status_msgs == [{'msg': 'System started'}]
+    assert cars.vehicle('G3') is None
+
+
+def test_every_list_stays_bounded():
+    vehicle = Vehicle('G1', window=100)
+    for i in range(5 * ALERT_WINDOW):
+        vehicle.add('batch_data', reading(i))
+        vehicle.add('alert_speed', {'timestamp': i, 'speed': 130.0})
+        vehicle.add('alert_harsh', {'timestamp': i, 'acc': 0.6})
+        vehicle.add('status', {'msg': f"status {i}"})
+        vehicle.add('quality', {'type': 'gap', 'from_ts': i, 'to_ts': i + 1, 'count': 1})
+    data = vehicle.data
+    assert len(data.readings) < 200
+    for items in (data.alerts_speed, data.alerts_harsh, data.status_msgs, data.quality_events):
+        assert ALERT_WINDOW <= len(items) < 2 * ALERT_WINDOW
+    assert data.status_msgs[-1] == {'msg': f"status {5 * ALERT_WINDOW - 1}"}
+    # The running stats still cover the whole session
+    assert data.summary()['total_readings'] == 5 * ALERT_WINDOW
+    assert vehicle.dropped + len(data.readings) == 5 * ALERT_WINDOW
+
+
+def test_trip_rows_follow_the_window():
+    vehicle = Vehicle('G1', window=100)
+    for i in range(350):
+        vehicle.add('batch_data', reading(i, speed=0.0 if 150 <= i < 250 else 60.0))
+    trips = vehicle.trips()
+    assert trips
+    last_ts = vehicle.data.readings.column('timestamp')
+    for trip in trips:
+        if trip['last_row'] is not None:
+            assert last_ts[trip['last_row']] == trip['end_ts']
+    assert trips[0]['first_row'] is None
+
+
+def test_leaderboard(monkeypatch):
+    monkeypatch.setattr(fleet, 'SUMMARY_TTL', 0.0)
+    cars = Fleet()
+    for device, score in [('G1', 90), ('G2', 70), ('G3', 95)]:
+        cars.add(device, 'batch_data', reading(0, score=score))
+    cars.add('G2', 'alert_speed', {'timestamp': 0, 'speed': 130.0, 'lat': 45.5, 'lon': -122.6})
+    assert [row['id'] for row in cars.leaderboard()] == ['G3', 'G1', 'G2']
+    assert [row['rank'] for row in cars.leaderboard()] == [1, 2, 3]
+    # Fewest alerts ranks first
+    assert cars.leaderboard('alerts')[-1]['id'] == 'G2'
+
+
+def test_fleet_tailer_splits_the_file(tmp_path):
+    live = tmp_path / "live.out"
+    lines = []
+    for i in range(40):
+        for board in ('G1', 'G2'):
+            lines.append(encode_line('mqtt_consumer', {'topic': f"ece508/team4/{board}/driveguard/batch_data"},
+                                     {'ts': i * 10000, 'spd': 50.0, 'lat': 45.5, 'lon': -122.6,
+                                      'acc': 1.0, 'scr': 100, 'gps': 1}))
+    live.write_text('\n'.join(lines) + '\n')
+    tailer = FleetTailer(live)
+    tailer.poll()
+    tailer.reconciler.flush()
+    assert sorted(v.device_id for v in tailer.data.vehicles()) == ['G1', 'G2']
+    assert all(len(v.data.readings) == 40 for v in tailer.data.vehicles())
@@ -0,0 +1,112 @@
+"""
+DriveGuard Tests - HTTP Response Cache
+Versioned bodies, conditional GETs and compressed variants.
+"""
+
+import gzip
+import json
+
+import pytest
+from flask import Flask, Response, request
+
+import http_cache
+from http_cache import IMMUTABLE_CACHE_CONTROL, ResponseCache, cached_response, compress, compress_stream
+
+PAYLOAD = {'batch_data': [{'speed': 50.0 + i, 'acc': 1.0} for i in range(200)]}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(http_cache, 'response_cache', ResponseCache())
+    app = Flask(__name__)
+    app.builds = 0
+
+    def build():
+        app.builds += 1
+        return json.dumps(PAYLOAD).encode()
+
+    @app.route('/data')
+    def data():
+        window = request.args.get('window', 500, type=int)
+        return cached_response(request.args.get('v', '1'), build, params=(window,))
+
+    @app.route('/history')
+    def history():
+        return cached_response('h1', build, IMMUTABLE_CACHE_CONTROL)
+
+    @app.route('/plain')
+    def plain():
+        return compress(Response(request.args.get('body', ''), mimetype='text/plain'))
+
+    @app.route('/stream')
+    def stream():
+        chunks, encoding = compress_stream(iter([b"a,b\n"] * 1000))
+        response = Response(chunks, mimetype='text/csv')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    return app, app.test_client()
+
+
+def test_one_build_per_version(client):
+    app, c = client
+    first = c.get('/data')
+    assert first.status_code == 200 and first.json == PAYLOAD
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert c.get('/data?unknown=1').data == first.data
+    assert c.get('/data?window=500').data == first.data
+    assert app.builds == 1
+    c.get('/data?window=10')
+    assert app.builds == 2
+    c.get('/data?v=2')
+    assert app.builds == 3
+
+
+def test_conditional_get(client):
+    app, c = client
+    etag = c.get('/data').headers['ETag']
+    not_modified = c.get('/data', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304 and not_modified.data == b''
+    assert c.get('/data?v=2', headers={'If-None-Match': etag}).status_code == 200
+    # A gzip variant's ETag still matches the same version
+    gz = c.get('/data', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    assert c.get('/data', headers={'If-None-Match': gz}).status_code == 304
+    assert c.get('/history').headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+
+
+def test_gzip_variant(client):
+    app, c = client
+    response = c.get('/data', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(gzip.decompress(response.data)) == PAYLOAD
+    assert app.builds == 1
+
+
+def test_compress_only_when_worth_it(client):
+    _, c = client
+    small = c.get('/plain?body=short', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    body = 'x' * 5000
+    big = c.get(f'/plain?body={body}', headers={'Accept-Encoding': 'gzip'})
+    assert big.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(big.data).decode() == body
+    assert c.get(f'/plain?body={body}').data.decode() == body
+
+
+def test_streamed_gzip(client):
+    _, c = client
+    response = c.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert gzip.decompress(response.data) == b"a,b\n" * 1000
+    assert c.get('/stream').data == b"a,b\n" * 1000
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_bytes=3000)
+    for key in 'abc':
+        cache.get(key, "1", lambda: b"x" * 1000)
+    cache.get("a", "1", lambda: b"never built")
+    cache.get("d", "1", lambda: b"y" * 1000)
+    assert list(cache.entries) == ['c', 'a', 'd']
+    assert cache.bytes <= 3000
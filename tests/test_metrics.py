@@ -0,0 +1,71 @@
+"""
+DriveGuard Tests - Metrics
+Counter, gauge and histogram samples in the Prometheus text format.
+"""
+
+import app as dashboard
+import metrics
+from metrics import Counter, Gauge, Histogram
+
+
+def samples(text):
+    """{sample name with labels: value} of a rendered metric."""
+    return dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+
+
+def test_counter():
+    counter = Counter("test_events", "Events seen", register=False)
+    counter.inc()
+    counter.inc(4)
+    assert counter.value == 5
+    text = counter.render()
+    assert text.startswith("# HELP test_events_total Events seen\n# TYPE test_events_total counter")
+    assert samples(text) == {'test_events_total': '5'}
+
+
+def test_labels_are_escaped():
+    counter = Counter("test_lines", "Lines", labelnames=("source",), register=False)
+    counter.labels('file').inc(2)
+    counter.labels('say "hi"\n').inc()
+    assert counter.labels('file') is counter.labels('file')
+    assert samples(counter.render()) == {'test_lines_total{source="file"}': '2',
+                                         'test_lines_total{source="say \\"hi\\"\\n"}': '1'}
+
+
+def test_gauge_reads_its_function_at_scrape_time():
+    value = [3]
+    live = Gauge("test_live", "Live value", func=lambda: value[0], register=False)
+    value[0] = 7
+    assert samples(live.render()) == {'test_live': '7'}
+    broken = Gauge("test_broken", "Fails", func=lambda: 1 / 0, register=False)
+    assert samples(broken.render()) == {'test_broken': 'nan'}
+    plain = Gauge("test_plain", "Set directly", register=False)
+    plain.set(0.5)
+    assert samples(plain.render()) == {'test_plain': '0.5'}
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Durations", labelnames=("stage",), buckets=(1.0, 0.1),
+                          register=False)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.labels('parse').observe(value)
+    with histogram.labels('encode').time():
+        pass
+    got = samples(histogram.render())
+    assert got['test_seconds_bucket{stage="parse",le="0.1"}'] == '2'
+    assert got['test_seconds_bucket{stage="parse",le="1"}'] == '3'
+    assert got['test_seconds_bucket{stage="parse",le="+Inf"}'] == '4'
+    assert got['test_seconds_count{stage="parse"}'] == '4'
+    assert float(got['test_seconds_sum{stage="parse"}']) == 3.65
+    assert got['test_seconds_count{stage="encode"}'] == '1'
+
+
+def test_metrics_endpoint():
+    response = dashboard.app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert text == text.rstrip('\n') + '\n'
+    for metric in metrics.REGISTRY:
+        assert f"# TYPE {metric.name} {metric.kind}" in text
+    assert "# TYPE driveguard_live_readings gauge" in text
@@ -0,0 +1,182 @@
+"""
+DriveGuard Tests - MQTT Client and Native Ingest
+MQTTClient and MqttIngest against the local StandInBroker.
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import mqtt_ingest
+from mqtt_ingest import MqttIngest
+from mqtt_lite import CONNACK, MQTTClient, StandInBroker, packet, read_packet, topic_matches
+
+TOPIC = "ece508/team1/G1/driveguard/batch_data"
+
+
+def wait_for(condition, timeout=5.0):
+    """Poll condition() until it holds; False on timeout."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def batch_payload(first_ts, n, step=10000):
+    return json.dumps([{'ts': first_ts + i * step, 'spd': 50.0 + i, 'acc': 0.1, 'lat': 45.5,
+                        'lon': -122.6, 'gps': 1, 'scr': 100} for i in range(n)])
+
+
+async def subscribed(broker, topic_filter):
+    while not any(topic_filter in filters for filters in broker.subscriptions.values()):
+        await asyncio.sleep(0.01)
+
+
+def test_topic_matches():
+    assert topic_matches("ece508/+/+/driveguard/#", TOPIC)
+    assert topic_matches(TOPIC, TOPIC)
+    assert not topic_matches("ece508/+/driveguard/#", TOPIC)
+    assert not topic_matches("ece508/team1/G1/driveguard/status", TOPIC)
+
+
+def test_connect_subscribe_publish():
+    async def scenario():
+        broker = await StandInBroker(port=0).start()
+        subscriber = MQTTClient("127.0.0.1", broker.port, "sub")
+        publisher = MQTTClient("127.0.0.1", broker.port, "pub")
+        try:
+            await subscriber.connect()
+            await subscriber.subscribe("ece508/+/+/driveguard/#")
+            await asyncio.wait_for(subscribed(broker, "ece508/+/+/driveguard/#"), 5)
+            await publisher.connect()
+            await publisher.publish(TOPIC, "[1]")
+            await publisher.publish("other/topic", "[2]")
+            await publisher.publish(TOPIC, b"[3]")
+            received = []
+            async for topic, payload in subscriber.messages():
+                received.append((topic, payload))
+                if len(received) == 2:
+                    break
+            return received, broker.messages_routed
+        finally:
+            await publisher.disconnect()
+            await subscriber.disconnect()
+            await broker.stop()
+
+    received, routed = asyncio.run(scenario())
+    assert received == [(TOPIC, b"[1]"), (TOPIC, b"[3]")]
+    assert routed == 2
+
+
+def test_silent_broker_ends_messages_with_connection_error():
+    async def scenario():
+        async def handle(reader, writer):
+            await read_packet(reader)
+            writer.write(packet(CONNACK, b'\x00\x00'))
+            await writer.drain()
+            # Half-open: swallow the pings and never answer
+            try:
+                while True:
+                    await read_packet(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        client = MQTTClient("127.0.0.1", server.sockets[0].getsockname()[1], keepalive=1)
+        try:
+            await client.connect()
+            started = time.monotonic()
+            with pytest.raises(ConnectionError):
+                async for _ in client.messages():
+                    pass
+            return time.monotonic() - started
+        finally:
+            await client.disconnect()
+            server.close()
+            await server.wait_closed()
+
+    elapsed = asyncio.run(asyncio.wait_for(scenario(), 10))
+    assert 1.0 <= elapsed < 3.0
+
+
+def test_pings_keep_a_quiet_connection_open():
+    async def scenario():
+        broker = await StandInBroker(port=0).start()
+        client = MQTTClient("127.0.0.1", broker.port, keepalive=1)
+        try:
+            await client.connect()
+            await client.subscribe(TOPIC)
+            messages = client.messages()
+            # Nothing is published for several keep-alive periods
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(messages.__anext__(), 3.5)
+        finally:
+            await client.disconnect()
+            await broker.stop()
+
+    asyncio.run(scenario())
+
+
+class BrokerThread:
+    """StandInBroker on its own event loop, restartable on the same port."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.port = 0
+        self.broker = None
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(5)
+
+    def start(self):
+        self.broker = self.call(StandInBroker(port=self.port).start())
+        self.port = self.broker.port
+
+    def stop(self):
+        self.call(self.broker.stop())
+
+    def publish(self, topic, payload):
+        async def send():
+            client = MQTTClient("127.0.0.1", self.port, "publisher")
+            await client.connect()
+            await client.publish(topic, payload)
+            await client.disconnect()
+        self.call(send())
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+def test_ingest_receives_and_reconnects(monkeypatch):
+    monkeypatch.setattr(mqtt_ingest, 'RECONNECT_MIN', 0.05)
+    broker = BrokerThread()
+    broker.start()
+    ingest = MqttIngest("127.0.0.1", broker.port, "ece508/team1/+/driveguard/#").start()
+    try:
+        assert wait_for(lambda: ingest.connected and broker.broker.subscriptions)
+        broker.publish(TOPIC, batch_payload(0, 6))
+        assert wait_for(lambda: ingest.messages_received == 1)
+
+        broker.stop()
+        assert wait_for(lambda: not ingest.connected)
+        broker.start()
+        assert wait_for(lambda: ingest.connected and broker.broker.subscriptions)
+        broker.publish(TOPIC, batch_payload(60000, 6))
+        assert wait_for(lambda: ingest.messages_received == 2)
+
+        ingest.reconciler.flush()
+        data = ingest.poll()
+        assert data.readings.column('timestamp').tolist() == list(range(0, 120000, 10000))
+        assert data.stats.total_readings == 12
+    finally:
+        ingest.stop()
+        broker.stop()
+        broker.close()
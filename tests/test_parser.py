@@ -0,0 +1,108 @@
+"""
+DriveGuard Tests - Line Protocol
+encode_line() / decode_line() / parse_line() round trips and edge cases.
+"""
+
+import pytest
+
+from telegraf_parser import (SCHEMAS, build_record, decode_line, encode_line, field_value,
+                             parse_fleet_line, parse_line, skippable)
+
+TAGS = {'host': 'LAPTOP', 'project': 'driveguard', 'student': 'G1', 'team': 'team4'}
+
+
+def topic_tags(kind, device="G1"):
+    return dict(TAGS, topic=f"ece508/team4/{device}/driveguard/{kind}")
+
+
+READING = {'ts': 120000, 'spd': 63.5, 'lat': 38.830001, 'lon': -77.300002, 'acc': 1.02,
+           'scr': 95, 'gps': 1}
+
+
+def test_reading_round_trip():
+    line = encode_line('mqtt_consumer', topic_tags('batch_data'), READING, 1700000000000000000)
+    kind, record = parse_line(line)
+    assert kind == 'batch_data'
+    assert record == {'timestamp': 120000, 'speed': 63.5, 'lat': 38.830001, 'lon': -77.300002,
+                      'acc': 1.02, 'score': 95, 'gps_valid': 1}
+
+
+@pytest.mark.parametrize('kind, fields', [
+    ('alert_speed', {'ts': 1200, 'spd': 131.2, 'lim': 120, 'scr': 90, 'lat': 38.8, 'lon': -77.3}),
+    ('alert_harsh', {'ts': 1300, 'acc': 0.55, 'thr': 0.4, 'scr': 87}),
+])
+def test_alert_round_trip(kind, fields):
+    line = encode_line('mqtt_consumer', topic_tags(kind), fields, 1700000000000000000)
+    parsed_kind, record = parse_line(line)
+    assert parsed_kind == kind
+    assert record == build_record(kind, {key: str(value) for key, value in fields.items()})
+    assert set(record) == {out for out, _, _ in SCHEMAS[kind]}
+
+
+def test_status_keeps_text_with_escapes():
+    fields = {'msg': 'Speed "limit" set, 120 km/h\\h', 'client': 'DG_1234_G1', 'buf': 60}
+    line = encode_line('mqtt_consumer', topic_tags('status'), fields)
+    kind, record = parse_line(line)
+    assert kind == 'status'
+    assert record['msg'] == fields['msg']
+    assert record['client'] == fields['client']
+    assert float(record['buf']) == 60
+
+
+def test_escaped_tags_decode():
+    tags = dict(topic_tags('batch_data'), host='my laptop,2=x')
+    line = encode_line('mqtt consumer', tags, READING, 5)
+    measurement, decoded_tags, fields, timestamp = decode_line(line)
+    assert measurement == 'mqtt consumer'
+    assert decoded_tags == tags
+    assert timestamp == 5
+    assert {key: field_value(value) for key, value in fields.items()} == {
+        key: float(value) for key, value in READING.items()}
+    assert parse_line(line) == parse_line(encode_line('mqtt_consumer', topic_tags('batch_data'), READING))
+
+
+def test_fast_and_general_paths_agree():
+    plain = encode_line('mqtt_consumer', topic_tags('batch_data'), READING)
+    # An escaped tag value sends the line through the general decoder
+    escaped = encode_line('mqtt_consumer', dict(topic_tags('batch_data'), host='a b'), READING)
+    assert '\\' in escaped
+    assert parse_line(plain) == parse_line(escaped)
+
+
+def test_missing_fields_take_schema_defaults():
+    kind, record = parse_line(encode_line('mqtt_consumer', topic_tags('batch_data'), {'ts': 10}))
+    assert kind == 'batch_data'
+    assert record['score'] == 100
+    assert record['speed'] == 0
+
+
+def test_fleet_line_carries_device():
+    line = encode_line('mqtt_consumer', topic_tags('batch_data', device='G42'), READING)
+    device, kind, record = parse_fleet_line(line)
+    assert (device, kind) == ('G42', 'batch_data')
+    assert record == parse_line(line)[1]
+
+
+@pytest.mark.parametrize('line', [
+    '',
+    '# comment',
+    'mqtt_consumer,topic=ece508/team4/G1/driveguard/batch_data',
+    'mqtt_consumer,topic=ece508/team4/G1/driveguard/batch_data spd=1 1 extra',
+    'cpu,host=a usage=1 1700000000',
+])
+def test_rejected_lines(line):
+    assert parse_line(line) is None
+
+
+def test_skippable():
+    assert skippable('   ')
+    assert skippable('# written by telegraf')
+    assert not skippable('cpu usage=1')
+
+
+def test_field_values():
+    assert field_value('true') is True
+    assert field_value('F') is False
+    assert field_value('12i') == 12
+    assert field_value('1.5') == 1.5
+    assert field_value('"a \\"b\\""') == 'a "b"'
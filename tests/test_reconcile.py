@@ -0,0 +1,191 @@
+"""
+DriveGuard Tests - Ingest Reconciliation
+Duplicate removal, reordering, late readings, restarts, gaps and resume.
+"""
+
+import threading
+import time
+
+from reconcile import GAP_MS, REORDER_MS, Reconciler
+from tailer import TelegrafTailer
+from telegraf_parser import encode_line
+
+
+class Collector:
+    """deliver() target that records (device, kind, record)."""
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, device, kind, record):
+        self.records.append((device, kind, record))
+
+    def readings(self, device=None):
+        return [r['timestamp'] for d, kind, r in self.records
+                if kind == 'batch_data' and (device is None or d == device)]
+
+    def quality(self):
+        return [(r['type'], r['from_ts'], r['to_ts'], r['count'])
+                for _, kind, r in self.records if kind == 'quality']
+
+
+def reading(ts):
+    return {'timestamp': ts, 'speed': 50.0, 'lat': 0.0, 'lon': 0.0, 'acc': 1.0,
+            'score': 100, 'gps_valid': 1}
+
+
+def feed(reconciler, timestamps, device=None):
+    for ts in timestamps:
+        reconciler.add(device, 'batch_data', reading(ts))
+
+
+def test_in_order_readings_wait_for_the_reorder_window():
+    out = Collector()
+    reconciler = Reconciler(out)
+    feed(reconciler, [0, 10000, 20000])
+    assert out.readings() == []
+    feed(reconciler, [REORDER_MS + 10000])
+    assert out.readings() == [0, 10000]
+    reconciler.flush()
+    assert out.readings() == [0, 10000, 20000, REORDER_MS + 10000]
+    assert out.quality() == [('gap', 20000, REORDER_MS + 10000, 4)]
+
+
+def test_reordered_readings_come_out_sorted():
+    out = Collector()
+    reconciler = Reconciler(out)
+    feed(reconciler, [30000, 10000, 20000, 0, 40000])
+    reconciler.flush()
+    assert out.readings() == [0, 10000, 20000, 30000, 40000]
+    assert out.quality() == []
+
+
+def test_duplicates_are_dropped_and_reported_once():
+    out = Collector()
+    reconciler = Reconciler(out)
+    feed(reconciler, [0, 10000, 20000, 10000, 20000, 0, 30000])
+    reconciler.flush()
+    assert out.readings() == [0, 10000, 20000, 30000]
+    assert out.quality() == [('duplicate', 0, 20000, 3)]
+
+
+def test_late_reading_is_dropped():
+    out = Collector()
+    reconciler = Reconciler(out)
+    feed(reconciler, [0, 10000])
+    # The device went quiet and its readings were passed on
+    reconciler.flush()
+    feed(reconciler, [5000, 20000])
+    reconciler.flush()
+    assert out.readings() == [0, 10000, 20000]
+    assert out.quality() == [('late', 5000, 5000, 1)]
+
+
+def test_clock_restart_starts_a_new_timeline():
+    out = Collector()
+    reconciler = Reconciler(out)
+    start = 10 * REORDER_MS
+    feed(reconciler, [start, start + 10000, 0, 10000])
+    reconciler.flush()
+    assert out.readings() == [start, start + 10000, 0, 10000]
+    assert out.quality()[0] == ('restart', start + 10000, 0, 0)
+
+
+def test_gap_counts_missing_readings():
+    out = Collector()
+    reconciler = Reconciler(out)
+    feed(reconciler, [0, GAP_MS + 25000])
+    reconciler.flush()
+    assert out.quality() == [('gap', 0, GAP_MS + 25000, 3)]
+
+
+def test_expire_releases_a_quiet_device():
+    out = Collector()
+    reconciler = Reconciler(out, hold=5.0)
+    feed(reconciler, [0, 10000], device='a')
+    reconciler.expire(time.monotonic())
+    assert out.readings() == []
+    reconciler.expire(time.monotonic() + 5.0)
+    assert out.readings() == [0, 10000]
+
+
+def test_alerts_pass_straight_through():
+    out = Collector()
+    reconciler = Reconciler(out)
+    feed(reconciler, [0])
+    reconciler.add(None, 'alert_speed', {'timestamp': 0, 'speed': 130.0})
+    assert [kind for _, kind, _ in out.records] == ['alert_speed']
+
+
+def test_devices_are_independent():
+    out = Collector()
+    reconciler = Reconciler(out)
+    feed(reconciler, [0, 10000], device='a')
+    feed(reconciler, [0, 10000], device='b')
+    feed(reconciler, [REORDER_MS + 10000], device='a')
+    assert out.readings('a') == [0, 10000]
+    assert out.readings('b') == []
+    assert out.quality() == []
+
+
+def test_devices_from_many_threads():
+    out = Collector()
+    lock = threading.Lock()
+
+    def deliver(device, kind, record):
+        with lock:
+            out(device, kind, record)
+
+    reconciler = Reconciler(deliver)
+    expected = list(range(0, 2000 * 1000, 1000))
+
+    def board(device):
+        # Chunks arrive reversed, and their first readings are sent again
+        for i in range(0, len(expected), 50):
+            chunk = expected[i:i + 50]
+            feed(reconciler, chunk[::-1] + chunk[:10], device)
+
+    threads = [threading.Thread(target=board, args=(f"G{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    reconciler.flush()
+    for i in range(8):
+        assert out.readings(f"G{i}") == expected
+
+
+def test_snapshot_restore_continues():
+    timestamps = [30000, 0, 10000, 10000, 50000, 20000, 40000, REORDER_MS + 70000, 60000, 90000]
+    whole = Collector()
+    reconciler = Reconciler(whole)
+    feed(reconciler, timestamps)
+    reconciler.flush()
+
+    resumed = Collector()
+    first = Reconciler(resumed)
+    feed(first, timestamps[:5])
+    second = Reconciler(resumed)
+    second.restore(first.snapshot())
+    feed(second, timestamps[5:])
+    second.flush()
+    assert resumed.records == whole.records
+
+
+def test_rotation_drops_held_back_readings(tmp_path):
+    def line(ts):
+        return encode_line('mqtt_consumer', {'topic': "ece508/team4/G1/driveguard/batch_data"},
+                           {'ts': ts, 'spd': 50.0, 'lat': 0.0, 'lon': 0.0, 'acc': 1.0, 'scr': 100, 'gps': 1}) + '\n'
+
+    live = tmp_path / "live.out"
+    live.write_text(line(0) + line(10000))
+    tailer = TelegrafTailer(live)
+    tailer.poll()
+    old = tailer.data
+    # run.py moves the file to history and Telegraf starts a new one
+    live.rename(tmp_path / "archived.out")
+    live.write_text(line(500000))
+    tailer.poll()
+    tailer.reconciler.flush()
+    assert len(old.readings) == 0
+    assert tailer.data.readings.column('timestamp').tolist() == [500000]
@@ -0,0 +1,159 @@
+"""
+DriveGuard Tests - Scoring Engine
+Firmware score replay, threshold grids, caching and /api/rescore.
+"""
+
+import numpy as np
+import pytest
+
+import app as dashboard
+from scoring import (BONUS_MS, FIRMWARE_THRESHOLDS, MAX_COMBINATIONS, Thresholds, alerts, grade, rescore,
+                     rescore_cached, summary, threshold_grid)
+from tailer import TelegrafTailer
+from telegraf_parser import encode_line
+
+
+def firmware_scores(columns, th):
+    """The firmware loop, one reading at a time: (scores, speeding rows, harsh rows)."""
+    scores, speeding, harsh = [], [], []
+    score = since = prev_ts = 0
+    prev_acc = 0.0
+    for i, (t, v, a, gps) in enumerate(zip(columns['timestamp'], columns['speed'], columns['acc'],
+                                           columns['gps_valid'])):
+        t = int(t)
+        if i == 0 or t < prev_ts:
+            score, since, prev_acc = 100, min(0, t), 0.0
+        bonus = (t - since) // BONUS_MS
+        if bonus > 0:
+            score = min(100, score + bonus)
+            since += bonus * BONUS_MS
+        scores.append(score)
+        if gps and v > th.speed_danger:
+            score, since = max(0, score + th.score_speeding), t
+            speeding.append(i)
+        if abs(a - prev_acc) > th.accel_harsh:
+            score, since = max(0, score + th.score_harsh), t
+            harsh.append(i)
+        prev_acc, prev_ts = a, t
+    return scores, speeding, harsh
+
+
+def session(n, seed, reboots=()):
+    rng = np.random.default_rng(seed)
+    ts = np.arange(1, n + 1, dtype=np.int64) * 10000
+    for row in reboots:
+        ts[row:] -= ts[row] - 10000
+    return {
+        'timestamp': ts,
+        'speed': np.where(rng.random(n) < 0.05, 130.0, 60.0).astype(np.float32),
+        'acc': (1.0 + np.where(rng.random(n) < 0.03, 0.6, 0.0) + rng.normal(0, 0.02, n)).astype(np.float32),
+        'gps_valid': (rng.random(n) > 0.1).astype(np.uint8),
+        'lat': np.full(n, 45.5),
+        'lon': np.full(n, -122.6)
+    }
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_the_firmware_loop(seed):
+    columns = session(3000, seed, reboots=(1200, 2500))
+    for th in (FIRMWARE_THRESHOLDS, Thresholds(100.0, 0.2, -10, -1)):
+        expected, speeding, harsh = firmware_scores(columns, th)
+        result = rescore(columns, th)
+        assert result['scores'].tolist() == expected
+        assert result['speeding']['rows'].tolist() == speeding
+        assert result['harsh']['rows'].tolist() == harsh
+        assert result['final_score'] == expected[-1]
+        assert result['min_score'] == min(expected)
+        assert result['grade'] == grade(expected[-1])
+
+
+def test_carry_continues_the_session():
+    columns = session(2000, 7)
+    whole = rescore(columns)
+    first = rescore({k: v[:900] for k, v in columns.items()})
+    rest = rescore({k: v[900:] for k, v in columns.items()}, carry=first['carry'])
+    assert np.array_equal(np.concatenate([first['scores'], rest['scores']]), whole['scores'])
+
+
+def test_smooth_driving_earns_points_back():
+    n = 400
+    columns = {'timestamp': np.arange(1, n + 1) * 10000, 'speed': np.full(n, 60.0),
+               'acc': np.zeros(n), 'gps_valid': np.ones(n)}
+    columns['speed'][0:3] = 130.0
+    scores = rescore(columns)['scores']
+    assert scores[3] == 85
+    # One point for every 600 s without a penalty, capped at 100
+    assert scores[61] == 85 and scores[62] == 86
+    assert scores[-1] == min(100, 85 + (n - 3) * 10000 // BONUS_MS)
+
+
+def test_summary_and_alerts():
+    columns = session(500, 3)
+    columns['score'] = rescore(columns)['scores']
+    result = rescore(columns)
+    out = summary(result)
+    assert out['recorded_agreement'] == 1.0
+    assert out['total_alerts'] == out['speed_alerts'] + out['harsh_alerts']
+    speeding, harsh = alerts(result)
+    assert len(speeding) == out['speed_alerts'] and len(harsh) == out['harsh_alerts']
+    assert all(a['speed'] > a['limit'] for a in speeding)
+    assert all(a['acceleration'] > a['threshold'] for a in harsh)
+    assert rescore({k: v[:0] for k, v in columns.items()})['final_score'] == 100
+
+
+def test_threshold_grid():
+    grid = threshold_grid(FIRMWARE_THRESHOLDS, {'speed_danger': [100.0, 110.0], 'score_harsh': [-1, -2, -3]})
+    assert len(grid) == 6
+    assert {t.accel_harsh for t in grid} == {FIRMWARE_THRESHOLDS.accel_harsh}
+    assert threshold_grid(FIRMWARE_THRESHOLDS, {}) == [FIRMWARE_THRESHOLDS]
+    with pytest.raises(ValueError):
+        threshold_grid(FIRMWARE_THRESHOLDS, {'speed_danger': list(range(MAX_COMBINATIONS + 1))})
+
+
+def test_cached_per_session_version_and_thresholds():
+    columns = session(300, 1)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return [(None, 0, lambda: columns)]
+    key = ('test', object())
+    first = rescore_cached(key, load, FIRMWARE_THRESHOLDS)
+    assert rescore_cached(key, load, FIRMWARE_THRESHOLDS) is first
+    assert len(loads) == 1
+    rescore_cached(key, load, Thresholds(100.0, 0.4, -5, -3))
+    rescore_cached(key + (2,), load, FIRMWARE_THRESHOLDS)
+    assert len(loads) == 3
+
+
+def write_live(path, n):
+    topic = "ece508/team4/G1/driveguard/batch_data"
+    lines = [encode_line('mqtt_consumer', {'topic': topic},
+                         {'ts': (i + 1) * 10000, 'spd': 130.0 if i % 25 == 0 else 60.0 + i % 3,
+                          'lat': 45.5, 'lon': -122.6, 'acc': 1.0 + (i % 40 == 0), 'scr': 100, 'gps': 1})
+             for i in range(n)]
+    path.write_text(''.join(line + '\n' for line in lines))
+
+
+def test_rescore_endpoint(tmp_path, monkeypatch):
+    path = tmp_path / "live.out"
+    write_live(path, 600)
+    source = TelegrafTailer(path)
+    monkeypatch.setattr(dashboard, 'live_source', source)
+    client = dashboard.app.test_client()
+
+    response = client.get('/api/rescore?speed_danger=100,140&alerts=1')
+    assert response.status_code == 200
+    body = response.json
+    assert body['session'] == 'live'
+    readings = source.data.readings
+    columns = {name: readings.column(name) for name in dashboard.SCORE_COLUMNS}
+    for entry, limit in zip(body['results'], (100.0, 140.0)):
+        th = dashboard._config_thresholds()._replace(speed_danger=limit)
+        expected = summary(rescore(columns, th))
+        assert {k: entry[k] for k in expected} == expected
+        assert len(entry['alerts_speed']) == entry['speed_alerts']
+    assert body['results'][0]['speed_alerts'] > 0 and body['results'][1]['speed_alerts'] == 0
+
+    assert client.get('/api/rescore?speed_danger=fast').status_code == 400
+    assert client.get('/api/rescore?session=session_missing.out').status_code == 404
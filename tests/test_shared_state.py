@@ -0,0 +1,116 @@
+"""
+DriveGuard Tests - Shared Live State
+Workers of --serve prod read the ingest process's session instead of copying it.
+"""
+
+import numpy as np
+import pytest
+
+import shared_state
+from scoring import FIRMWARE_THRESHOLDS, rescore_pieces
+from shared_state import LISTS, RemoteReadings, ReplicaSource, serve_state
+from spill import reading_pieces
+from store import COLUMNS
+from tailer import TelegrafTailer
+from telegraf_parser import encode_line
+
+TOPIC = "ece508/team4/G1/driveguard/"
+
+
+def session_lines(n, start=0):
+    lines = []
+    for i in range(start, start + n):
+        speed = 130.0 if i % 50 < 5 else 60.0 + i % 7
+        lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "batch_data"},
+                                 {'ts': i * 10000, 'spd': speed, 'lat': 45.5 + i * 1e-4, 'lon': -122.6,
+                                  'acc': 1.0 + (i % 11) / 20, 'scr': 100, 'gps': 1}))
+        if i % 50 == 0:
+            lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "alert_speed"},
+                                     {'ts': i * 10, 'spd': speed, 'lim': 120, 'scr': 95,
+                                      'lat': 45.5 + i * 1e-4, 'lon': -122.6}))
+        if i % 400 == 0:
+            lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "status"}, {'msg': f"tick {i}"}))
+    return ''.join(line + '\n' for line in lines)
+
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    """(ingest tailer, worker source) over a spilling live session."""
+    monkeypatch.setenv("DRIVEGUARD_SPILL_DIR", str(tmp_path / "spill"))
+    monkeypatch.setenv("DRIVEGUARD_LIVE_READINGS", "300")
+    monkeypatch.setenv("DRIVEGUARD_LIVE_ALERTS", "10")
+    monkeypatch.setattr(shared_state, 'SYNC_INTERVAL', 0.0)
+    live = tmp_path / "live.out"
+    live.write_text(session_lines(2000))
+    ingest = TelegrafTailer(live)
+    ingest.poll()
+    config = {'speed_danger': 120.0}
+    server = serve_state(ingest, config, authkey=b"test")
+    return ingest, ReplicaSource(server.address, b"test", {})
+
+
+def test_worker_reads_the_ingest_session(shared):
+    ingest, worker = shared
+    expected, data = ingest.data, worker.poll()
+    assert isinstance(data.readings, RemoteReadings)
+    assert worker.generation == ingest.generation
+    assert worker.config == {'speed_danger': 120.0}
+    assert len(data.readings) == len(expected.readings)
+    for start, stop in [(None, None), (-500, None), (10, 20), (5, 5)]:
+        for name in COLUMNS:
+            assert np.array_equal(data.readings.column(name, start, stop),
+                                  expected.readings.column(name, start, stop)), name
+    assert data.readings.to_records(-3) == expected.readings.to_records(len(expected.readings) - 3)
+    assert data.readings.time_range(50000, 90000) == expected.readings.time_range(50000, 90000)
+    for name in LISTS:
+        assert list(getattr(data, name)) == list(getattr(expected, name)), name
+        assert getattr(data, name)[-3:] == getattr(expected, name)[-3:], name
+    assert data.alerts_speed[0] == expected.alerts_speed[0]
+    assert data.trips.summaries() == expected.trips.summaries()
+    assert data.summary() == expected.summary()
+
+
+def test_worker_rescores_from_the_segments(shared):
+    ingest, worker = shared
+    readings = worker.poll().readings
+    pieces = reading_pieces(readings, COLUMNS)
+    assert len(pieces) == len(ingest.data.readings.segments) + 1
+    assert all(key is not None for key, _, _ in pieces[:-1])
+    with ingest.lock:
+        expected = rescore_pieces(reading_pieces(ingest.data.readings, COLUMNS), FIRMWARE_THRESHOLDS)
+    result = rescore_pieces(pieces, FIRMWARE_THRESHOLDS)
+    for key in ('final_score', 'min_score', 'speed_alerts', 'harsh_alerts', 'readings'):
+        assert result[key] == expected[key], key
+
+
+def test_a_request_sees_one_head(shared):
+    ingest, worker = shared
+    data = worker.poll()
+    n, alerts = len(data.readings), len(data.alerts_speed)
+    with open(ingest.filepath, 'a') as f:
+        f.write(session_lines(500, start=2000))
+    ingest.poll()
+    assert len(ingest.data.readings) > n
+    # The view a request started with keeps its counts
+    assert len(data.readings.column('timestamp')) == n
+    assert len(list(data.alerts_speed)) == alerts
+    assert len(worker.poll().readings) == len(ingest.data.readings)
+
+
+def test_a_replaced_session_reads_empty(shared):
+    ingest, worker = shared
+    data = worker.poll()
+    ingest.filepath.unlink()
+    ingest.poll()
+    assert len(data.readings.column('speed', 0, 10)) == 0
+    assert data.alerts_speed[0:5] == []
+    assert len(worker.poll().readings) == 0
+    assert worker.generation == ingest.generation
+
+
+def test_config_goes_through_the_ingest_process(shared):
+    ingest, worker = shared
+    worker.publish_config({'speed_danger': 100.0})
+    assert ingest.speed_limit == 100.0
+    worker.poll()
+    assert worker.config['speed_danger'] == 100.0
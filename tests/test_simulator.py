@@ -0,0 +1,104 @@
+"""
+DriveGuard Tests - Board Simulator
+Firmware-shaped messages, the file sink and session replay.
+"""
+
+import asyncio
+import json
+
+from simulator import (BUFFER_SIZE, CHUNK_SIZE, SAMPLE_INTERVAL, UPLOAD_INTERVAL, FileSink,
+                       SimulatedBoard, replay, replay_messages, set_topic_device, simulate)
+from telegraf_parser import encode_line, parse_telegraf_file
+
+TOPIC = "ece508/team4/G1/driveguard/"
+
+
+def run_sink(sink, drive):
+    """Run drive(sink) between connect() and close(), like run.py does."""
+    async def run():
+        await sink.connect()
+        try:
+            return await drive(sink)
+        finally:
+            await sink.close()
+    return asyncio.run(run())
+
+
+def run_board(board, steps):
+    return [message for _ in range(steps) for message in board.step()]
+
+
+def test_board_is_reproducible():
+    first = run_board(SimulatedBoard("G1", seed=3), 200)
+    assert first == run_board(SimulatedBoard("G1", seed=3), 200)
+    assert first != run_board(SimulatedBoard("G1", seed=4), 200)
+
+
+def test_board_follows_the_firmware_loop():
+    board = SimulatedBoard("G7", seed=1, speed_danger=60.0)
+    kind, payload = board.start()[0]
+    assert kind == 'status' and json.loads(payload)['buf'] == BUFFER_SIZE
+    assert board.topic('batch_data') == "ece508/team4/G7/driveguard/batch_data"
+
+    messages = run_board(board, 600)
+    batches = [json.loads(p) for k, p in messages if k == 'batch_data']
+    readings = [r for batch in batches for r in batch]
+    assert all(len(batch) <= CHUNK_SIZE for batch in batches)
+    assert set(readings[0]) == {'ts', 'spd', 'lat', 'lon', 'acc', 'scr', 'gps'}
+    assert [r['ts'] for r in readings] == [SAMPLE_INTERVAL * (i + 1) for i in range(len(readings))]
+    assert len(readings) >= 600 - UPLOAD_INTERVAL // SAMPLE_INTERVAL
+    assert all(0 <= r['scr'] <= 100 for r in readings)
+
+    speeding = [json.loads(p) for k, p in messages if k == 'alert_speed']
+    assert speeding and all(a['spd'] > a['lim'] == 60 for a in speeding)
+    # Each alert is sent with the already penalised score
+    by_ts = {r['ts'] // 1000: r['scr'] for r in readings}
+    for alert in speeding:
+        if alert['ts'] in by_ts:
+            assert alert['scr'] <= max(0, by_ts[alert['ts']] - 5)
+
+
+def test_set_topic_device():
+    assert set_topic_device(TOPIC + "status", "G9") == "ece508/team4/G9/driveguard/status"
+    assert set_topic_device("other/topic", "G9") == "other/topic"
+
+
+def test_file_sink_writes_telegraf_lines(tmp_path):
+    path = tmp_path / "live.out"
+    boards = [SimulatedBoard(f"G{i}", seed=i) for i in range(3)]
+    counter = run_sink(FileSink(path), lambda sink: simulate(boards, sink, speedup=1e9, duration=3600))
+    batch, speed, harsh, status = parse_telegraf_file(path)
+    assert len(batch) == counter.readings
+    assert len(status) == 3
+    assert {line.split(',', 1)[0] for line in path.read_text().splitlines()} == {'mqtt_consumer'}
+
+
+def write_session(path):
+    """Two batch uploads (one split over two lines each) and an alert."""
+    lines = []
+    for received, start in [(1_000_000_000, 0), (61_000_000_000, 2)]:
+        for i in (start, start + 1):
+            lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "batch_data"},
+                                     {'ts': i * 10000, 'spd': 50.5, 'scr': 100}, received))
+    lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "alert_speed"},
+                             {'ts': 30, 'spd': 130.0, 'lim': 120}, 62_000_000_000))
+    path.write_text(''.join(line + '\n' for line in lines))
+
+
+def test_replay_rebuilds_the_messages(tmp_path):
+    session = tmp_path / "session_1.out"
+    write_session(session)
+    messages = list(replay_messages(session))
+    assert [(t, topic.rpartition('/')[2]) for t, topic, _ in messages] == [
+        (1.0, 'batch_data'), (61.0, 'batch_data'), (62.0, 'alert_speed')]
+    assert [r['ts'] for r in json.loads(messages[1][2])] == [20000, 30000]
+    assert json.loads(messages[2][2]) == {'ts': 30, 'spd': 130.0, 'lim': 120}
+
+
+def test_replay_as_several_devices(tmp_path):
+    session, out = tmp_path / "session_1.out", tmp_path / "live.out"
+    write_session(session)
+    counter = run_sink(FileSink(out), lambda sink: replay(session, sink, speedup=1e9, devices=["A", "B"]))
+    assert counter.messages == 6 and counter.readings == 8
+    topics = {line.split('topic=', 1)[1].split(' ', 1)[0] for line in out.read_text().splitlines()}
+    assert {t.split('/')[2] for t in topics} == {"A", "B"}
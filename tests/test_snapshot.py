@@ -0,0 +1,145 @@
+"""
+DriveGuard Tests - Live Snapshots
+Save a tailer, resume it and carry on: the result must equal one full read.
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from snapshot import load_snapshot, save_snapshot
+from store import COLUMNS
+from tailer import TelegrafTailer
+from telegraf_parser import encode_line
+
+TAGS = {'host': 'LAPTOP', 'student': 'G1', 'team': 'team4'}
+
+
+def session_lines(n, seed=3):
+    """Line protocol for a drive with stops, a reboot, alerts and a status message."""
+    rng = random.Random(seed)
+    lines = [encode_line('mqtt_consumer', dict(TAGS, topic="ece508/team4/G1/driveguard/status"),
+                         {'msg': 'System started', 'buf': 60})]
+    ts, score = 0, 100
+    for i in range(n):
+        ts = 0 if i == n // 2 else ts + 10000
+        parked = (i // 200) % 4 == 3
+        speed = 0.0 if parked else max(0.0, rng.gauss(80, 30))
+        acc = round(abs(rng.gauss(1, 0.15)), 2)
+        fields = {'ts': ts, 'spd': round(speed, 1), 'lat': round(45.5 + i * 1e-4, 6),
+                  'lon': round(-122.6 + i * 1e-4, 6), 'acc': acc, 'scr': score, 'gps': 1}
+        if speed > 120:
+            score = max(0, score - 5)
+            lines.append(encode_line('mqtt_consumer', dict(TAGS, topic="ece508/team4/G1/driveguard/alert_speed"),
+                                     {'ts': ts // 1000, 'spd': round(speed, 1), 'lim': 120, 'scr': score,
+                                      'lat': fields['lat'], 'lon': fields['lon']}))
+        if acc > 1.35:
+            score = max(0, score - 3)
+            lines.append(encode_line('mqtt_consumer', dict(TAGS, topic="ece508/team4/G1/driveguard/alert_harsh"),
+                                     {'ts': ts // 1000, 'acc': acc, 'thr': 0.4, 'scr': score}))
+        lines.append(encode_line('mqtt_consumer', dict(TAGS, topic="ece508/team4/G1/driveguard/batch_data"), fields))
+        # The firmware re-sends part of a chunk now and then
+        if i % 97 == 0 and i:
+            lines.append(lines[-3])
+    return [line + '\n' for line in lines]
+
+
+def state_of(tailer):
+    """Everything a live session serves, as comparable plain data."""
+    tailer.reconciler.flush()
+    data = tailer.data
+    return {
+        'columns': {name: data.readings.column(name).tolist() for name in COLUMNS},
+        'alerts_speed': list(data.alerts_speed),
+        'alerts_harsh': list(data.alerts_harsh),
+        'alerts_risk': list(data.alerts_risk),
+        'status': list(data.status_msgs),
+        'quality': list(data.quality_events),
+        'stats': data.summary(),
+        'trips': data.trips.summaries(),
+        'tiles': data.spatial.query((-123.0, 45.0, -122.0, 46.0), zoom=12),
+    }
+
+
+@pytest.fixture(params=['memory', 'spill'])
+def live_file(request, tmp_path, monkeypatch):
+    if request.param == 'spill':
+        monkeypatch.setenv("DRIVEGUARD_SPILL_DIR", str(tmp_path / "spill"))
+        monkeypatch.setenv("DRIVEGUARD_LIVE_READINGS", "300")
+        monkeypatch.setenv("DRIVEGUARD_LIVE_ALERTS", "20")
+    else:
+        monkeypatch.delenv("DRIVEGUARD_LIVE_READINGS", raising=False)
+    return tmp_path / "live.out"
+
+
+def test_resume_equals_full_read(live_file, tmp_path):
+    lines = session_lines(3000)
+    cut = len(lines) * 2 // 3
+    live_file.write_text(''.join(lines[:cut]))
+
+    first = TelegrafTailer(live_file)
+    first.poll()
+    assert save_snapshot(first, tmp_path / "snap.npz")
+
+    with open(live_file, 'a') as f:
+        f.write(''.join(lines[cut:]))
+    resumed = TelegrafTailer(live_file)
+    assert load_snapshot(resumed, tmp_path / "snap.npz")
+    assert resumed.offset == first.offset
+    assert len(resumed.data.readings) == len(first.data.readings)
+    resumed.poll()
+
+    whole = TelegrafTailer(live_file)
+    whole.poll()
+    assert state_of(resumed) == state_of(whole)
+
+
+def test_snapshot_keeps_only_memory_with_spill(tmp_path, monkeypatch):
+    monkeypatch.setenv("DRIVEGUARD_SPILL_DIR", str(tmp_path / "spill"))
+    monkeypatch.setenv("DRIVEGUARD_LIVE_READINGS", "300")
+    live_file = tmp_path / "live.out"
+    live_file.write_text(''.join(session_lines(3000)))
+    tailer = TelegrafTailer(live_file)
+    tailer.poll()
+    assert save_snapshot(tailer, tmp_path / "snap.npz")
+
+    readings = tailer.data.readings
+    assert readings.segments
+    with np.load(tmp_path / "snap.npz") as npz:
+        assert len(npz['col_timestamp']) == len(readings.window[1]) < len(readings)
+
+    resumed = TelegrafTailer(live_file)
+    assert load_snapshot(resumed, tmp_path / "snap.npz")
+    assert resumed.data.readings.log.directory == readings.log.directory
+    assert np.array_equal(resumed.data.readings.column('timestamp'), readings.column('timestamp'))
+
+
+def test_rewritten_file_does_not_match(tmp_path, monkeypatch):
+    monkeypatch.setenv("DRIVEGUARD_SPILL_DIR", str(tmp_path / "spill"))
+    monkeypatch.setenv("DRIVEGUARD_LIVE_READINGS", "300")
+    live_file = tmp_path / "live.out"
+    lines = session_lines(2000)
+    live_file.write_text(''.join(lines))
+    tailer = TelegrafTailer(live_file)
+    tailer.poll()
+    assert save_snapshot(tailer, tmp_path / "snap.npz")
+    segments = tailer.data.readings.log.directory
+    assert segments.exists()
+
+    # Same size, different bytes just before the offset
+    lines[-1] = lines[-1].replace('gps=1', 'gps=0')
+    live_file.write_text(''.join(lines))
+    resumed = TelegrafTailer(live_file)
+    assert not load_snapshot(resumed, tmp_path / "snap.npz")
+    assert not segments.exists()
+    assert resumed.offset == 0
+
+
+def test_nothing_to_save(tmp_path):
+    live_file = tmp_path / "live.out"
+    live_file.write_text('')
+    tailer = TelegrafTailer(live_file)
+    tailer.poll()
+    assert not save_snapshot(tailer, tmp_path / "snap.npz")
+    assert not load_snapshot(tailer, tmp_path / "snap.npz")
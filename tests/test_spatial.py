@@ -0,0 +1,117 @@
+"""
+DriveGuard Tests - Spatial Index
+Tile math, viewport queries, streamed vs. recorded indexes and snapshots.
+"""
+
+import numpy as np
+import pytest
+
+from spatial import WORLD, TileIndex, parse_bbox, tile_xy, tile_xy_array
+
+N = 3000
+
+
+def recorded(seed=2):
+    rng = np.random.default_rng(seed)
+    columns = {
+        'timestamp': np.arange(N, dtype=np.int64) * 10000,
+        'speed': rng.uniform(20, 140, N),
+        'lat': rng.uniform(45.4, 45.6, N),
+        'lon': rng.uniform(-122.8, -122.5, N),
+        'gps_valid': (rng.random(N) > 0.1).astype(np.uint8),
+        'score': np.full(N, 100, dtype=np.int16),
+        'acc': np.ones(N)
+    }
+    columns['lat'][:10] = 0.0
+    columns['lon'][:10] = 0.0
+    alerts_speed = [{'timestamp': int(t) // 1000, 'lat': float(la), 'lon': float(lo)}
+                    for t, la, lo in zip(columns['timestamp'][::97], columns['lat'][::97], columns['lon'][::97])]
+    alerts_harsh = [{'timestamp': int(t) // 1000} for t in columns['timestamp'][5::131]]
+    return columns, alerts_speed, alerts_harsh
+
+
+def streamed(columns, alerts_speed, alerts_harsh):
+    """The same session fed one record at a time, alerts before their reading."""
+    index = TileIndex()
+    speed = {a['timestamp'] * 1000: a for a in alerts_speed}
+    harsh = {a['timestamp'] * 1000 for a in alerts_harsh}
+    for i in range(N):
+        record = {name: columns[name][i].item() for name in columns}
+        if record['timestamp'] in speed:
+            index.add('alert_speed', speed[record['timestamp']])
+        if record['timestamp'] in harsh:
+            index.add('alert_harsh', {'timestamp': record['timestamp'] // 1000})
+        index.add('batch_data', record)
+    return index
+
+
+def totals(result):
+    return {key: sum(cell[key] for cell in result['cells']) for key in ('readings', 'speeding', 'harsh')}
+
+
+def test_tile_xy():
+    assert tile_xy(0.0, 0.0, 1) == (1, 1)
+    assert tile_xy(89.9, -180.0, 3) == (0, 0)
+    assert tile_xy(-89.9, 180.0, 3) == (7, 7)
+    rng = np.random.default_rng(0)
+    lat, lon = rng.uniform(-80, 80, 100), rng.uniform(-179, 179, 100)
+    x, y = tile_xy_array(lat, lon, 14)
+    assert list(zip(x.tolist(), y.tolist())) == [tile_xy(a, b, 14) for a, b in zip(lat, lon)]
+
+
+def test_parse_bbox():
+    assert parse_bbox(None) == WORLD
+    assert parse_bbox("-123,45,-122,46") == (-123.0, 45.0, -122.0, 46.0)
+    for bad in ("1,2,3", "a,b,c,d", "10,0,5,1", "0,10,1,5"):
+        with pytest.raises(ValueError):
+            parse_bbox(bad)
+
+
+def test_world_query_counts_every_fix():
+    columns, speed, harsh = recorded()
+    index = TileIndex.from_columns(columns, speed, harsh)
+    fixes = int(np.sum((columns['gps_valid'] != 0) & (columns['lat'] != 0)))
+    got = totals(index.query(WORLD, zoom=0))
+    assert got['readings'] == fixes
+    assert got['speeding'] == len([a for a in speed if a['lat'] != 0])
+    assert 0 < got['harsh'] <= len(harsh)
+
+
+def test_viewport_only_sees_its_points():
+    columns, speed, harsh = recorded()
+    index = TileIndex.from_columns(columns, speed, harsh)
+    bbox = (-122.7, 45.45, -122.6, 45.5)
+    result = index.query(bbox, zoom=12)
+    assert result['cell_zoom'] == 14
+    # Cells are whole tiles, so the edge tiles count in full
+    x, y = tile_xy_array(columns['lat'], columns['lon'], 14)
+    (x0, y0), (x1, y1) = tile_xy(bbox[3], bbox[0], 14), tile_xy(bbox[1], bbox[2], 14)
+    inside = (columns['gps_valid'] != 0) & (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+    assert totals(result)['readings'] == inside.sum() > 0
+    events = [cell['events'] for cell in result['hotspots']]
+    assert events == sorted(events, reverse=True) and len(events) <= 10
+    with pytest.raises(ValueError):
+        index.query(WORLD, zoom=16)
+
+
+def test_streamed_index_matches_recorded():
+    columns, speed, harsh = recorded()
+    live = streamed(columns, speed, harsh)
+    built = TileIndex.from_columns(columns, speed, harsh)
+    for zoom in (0, 4, 12):
+        bbox = WORLD if zoom < 12 else (-122.8, 45.4, -122.5, 45.6)
+        a, b = live.query(bbox, zoom), built.query(bbox, zoom)
+        assert [(c['x'], c['y'], c['readings'], c['speeding'], c['harsh']) for c in a['cells']] == \
+               [(c['x'], c['y'], c['readings'], c['speeding'], c['harsh']) for c in b['cells']]
+        for ca, cb in zip(a['cells'], b['cells']):
+            assert ca['avg_speed'] == pytest.approx(cb['avg_speed'], abs=0.11)
+
+
+def test_snapshot_round_trip():
+    columns, speed, harsh = recorded()
+    index = streamed(columns, speed, harsh)
+    state, tiles = index.snapshot()
+    restored = TileIndex()
+    restored.restore(state, tiles)
+    assert restored.version == index.version
+    assert restored.query(WORLD, 4) == index.query(WORLD, 4)
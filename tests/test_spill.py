@@ -0,0 +1,116 @@
+"""
+DriveGuard Tests - Spill Segments
+The spilling store and lists must read back like the in-memory ones.
+"""
+
+import gc
+
+import numpy as np
+import pytest
+
+from scoring import Thresholds, rescore, rescore_pieces
+from spill import MemoryBudget, SegmentLog, SpilledList, SpilledReadings, live_session, reading_pieces
+from store import COLUMNS, ReadingStore
+
+
+def reading(i, ts=None):
+    return {'timestamp': i * 10000 if ts is None else ts, 'speed': i % 150 + 0.5,
+            'lat': 45.5 + i * 1e-6, 'lon': -122.6 - i * 1e-6, 'acc': 1.0 + (i % 7) / 100,
+            'score': 100 - i % 100, 'gps_valid': i % 2}
+
+
+@pytest.fixture
+def spilled(tmp_path):
+    """(SpilledReadings of capacity 100, ReadingStore) holding the same 1234 readings."""
+    readings = SpilledReadings(SegmentLog(tmp_path), 100)
+    plain = ReadingStore()
+    for i in range(1234):
+        readings.append(reading(i))
+        plain.append(reading(i))
+    return readings, plain
+
+
+def test_spilled_readings_read_back(spilled):
+    readings, plain = spilled
+    base, memory = readings.window
+    assert len(readings) == len(plain)
+    assert readings.segments and 100 <= len(memory) < 200
+    for start, stop in [(None, None), (0, 1), (150, 420), (base - 3, base + 3), (1200, None), (5, 5)]:
+        for name in COLUMNS:
+            assert np.array_equal(readings.column(name, start, stop), plain.column(name, start, stop)), name
+    assert readings.to_records(95, 105) == plain.to_records(95, 105)
+    assert readings.summary() == plain.summary()
+
+
+def test_spilled_time_range(spilled):
+    readings, plain = spilled
+    for t_from, t_to in [(None, None), (0, 0), (15000, 4_000_000), (995000, 1005000), (-5, -1), (10 ** 9, None)]:
+        assert readings.time_range(t_from, t_to) == plain.time_range(t_from, t_to)
+
+
+def test_spilled_checkpoint_resume(spilled, tmp_path):
+    readings, _ = spilled
+    state, views = readings.checkpoint()
+    columns = {name: np.array(view) for name, view in views.items()}
+    readings.append(reading(5000))
+
+    resumed = SpilledReadings(SegmentLog(tmp_path), 100)
+    resumed.resume(state, columns)
+    assert len(resumed) == 1234
+    assert np.array_equal(resumed.column('timestamp'), readings.column('timestamp', 0, 1234))
+
+
+def test_spilled_list(tmp_path):
+    items = SpilledList(SegmentLog(tmp_path), 'alerts_speed', 10)
+    expected = [{'i': i} for i in range(57)]
+    for item in expected[:30]:
+        items.append(item)
+    items.extend(expected[30:])
+    assert items.segments
+    assert len(items) == 57
+    assert list(items) == expected
+    assert items[0] == expected[0] and items[-1] == expected[-1] and items[33] == expected[33]
+    assert items[5:48] == expected[5:48]
+    assert items[-20:] == expected[-20:]
+    assert items[::7] == expected[::7]
+    with pytest.raises(IndexError):
+        items[57]
+
+
+def test_segments_go_with_the_session(tmp_path):
+    data = live_session(MemoryBudget(tmp_path, 100, 10))
+    for i in range(500):
+        data.add('batch_data', reading(i))
+    directory = data.readings.log.directory
+    assert directory.exists() and any(directory.iterdir())
+    del data
+    gc.collect()
+    assert not directory.exists()
+
+
+def test_rescore_reads_one_segment_at_a_time(spilled):
+    readings, plain = spilled
+    loads = []
+    pieces = []
+    for key, first, load in reading_pieces(readings, COLUMNS):
+        def counted(load=load, key=key):
+            loads.append(key)
+            return load()
+        pieces.append((key, first, counted))
+    assert len(pieces) == len(readings.segments) + 1
+    assert all(len(piece()['timestamp']) <= 2 * readings.capacity for _, _, piece in pieces)
+    loads.clear()
+
+    thresholds = Thresholds(100.0, 0.05, -5, -3)
+    whole = rescore({name: plain.column(name) for name in COLUMNS}, thresholds)
+    result = rescore_pieces(pieces, thresholds)
+    for key in ('final_score', 'min_score', 'speed_alerts', 'harsh_alerts', 'readings'):
+        assert result[key] == whole[key], key
+    assert np.array_equal(result['speeding']['rows'], whole['speeding']['rows'])
+    assert np.array_equal(result['harsh']['scores'], whole['harsh']['scores'])
+    assert result['recorded_matches'] == whole['recorded_matches']
+
+    # Segments never change, so scoring again only reads the rows in memory
+    loads.clear()
+    assert rescore_pieces(pieces, thresholds)['final_score'] == whole['final_score']
+    assert loads == [None]
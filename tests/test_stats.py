@@ -0,0 +1,97 @@
+"""
+DriveGuard Tests - Running Statistics
+Streaming results must match the batch computations over the same readings.
+"""
+
+import numpy as np
+import pytest
+
+from stats import BinnedQuantiles, RunningStats
+from store import ReadingStore, quantiles
+
+
+def drive(n, seed=7):
+    """Reading dicts with speeding runs, jerky acc and a gap."""
+    rng = np.random.default_rng(seed)
+    speed = np.round(np.clip(rng.normal(90, 35, n), 0, 200), 1)
+    acc = np.round(np.abs(rng.normal(1.0, 0.08, n)), 2)
+    acc[::53] += 0.6
+    speed[500:520] = 140.0
+    ts = np.arange(n, dtype=np.int64) * 10000
+    ts[n // 3:] += 120000
+    return [{'timestamp': int(ts[i]), 'speed': float(speed[i]), 'acc': float(acc[i]),
+             'lat': 45.5 + i * 1e-4, 'lon': -122.6, 'score': 100, 'gps_valid': 1}
+            for i in range(n)]
+
+
+@pytest.mark.parametrize('n', [1, 7, 1027, 5000])
+def test_binned_quantiles_are_exact(n):
+    values = np.round(np.random.default_rng(n).gamma(4, 15, n), 1)
+    binned = BinnedQuantiles(1, 0, 400)
+    for x in values:
+        binned.add(x)
+    for p in (0.0, 0.01, 0.5, 0.95, 1.0):
+        assert binned.value(p) == pytest.approx(np.percentile(values, p * 100, method='inverted_cdf'))
+        assert binned.value(p) == pytest.approx(quantiles(values, [p])[0])
+
+
+def test_binned_quantiles_clamp_to_the_range():
+    binned = BinnedQuantiles(1, 0, 400)
+    for x in (-3.0, 12.5, float('nan'), 950.0, float('inf')):
+        binned.add(x)
+    assert binned.total == 3
+    assert [binned.value(p) for p in (0.0, 0.5, 1.0)] == [0.0, 12.5, 400.0]
+    assert BinnedQuantiles(1, 0, 400).value(0.5) == 0
+
+
+def test_binned_quantiles_resume():
+    values = np.round(np.random.default_rng(1).normal(1, 0.1, 3000), 2)
+    whole, first = BinnedQuantiles(2, 0, 16), BinnedQuantiles(2, 0, 16)
+    for x in values:
+        whole.add(x)
+    for x in values[:1700]:
+        first.add(x)
+    resumed = BinnedQuantiles(2, 0, 16)
+    resumed.restore(first.snapshot())
+    for x in values[1700:]:
+        resumed.add(x)
+    assert resumed.value(0.5) == whole.value(0.5)
+    assert resumed.value(0.95) == whole.value(0.95)
+
+
+def test_live_and_history_agree():
+    stats, store = RunningStats(), ReadingStore()
+    for row in drive(3000):
+        stats.add('batch_data', row)
+        store.append(row)
+    running, batch = stats.to_dict(), store.summary()
+    for key, value in batch.items():
+        if key.startswith('p'):
+            assert running[key] == value, key
+        else:
+            assert running[key] == pytest.approx(value), key
+
+
+def test_running_stats_resume():
+    rows = drive(2000)
+    whole, first = RunningStats(), RunningStats()
+    for row in rows:
+        whole.add('batch_data', row)
+    for row in rows[:900]:
+        first.add('batch_data', row)
+    first.add('alert_speed', {'speed': 130})
+    whole.add('alert_speed', {'speed': 130})
+    resumed = RunningStats()
+    resumed.restore(first.snapshot())
+    for row in rows[900:]:
+        resumed.add('batch_data', row)
+    assert resumed.to_dict() == whole.to_dict()
+
+
+def test_quality_counts():
+    stats = RunningStats()
+    for event in [{'type': 'duplicate', 'count': 3}, {'type': 'late', 'count': 1},
+                  {'type': 'gap', 'count': 5}, {'type': 'gap', 'count': 2}, {'type': 'restart', 'count': 0}]:
+        stats.add('quality', event)
+    assert stats.to_dict()['data_quality'] == {'duplicates': 3, 'late_readings': 1, 'missing_readings': 7,
+                                               'gaps': 2, 'restarts': 1}
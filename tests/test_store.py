@@ -0,0 +1,63 @@
+"""
+DriveGuard Tests - Reading Storage
+The columnar ReadingStore.
+"""
+
+import numpy as np
+import pytest
+
+from store import COLUMNS, ReadingStore
+
+
+def reading(i, ts=None):
+    return {'timestamp': i * 10000 if ts is None else ts, 'speed': i % 150 + 0.5,
+            'lat': 45.5 + i * 1e-6, 'lon': -122.6 - i * 1e-6, 'acc': 1.0 + (i % 7) / 100,
+            'score': 100 - i % 100, 'gps_valid': i % 2}
+
+
+def test_append_and_grow():
+    store = ReadingStore(capacity=2)
+    for i in range(10):
+        store.append(reading(i))
+    assert len(store) == 10
+    assert store.column('timestamp').tolist() == [i * 10000 for i in range(10)]
+    assert store.to_records(9)[0] == {'timestamp': 90000, 'speed': 9.5, 'lat': 45.500009,
+                                      'lon': -122.600009, 'acc': 1.02, 'score': 91, 'gps_valid': 1}
+
+
+def test_bad_values_take_defaults():
+    store = ReadingStore()
+    store.append({'timestamp': 5, 'speed': 'fast', 'score': None})
+    assert store.column('speed')[0] == 0
+    assert store.column('score')[0] == 100
+
+
+def test_extend_matches_append():
+    one, many = ReadingStore(), ReadingStore()
+    rows = [reading(i) for i in range(50)]
+    for row in rows:
+        one.append(row)
+    many.extend({name: [row[name] for row in rows] for name in COLUMNS})
+    for name in COLUMNS:
+        assert np.array_equal(one.column(name), many.column(name))
+
+
+def test_time_range_and_order():
+    store = ReadingStore()
+    for i in range(100):
+        store.append(reading(i))
+    assert store.time_range(15000, 50000) == (2, 6)
+    assert store.time_range(None, -1) == (0, 0)
+    store.append(reading(0, ts=5))
+    assert not store.ts_sorted
+    with pytest.raises(ValueError):
+        store.time_range(0, 1)
+    assert store.slice_by_time(0, 10000)['timestamp'].tolist() == [0, 10000, 5]
+
+
+def test_keep_last():
+    store = ReadingStore()
+    for i in range(20):
+        store.append(reading(i))
+    store.keep_last(5)
+    assert store.column('timestamp').tolist() == [i * 10000 for i in range(15, 20)]
@@ -0,0 +1,104 @@
+"""
+DriveGuard Tests - Live Event Stream
+/api/stream snapshots, incremental updates and Last-Event-ID resume.
+"""
+
+import json
+
+import pytest
+
+import app as dashboard
+from tailer import TelegrafTailer
+from telegraf_parser import encode_line
+
+TOPIC = "ece508/team4/G1/driveguard/"
+
+
+def session_lines(n, start=0):
+    lines = []
+    for i in range(start, start + n):
+        speed = 130.0 if i % 40 < 3 else 60.0
+        lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "batch_data"},
+                                 {'ts': i * 10000, 'spd': speed, 'lat': 45.5, 'lon': -122.6,
+                                  'acc': 1.0, 'scr': 100, 'gps': 1}))
+        if i % 40 == 0:
+            lines.append(encode_line('mqtt_consumer', {'topic': TOPIC + "alert_speed"},
+                                     {'ts': i * 10, 'spd': speed, 'lim': 120, 'scr': 95,
+                                      'lat': 45.5, 'lon': -122.6}))
+    return ''.join(line + '\n' for line in lines)
+
+
+def read_event(chunks):
+    """(id, event, data) of the next event, skipping comments and retry hints."""
+    while True:
+        fields = {}
+        for line in next(chunks).decode().splitlines():
+            key, _, value = line.partition(': ')
+            fields[key] = value
+        if 'event' in fields:
+            return fields['id'], fields['event'], json.loads(fields['data'])
+
+
+@pytest.fixture
+def live(tmp_path, monkeypatch):
+    path = tmp_path / "live.out"
+    path.write_text(session_lines(300))
+    source = TelegrafTailer(path)
+    monkeypatch.setattr(dashboard, 'live_source', source)
+    monkeypatch.setattr(dashboard, 'STREAM_INTERVAL', 0.0)
+    return source
+
+
+def open_stream(headers=None):
+    response = dashboard.app.test_client().get('/api/stream', headers=headers or {})
+    assert response.mimetype == 'text/event-stream'
+    return response.response.__iter__()
+
+
+def test_first_event_is_a_snapshot(live):
+    chunks = open_stream()
+    assert next(chunks).startswith(b"retry: ")
+    event_id, event, data = read_event(chunks)
+    readings = len(live.data.readings)
+    assert event == 'snapshot'
+    assert event_id == f"{live.generation}-{readings}-{len(live.data.alerts_speed)}-0"
+    assert len(data['batch_data']) == dashboard.STREAM_WINDOW
+    assert data['batch_data'][-1]['timestamp'] == live.data.readings.column('timestamp')[-1]
+    assert data['stats'] == live.data.summary()
+
+
+def test_updates_carry_only_new_rows(live):
+    chunks = open_stream()
+    _, _, snapshot = read_event(chunks)
+    before = len(live.data.readings)
+    with open(live.filepath, 'a') as f:
+        f.write(session_lines(100, start=300))
+    _, event, data = read_event(chunks)
+    assert event == 'update'
+    timestamps = [r['timestamp'] for r in data['batch_data']]
+    assert timestamps == live.data.readings.column('timestamp', before).tolist()
+    assert len(data['alerts_speed']) > 0
+    assert all(snapshot['stats'].get(k) != v for k, v in data['stats'].items())
+
+
+def test_reconnect_resumes_from_last_event_id(live):
+    event_id, _, _ = read_event(open_stream())
+    before = len(live.data.readings)
+    with open(live.filepath, 'a') as f:
+        f.write(session_lines(50, start=300))
+    _, event, data = read_event(open_stream({'Last-Event-ID': event_id}))
+    assert event == 'update'
+    assert len(data['batch_data']) == len(live.data.readings) - before
+
+
+@pytest.mark.parametrize('event_id', ['garbage', '99-0-0-0', '1-2-3'])
+def test_unusable_event_id_gets_a_snapshot(live, event_id):
+    _, event, _ = read_event(open_stream({'Last-Event-ID': event_id}))
+    assert event == 'snapshot'
+
+
+def test_idle_stream_sends_keep_alive(live, monkeypatch):
+    monkeypatch.setattr(dashboard, 'STREAM_HEARTBEAT', 0.0)
+    chunks = open_stream()
+    read_event(chunks)
+    assert next(chunks) == b": keep-alive\n\n"
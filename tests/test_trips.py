@@ -0,0 +1,82 @@
+"""
+DriveGuard Tests - Trip Detection
+Gap, reboot and dwell splits, alert attribution and detector snapshots.
+"""
+
+import numpy as np
+import pytest
+
+from trips import DWELL_MS, GAP_MS, TripDetector, detect_trips, haversine_km, trip_alerts
+
+STEP_MS = 10000
+
+
+def drive(rows):
+    """Columns from (timestamp, speed) rows, heading north ~0.17 km per moving reading."""
+    ts = np.array([t for t, _ in rows], dtype=np.int64)
+    speed = np.array([s for _, s in rows], dtype=np.float32)
+    lat = 45.5 + np.cumsum(speed > 3) * 0.0015
+    return {'timestamp': ts, 'speed': speed, 'lat': lat, 'lon': np.full(len(rows), -122.6),
+            'gps_valid': np.ones(len(rows), dtype=np.uint8), 'score': np.full(len(rows), 100, dtype=np.int16)}
+
+
+def moving(start, n, speed=60.0):
+    return [(start + i * STEP_MS, speed) for i in range(n)]
+
+
+def test_haversine():
+    assert haversine_km(45.0, -122.0, 45.0, -122.0) == 0.0
+    assert haversine_km(0.0, 0.0, 1.0, 0.0) == pytest.approx(111.195, abs=0.01)
+
+
+def test_gap_and_reboot_split_trips():
+    rows = moving(0, 30) + moving(30 * STEP_MS + GAP_MS + STEP_MS, 20) + moving(5000, 10)
+    trips = detect_trips(drive(rows))
+    assert [t['readings'] for t in trips] == [30, 20, 10]
+    assert [(t['first_row'], t['last_row']) for t in trips] == [(0, 29), (30, 49), (50, 59)]
+    assert trips[0]['duration_s'] == 290.0
+    assert trips[0]['distance_km'] == pytest.approx(29 * 0.0015 * 111.195, rel=0.01)
+    assert trips[0]['avg_speed'] == 60.0 and [t['trip'] for t in trips] == [0, 1, 2]
+
+
+def test_parked_readings_end_the_trip():
+    dwell = DWELL_MS // STEP_MS
+    rows = moving(0, 20) + [(20 * STEP_MS + i * STEP_MS, 0.5) for i in range(dwell + 5)]
+    rows += moving(rows[-1][0] + STEP_MS, 15)
+    trips = detect_trips(drive(rows))
+    assert [t['readings'] for t in trips] == [20, 15]
+    assert trips[0]['last_row'] == 19
+    # A short stop stays inside the trip
+    rows = moving(0, 20) + [(20 * STEP_MS + i * STEP_MS, 0.0) for i in range(5)] + moving(25 * STEP_MS, 10)
+    assert [t['readings'] for t in detect_trips(drive(rows))] == [35]
+
+
+def test_alerts_count_towards_their_reading():
+    rows = moving(0, 30) + moving(30 * STEP_MS + GAP_MS + STEP_MS, 30)
+    columns = drive(rows)
+    speed = [{'timestamp': 100}, {'timestamp': 101}, {'timestamp': 700}]
+    harsh = [{'timestamp': 250}]
+    trips = detect_trips(columns, speed, harsh)
+    assert [(t['speed_alerts'], t['harsh_alerts']) for t in trips] == [(2, 1), (1, 0)]
+    assert trip_alerts(trips[0], speed) == speed[:2]
+    assert trip_alerts(trips[1], speed + harsh) == speed[2:]
+
+
+def test_live_detector_matches_detect_trips():
+    rows = moving(0, 40) + [(40 * STEP_MS + i * STEP_MS, 0.0) for i in range(40)] + moving(80 * STEP_MS, 25)
+    columns = drive(rows)
+    names = ('timestamp', 'speed', 'lat', 'lon', 'gps_valid', 'score')
+    records = [dict(zip(names, values)) for values in zip(*(columns[n].tolist() for n in names))]
+
+    detector = TripDetector()
+    for record in records[:90]:
+        detector.add('batch_data', record)
+    finished, current = detector.since(0)
+    assert len(finished) == 1 and current['open'] and current['first_row'] == 80
+
+    restored = TripDetector()
+    restored.restore(detector.snapshot())
+    for record in records[90:]:
+        restored.add('batch_data', record)
+    assert restored.summaries()[-1]['open']
+    assert restored.finish() == detect_trips(columns)